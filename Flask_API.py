@@ -1,118 +1,416 @@
 from flask import Flask, request, jsonify
-from pyIR import loadRemote, Transmitter, NEC
-import board
-import adafruit_dht
+import logging
+import threading
+import time
+import metrics
+import diagnostics
+from pyIR import loadRemote, Macro
+from device_manager import DeviceManager, SensorSampler, HardwareQueue, HardwareBusy
+from climate import Climate, AC_ENCODERS
+from remote_library import RemoteLibrary
+from hardware import board, adafruit_dht, BACKEND as HARDWARE_BACKEND # The Pi drivers, or the simulated ones when IR_HARDWARE asks (see hardware.py)
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)
 loaded_remote = loadRemote('my_remote.txt')
-nec_protocol = NEC()
-def transmitSignal(button_name):
 
-    transmitter = Transmitter(pin=12)
+# Every other remote lives in the library; the default remote is kept in it too
+# (updated in place, so the captures and params stored for it survive a restart).
+# It is opened by the first request that needs it, so importing this module (as the
+# benchmarks and tools do) doesn't create or write a database in the current directory
+LIBRARY_PATH = 'remotes.db'
+library = None
+library_lock = threading.Lock()
+
+def getLibrary():
+    global library
+    with library_lock:
+        if library is None:
+            opened = RemoteLibrary(LIBRARY_PATH)
+            opened.updateRemote(loaded_remote)
+            library = opened
+        return library
+
+# The transmitter and sensor are created once and kept for the life of the process
+TRANSMIT_PIN = 12
+SENSOR_PIN = board.D4
+# All GPIO work runs one job at a time on the hardware queue's worker, whatever the HTTP concurrency
+hardware = HardwareQueue(maxsize=8)
+devices = DeviceManager(sensorFactory=adafruit_dht.DHT11, hardwareQueue=hardware)
+
+# Only the sampler thread reads the sensor, /data answers from its latest reading
+# It starts with the first request for a reading rather than on import: with app.run(debug=True)
+# the reloader imports this module in a watching parent process too, which must not read the pin
+sampler = SensorSampler(devices, SENSOR_PIN)
+
+# The air conditioner is driven by whole states encoded for its brand (see climate.AC_ENCODERS)
+CLIMATE_BRAND = 'whirlpool'
+air_conditioner = Climate(devices, TRANSMIT_PIN, AC_ENCODERS[CLIMATE_BRAND]())
+
+# ========================================= #
+#^ Metrics, rendered by /metrics ^#
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', "HTTP request latency by route", ('method', 'route', 'status'))
+TRANSMIT_SECONDS = metrics.histogram('ir_transmit_duration_seconds', "Time to send a frame, waiting for the hardware queue included",
+                                     ('remote', 'button'), buckets=metrics.TRANSMIT_BUCKETS)
+TRANSMIT_ERROR_US = metrics.histogram('ir_transmit_timing_error_microseconds', "Latest edge of each frame against its deadline (backends that measure it)",
+                                      ('remote', 'button'), buckets=metrics.TIMING_ERROR_BUCKETS)
+
+@app.before_request
+def startTimer():
+    request.environ['metrics.start'] = time.perf_counter()
+
+@app.after_request
+def recordRequest(response):
+    current = request._get_current_object() # One proxy lookup rather than one per attribute
+    start = current.environ.get('metrics.start')
+    if start is not None:
+        rule = current.url_rule # The rule, not the path, keeps the label set small
+        REQUEST_SECONDS.observe(time.perf_counter() - start, current.method, rule.rule if rule is not None else 'unmatched', str(response.status_code))
+    return response
+
+# Record how long a frame took and how far off its timing was; timing is the backend's report, if any
+def recordTransmit(remote_name, button_name, start, timing):
+    TRANSMIT_SECONDS.observe(time.perf_counter() - start, remote_name, button_name)
+    if timing and timing['max_error_us'] is not None:
+        TRANSMIT_ERROR_US.observe(timing['max_error_us'], remote_name, button_name)
+
+# Values other objects already count, read on every scrape
+@metrics.REGISTRY.addCollector
+def collectStats():
+    caches = {
+        'waveforms': loaded_remote.getWaveformStats(),
+        'climate_frames': air_conditioner.encoder.getCacheStats(),
+        'library_remotes': getLibrary().getCacheStats(),
+    }
+    return [
+        ('ir_hardware_backend', 'gauge', "The GPIO backend in use, from IR_HARDWARE (pi, sim or virtual)", [({'backend': HARDWARE_BACKEND}, 1)]),
+        ('hardware_queue_depth', 'gauge', "Jobs waiting for the hardware worker", [({}, hardware.depth())]),
+        ('hardware_queue_jobs_total', 'counter', "Hardware jobs by outcome",
+         [({'outcome': 'completed'}, hardware.completed), ({'outcome': 'rejected'}, hardware.rejected)]),
+        ('cache_hits_total', 'counter', "Cache hits", [({'cache': name}, stats['hits']) for name, stats in caches.items()]),
+        ('cache_misses_total', 'counter', "Cache misses", [({'cache': name}, stats['misses']) for name, stats in caches.items()]),
+        ('cache_hit_ratio', 'gauge', "Hits over lookups since start",
+         [({'cache': name}, stats['hits'] / max(1, stats['hits'] + stats['misses'])) for name, stats in caches.items()]),
+        ('dht_sampler_failed_rounds_total', 'counter', "Sensor sampling rounds that gave up after every retry", [({}, sampler.failures)]),
+    ]
+
+# ========================================= #
+def transmitSignal(button_name, remote_name=None):
     
-    button = loaded_remote.identifyButtonByName(button_name)
+    # Waveforms are encoded when a remote is loaded, and hot remotes stay loaded, so this is just dictionary lookups
+    if remote_name:
+        remote = getLibrary().getRemote(remote_name)
+        if remote == -1:
+            return f"No remote named '{remote_name}'"
+        rawData = remote.getWaveform(button_name)
+    else:
+        rawData = loaded_remote.getWaveform(button_name)
     
-    if button != -1:
-        button_code = button.getIntegerCode()
-        # Convert the integer code to raw data using NEC protocol
-        rawData = nec_protocol.getRawFromIntegerCode(button_code)
-        transmitter.sendSignal(rawData)
+    if rawData != -1:
+        start = time.perf_counter()
+        timing = devices.transmit(TRANSMIT_PIN, rawData)
+        recordTransmit(remote_name or loaded_remote.nickname, button_name, start, timing)
         return f"Transmitted signal for button '{button_name}'"
+    elif remote_name:
+        return f"No button found with the name '{button_name}' on remote '{remote_name}'"
     else:
         return f"No button found with the name '{button_name}'"
+
+# A text field of a request body, stripped: '' when it is missing, None when it isn't a string
+def textField(data, key):
+    value = data.get(key)
+    if value is None:
+        return ''
+    return value.strip() if isinstance(value, str) else None
+
 @app.route('/transmit', methods=['POST'])
 def transmit():
     """
-    Endpoint to handle transmit requests.
+    Endpoint to handle transmit requests. Pass remote to send a button of a remote in the
+    library instead of the default remote.
     """
     
-    data = request.json
-    button_name = data.get('button_name', '').strip()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Expected a JSON object'}), 400
+    button_name = textField(data, 'button_name')
+    remote_name = textField(data, 'remote')
+    if button_name is None or remote_name is None:
+        return jsonify({'status': 'error', 'message': 'button_name and remote must be strings'}), 400
+
+    if remote_name and getLibrary().getRemote(remote_name) == -1:
+        return jsonify({'status': 'error', 'message': f"No remote named '{remote_name}'"}), 404
 
     if button_name:
-        result = transmitSignal(button_name)
+        try:
+            result = transmitSignal(button_name, remote_name)
+        except HardwareBusy as busy:
+            return jsonify({'status': 'error', 'message': str(busy)}), 503, {'Retry-After': str(busy.retryAfter)}
         return jsonify({'status': 'success', 'message': result})
     else:
         return jsonify({'status': 'error', 'message': 'No button name provided'}), 400
 
+MAX_BATCH_SECONDS = 30 # Longest batch accepted, the hardware queue does nothing else meanwhile
+
+@app.route('/transmit/batch', methods=['POST'])
+def transmit_batch():
+    """
+    Send several buttons as one hardware job, with every gap kept to the schedule.
+
+    Pass {"macro": name} for a macro saved with the remote, or {"steps": [...]} with
+    {"button_name", "repeats", "gap_us"} steps (see pyIR.Macro); remote is as for /transmit.
+    Responds with when each step was due and started and how long it took.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Expected a JSON object'}), 400
+    remote_name = textField(data, 'remote')
+    if remote_name is None:
+        return jsonify({'status': 'error', 'message': 'remote must be a remote name'}), 400
+    remote = getLibrary().getRemote(remote_name) if remote_name else loaded_remote
+    if remote == -1:
+        return jsonify({'status': 'error', 'message': f"No remote named '{remote_name}'"}), 404
+
+    if data.get('macro'):
+        if not isinstance(data['macro'], str):
+            return jsonify({'status': 'error', 'message': 'macro must be a macro name'}), 400
+        macro = remote.getMacro(data['macro'])
+        if macro == -1:
+            return jsonify({'status': 'error', 'message': f"No macro named '{data['macro']}' on remote '{remote.nickname}'"}), 404
+    else:
+        try:
+            macro = Macro.fromList('batch', data.get('steps'))
+        except ValueError as error:
+            return jsonify({'status': 'error', 'message': str(error)}), 400
+
+    missing = [step.button for step in macro.steps if remote.identifyButtonByName(step.button) == -1]
+    if missing:
+        return jsonify({'status': 'error', 'message': f"No button found with the name '{missing[0]}' on remote '{remote.nickname}'"}), 404
+    try:
+        schedule = remote.scheduleMacro(macro, maxDuration=MAX_BATCH_SECONDS * 1_000_000)
+    except ValueError as error:
+        return jsonify({'status': 'error', 'message': str(error)}), 400
+
+    try:
+        results = devices.transmitSequence(TRANSMIT_PIN, [(raw_data, start) for (step, raw_data, start) in schedule])
+    except HardwareBusy as busy:
+        return jsonify({'status': 'error', 'message': str(busy)}), 503, {'Retry-After': str(busy.retryAfter)}
+
+    steps = []
+    for (step, raw_data, start), result in zip(schedule, results):
+        timing = result['timing']
+        TRANSMIT_SECONDS.observe(result['duration_us'] / 1_000_000, remote.nickname, step.button)
+        if timing and timing['max_error_us'] is not None:
+            TRANSMIT_ERROR_US.observe(timing['max_error_us'], remote.nickname, step.button)
+        steps.append({
+            'button_name': step.button,
+            'repeats': remote.repeatFrames if step.repeats is None else step.repeats,
+            'due_ms': start / 1000,
+            'start_ms': result['start_us'] / 1000,
+            'late_us': result['late_us'],
+            'duration_ms': result['duration_us'] / 1000,
+            'max_error_us': timing['max_error_us'] if timing else None,
+        })
+    return jsonify({'status': 'success', 'message': f"Transmitted {len(steps)} steps", 'steps': steps})
+
+@app.route('/climate', methods=['GET', 'POST'])
+def climate_control():
+    """
+    GET returns the state last sent to the air conditioner. POST sends a new one: the JSON
+    body holds any of power, mode, temperature, fan and swing, the rest stay as they were.
+    """
+    if request.method == 'POST':
+        changes = request.get_json(silent=True)
+        if not isinstance(changes, dict) or not changes:
+            return jsonify({'status': 'error', 'message': 'No climate settings provided'}), 400
+        try:
+            start = time.perf_counter()
+            timing = air_conditioner.update(**changes)
+            recordTransmit('climate', CLIMATE_BRAND, start, timing)
+        except ValueError as error:
+            return jsonify({'status': 'error', 'message': str(error)}), 400
+        except HardwareBusy as busy:
+            return jsonify({'status': 'error', 'message': str(busy)}), 503, {'Retry-After': str(busy.retryAfter)}
+    return jsonify({'status': 'success', 'state': air_conditioner.state.toDict()})
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text format metrics: request latency, transmit timing, sensor reads, queue depth and caches."""
+    return metrics.REGISTRY.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
 @app.route('/')
 def index():
-    return "IR Transmitter API is running."
+    return f"IR Transmitter API is running (hardware: {HARDWARE_BACKEND})."
 
 
+# Sensor reading as returned by /data, shared with the webhook
+def readSensorData(max_age=None):
+    reading = sampler.getReading(maxAge=max_age)
+    temperature_c = reading.temperature_c
+    temperature_f = temperature_c * (9 / 5) + 32
+    humidity = reading.humidity
+    return {
+        "temperature_c": temperature_c,
+        "temperature_f": temperature_f,
+        "humidity": humidity,
+        "timestamp": reading.timestamp,
+        "age": reading.age()
+    }
+
 @app.route('/data', methods=['GET'])
 def get_sensor_data():
+    """
+    Latest sensor reading. Pass max_age (seconds) to wait for a newer reading if the
+    cached one is older than that.
+    """
+    max_age = request.args.get('max_age', type=float)
     try:
-        sensor = adafruit_dht.DHT11(board.D4)
-        temperature_c = sensor.temperature
-        temperature_f = temperature_c * (9 / 5) + 32
-        humidity = sensor.humidity
-        sensor.exit()
-        data = {
-            "temperature_c": temperature_c,
-            "temperature_f": temperature_f,
-            "humidity": humidity
-        }
-        return jsonify(data)
+        return jsonify(readSensorData(max_age))
     except RuntimeError as error:
         return jsonify({"error": error.args[0]})
-    except Exception as error:
-        sensor.exit()
-        return jsonify({"error": str(error)})
+
+# ========================================= #
+# Dialogflow intents. Each handler takes the intent's parameters and returns the
+# fulfillment text, calling the same functions as the HTTP routes directly.
+intent_handlers = {}
+
+def intent(action):
+    """Register the decorated function as the handler for a Dialogflow action."""
+    def register(handler):
+        intent_handlers[action] = handler
+        return handler
+    return register
+
+@intent('get_sensor_data')
+def sensor_data_intent(parameters):
+    try:
+        sensor_data = readSensorData()
+    except RuntimeError as error:
+        return f"Error: {error.args[0]}"
+
+    # Phản hồi lại cho Dialogflow
+    return f"The temperature is {sensor_data['temperature_c']:.1f}°C ({sensor_data['temperature_f']:.1f}°F) and the humidity is {sensor_data['humidity']:.1f}%."
+
+@intent('transmit_signal')
+def transmit_signal_intent(parameters):
+    button_name = textField(parameters, 'button_name')
+    remote_name = textField(parameters, 'remote')
+    if button_name is None or remote_name is None:
+        return "The button name and remote must be text."
+    if not button_name:
+        return "No button name provided."
+    return transmitSignal(button_name, remote_name)
 
 @app.route('/infor', methods=['POST'])
 def webhook():
     req = request.get_json(silent=True, force=True)
-    action = req.get('queryResult').get('action')
-    
-    if action == 'get_sensor_data':
-        try:
-            # Gọi API /data để lấy nhiệt độ và độ ẩm
-            response = requests.get('http://:5000/data')
-            sensor_data = response.json()
-
-            if 'error' in sensor_data:
-                return jsonify({
-                    "fulfillmentText": f"Error: {sensor_data['error']}"
-                })
-
-            # Format lại dữ liệu từ API /data
-            temperature_c = sensor_data['temperature_c']
-            temperature_f = sensor_data['temperature_f']
-            humidity = sensor_data['humidity']
-
-            # Phản hồi lại cho Dialogflow
-            fulfillment_text = f"The temperature is {temperature_c:.1f}°C ({temperature_f:.1f}°F) and the humidity is {humidity:.1f}%."
-            return jsonify({
-                "fulfillmentText": fulfillment_text
-            })
-        except Exception as error:
-            logging.error(f"Exception in webhook get_sensor_data: {str(error)}")
-            return jsonify({
-                "fulfillmentText": f"Error: {str(error)}"
-            })
-
-    elif action == 'transmit_signal':
-        button_name = req.get('queryResult').get('parameters').get('button_name')
-        if button_name:
-            # Gọi API /transmit để phát tín hiệu
-            transmit_response = requests.post('http://localhost:5000/transmit', json={'button_name': button_name})
-            transmit_result = transmit_response.json()
-            
-            if transmit_response.status_code == 200 and transmit_result.get('status') == 'success':
-                return jsonify({
-                    "fulfillmentText": transmit_result['message']
-                })
-            else:
-                return jsonify({
-                    "fulfillmentText": f"Error: {transmit_result.get('message', 'Unknown error')}"
-                })
-        else:
-            return jsonify({
-                "fulfillmentText": "No button name provided."
-            })
+    if req is None:
+        req = {}
+    query_result = req.get('queryResult') if isinstance(req, dict) else None
+    if query_result is None:
+        query_result = {}
+    parameters = query_result.get('parameters') if isinstance(query_result, dict) else None
+    if parameters is None:
+        parameters = {}
+    if not isinstance(req, dict) or not isinstance(query_result, dict) or not isinstance(parameters, dict):
+        return jsonify({
+            "fulfillmentText": "Sorry, that request isn't a Dialogflow webhook request."
+        }), 400
+    action = query_result.get('action')
+
+    handler = intent_handlers.get(action) if isinstance(action, str) else None
+    if handler is None:
+        return jsonify({
+            "fulfillmentText": f"Sorry, I can't handle '{action}' yet."
+        })
+
+    try:
+        fulfillment_text = handler(parameters)
+    except Exception as error:
+        logging.error(f"Exception in webhook {action}: {str(error)}")
+        fulfillment_text = f"Error: {str(error)}"
+    return jsonify({
+        "fulfillmentText": fulfillment_text
+    })
+
+# ========================================= #
+#^ Profiling and memory, only registered when IR_DEBUG is set (see diagnostics.py) ^#
+profiler = diagnostics.StackSampler()
+memory = diagnostics.MemoryTracker()
+
+def debug_profile():
+    """
+    Sample every thread's stack for ?seconds=N (default 10) every ?interval_ms (default 5)
+    and return the collapsed stacks, one 'frame;frame;... count' line each, for a flame graph.
+    """
+    if not diagnostics.allowed(request.remote_addr):
+        return jsonify({'status': 'error', 'message': 'Not found'}), 404
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'seconds and interval_ms must be numbers'}), 400
+    if not 0 < seconds <= diagnostics.MAX_PROFILE_SECONDS:
+        return jsonify({'status': 'error', 'message': f'seconds must be above 0 and at most {diagnostics.MAX_PROFILE_SECONDS}'}), 400
+
+    try:
+        counts, samples = profiler.profile(seconds, interval)
+    except diagnostics.ProfilerBusy as busy:
+        return jsonify({'status': 'error', 'message': str(busy)}), 409
+    return diagnostics.collapse(counts), 200, {'Content-Type': 'text/plain; charset=utf-8', 'X-Samples': str(samples)}
+
+def debug_memory():
+    """
+    Largest allocation sites (?limit, default 20, grouped by ?group=lineno|filename|traceback)
+    and what grew since the previous call. The first call starts tracemalloc; ?stop=1 stops it.
+    """
+    if not diagnostics.allowed(request.remote_addr):
+        return jsonify({'status': 'error', 'message': 'Not found'}), 404
+    if request.args.get('stop') in ('1', 'true'):
+        memory.stop()
+        return jsonify({'status': 'success', 'message': 'Stopped tracing allocations'})
+    try:
+        limit = int(request.args.get('limit', 20))
+        report = memory.report(limit, request.args.get('group', 'lineno'))
+    except ValueError as error:
+        return jsonify({'status': 'error', 'message': str(error)}), 400
+    return jsonify({'status': 'success', **report})
+
+if diagnostics.ENABLED:
+    app.add_url_rule('/debug/profile', view_func=debug_profile)
+    app.add_url_rule('/debug/memory', view_func=debug_memory)
+
+# ========================================= #
+def serve(host='0.0.0.0', port=5000, threads=8):
+    """
+    Production entry point: a multi-threaded server with no debugger or reloader.
+
+    Uses waitress when it is installed and the threaded Werkzeug server otherwise. The app
+    must run in a single process (e.g. gunicorn -w 1 --threads 8 Flask_API:app) because
+    the hardware queue that keeps IR transmissions from overlapping is per process.
+    """
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        logging.warning("waitress is not installed, serving with the threaded Werkzeug server")
+        from werkzeug.serving import run_simple
+        run_simple(host, port, app, threaded=True, use_reloader=False, use_debugger=False)
+        return
+    waitress_serve(app, host=host, port=port, threads=threads)
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000, debug='True')  # Adjust the port if needed
+    import argparse
+
+    parser = argparse.ArgumentParser(description="IR transmitter and sensor API")
+    parser.add_argument('command', nargs='?', choices=['dev', 'serve'], default='dev',
+                        help="'serve' for the production server, 'dev' (default) for the Flask debug server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)  # Adjust the port if needed
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.host, args.port, args.threads)
+    else:
+        app.run(host=args.host, port=args.port, debug=True)
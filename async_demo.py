@@ -0,0 +1,149 @@
+"""Serve HTTP, listen for remote presses and poll the DHT11 in one asyncio event loop.
+
+Runs on the simulated hardware: button presses are scripted onto the receiver pin of the
+simulated GPIO, the transmitter records its output and the sensor is dht_sim. While it
+runs the demo makes its own HTTP requests, and at the end it prints what each part did
+and the worst event loop lag, which stays small because all the timing critical work
+happens off the loop. The simulated edges are timed in real time, so on a loaded or
+virtualised machine some frames arrive too distorted to match a button.
+
+    python async_demo.py --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("IR_HARDWARE", "sim") # The presses are scripted onto gpio_sim, so pyIR has to use it too
+
+import dht_sim
+import gpio_sim
+from pyIR import Receiver, Transmitter, loadRemote
+
+RECEIVE_PIN = 11
+TRANSMIT_PIN = 12
+SENSOR_PIN = 4
+
+class Demo:
+    def __init__(self, remote):
+        self.remote = remote
+        self.receiver = Receiver(RECEIVE_PIN, mode="edge")
+        self.receiver.addRemote(remote)
+        self.transmitter = Transmitter(TRANSMIT_PIN)
+        self.sensor = dht_sim.DHT11(SENSOR_PIN)
+        self.reading = None
+        self.stats = {"frames": 0, "buttons": 0, "sensor_reads": 0, "sensor_errors": 0, "http_requests": 0, "transmits": 0, "max_loop_lag_ms": 0.0}
+
+    # ----------------- #
+    # Presses the remote's buttons by scripting their frames onto the receiver pin
+    async def pressButtons(self):
+        names = list(self.remote.buttonsByName)
+        while True:
+            waveform = self.remote.getWaveform(random.choice(names))
+            gpio_sim.scriptInput(RECEIVE_PIN, [(1 - typ, tme) for (typ, tme) in waveform]) # Receivers see the LED inverted
+            await asyncio.sleep(0.3)
+
+    async def listen(self):
+        index = self.receiver.getCodeIndex(self.receiver.remotes)
+        async for frame in self.receiver.frames():
+            self.stats["frames"] += 1
+            for protocol, buttons in index:
+                if buttons.get(protocol.getIntegerCode(frame)) is not None:
+                    self.stats["buttons"] += 1
+                    break
+
+    async def pollSensor(self):
+        while True:
+            try:
+                self.reading = await asyncio.to_thread(lambda: (self.sensor.temperature, self.sensor.humidity))
+                self.stats["sensor_reads"] += 1
+            except RuntimeError:
+                self.stats["sensor_errors"] += 1
+            await asyncio.sleep(2.0)
+
+    # Measures how late the loop wakes a sleeping task, which is what blocking calls would ruin
+    async def watchLoop(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = (time.perf_counter() - start - 0.01) * 1000
+            self.stats["max_loop_lag_ms"] = max(self.stats["max_loop_lag_ms"], lag)
+
+    # ----------------- #
+    # A very small HTTP/1.0 server: GET /data and POST /transmit/<button>
+    async def handle(self, reader, writer):
+        requestLine = (await reader.readline()).decode().split()
+        while (await reader.readline()).strip():
+            pass # Skip the headers
+        self.stats["http_requests"] += 1
+
+        status, body = "404 Not Found", {"error": "not found"}
+        if len(requestLine) >= 2 and requestLine[0] == "GET" and requestLine[1] == "/data":
+            status, body = "200 OK", {"temperature_c": self.reading and self.reading[0], "humidity": self.reading and self.reading[1]}
+        elif len(requestLine) >= 2 and requestLine[0] == "POST" and requestLine[1].startswith("/transmit/"):
+            waveform = self.remote.getWaveform(requestLine[1][len("/transmit/"):])
+            if waveform != -1:
+                await self.transmitter.send(waveform)
+                self.stats["transmits"] += 1
+                status, body = "200 OK", {"status": "success"}
+
+        payload = json.dumps(body).encode()
+        writer.write(b"HTTP/1.0 " + status.encode() + b"\r\nContent-Type: application/json\r\nContent-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+        await writer.drain()
+        writer.close()
+
+    async def request(self, port, method, path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"{method} {path} HTTP/1.0\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def client(self, port):
+        names = list(self.remote.buttonsByName)
+        while True:
+            await self.request(port, "GET", "/data")
+            await self.request(port, "POST", "/transmit/" + random.choice(names))
+            await asyncio.sleep(0.2)
+
+    async def run(self, duration):
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        tasks = [asyncio.create_task(task) for task in (self.pressButtons(), self.listen(), self.pollSensor(), self.watchLoop(), self.client(port))]
+        await asyncio.sleep(duration)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.close()
+        await server.wait_closed()
+        return self.stats
+
+    def close(self):
+        self.receiver.close()
+        self.transmitter.cleanup()
+        self.sensor.exit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--remote", default="my_remote.txt")
+    args = parser.parse_args()
+
+    from pyIR import GPIO
+    if GPIO is not gpio_sim:
+        raise SystemExit("async_demo.py runs on the simulated GPIO only")
+
+    demo = Demo(loadRemote(args.remote))
+    try:
+        stats = asyncio.run(demo.run(args.duration))
+    finally:
+        demo.close()
+    for name, value in stats.items():
+        print(name.ljust(20) + str(round(value, 2)))
+
+if __name__ == "__main__":
+    main()
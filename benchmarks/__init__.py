@@ -0,0 +1,11 @@
+"""Benchmarks for the IR capture, decode and transmit paths.
+
+Run a single benchmark from the repository root with e.g. ``python -m benchmarks.bench_capture``,
+or the whole suite against the stored baseline with ``python -m benchmarks`` (see __main__.py).
+Both, like load_test, run with IR_HARDWARE=auto unless it is set, so
+they work on the simulators off the Pi (see hardware.py).
+"""
+
+import os
+
+os.environ.setdefault("IR_HARDWARE", "auto") # Before any benchmark imports pyIR, and inherited by the runner's processes
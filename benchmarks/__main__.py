@@ -0,0 +1,259 @@
+"""Run the benchmark suite, write the results as JSON and compare them with a baseline.
+
+    python -m benchmarks                       every bench_*.py, compared with baseline.json
+    python -m benchmarks nec lookup --quick    just bench_nec and bench_lookup, short runs
+    python -m benchmarks --output results.json --save-baseline
+
+Every benchmark runs in its own Python process, so threads and hardware state one leaves
+behind (the Flask app's sampler, simulated pins) can't skew the next. The processes run
+with IR_HARDWARE=auto unless it is set (see __init__.py). A benchmark whose
+imports fail here (NumPy or Flask not installed) is reported as skipped.
+
+Comparison flattens the results to dotted metric names such as nec.getIntegerCode_fps or
+http.data_ms.p50. The direction of each metric comes from its name: rates and accuracies
+are better higher, times, errors and drops better lower. A metric that moved the wrong
+way by more than the threshold (a fraction of the baseline) is a regression, and the
+exit status is then 1. Counters that should stay at zero (mismatches, failures) regress
+on any increase. These are left out as noise:
+- changes of a time under 5 µs (50 ns for the _ns metrics);
+- max values;
+- metrics whose direction isn't known.
+
+--repeat runs every benchmark several times and keeps the best value of each metric,
+which steadies the comparison on a busy machine. Benchmarks of timing against the real
+clock (capture, transmit, scheduler, streaming) set GATED = False. Preemption on a shared
+machine moves them several fold between runs, so they are recorded but never fail the
+run. Baselines only mean something on the machine that recorded them. bench_virtual runs
+on simulated time, so it gives the same results everywhere; it is the repeatable check of
+the capture and transmit paths.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(DIRECTORY, "baseline.json")
+THRESHOLD = 0.5 # Busy small machines swing CPU bound results by a third between runs
+
+# Name fragments that tell which way a metric should go
+HIGHER_IS_BETTER = ("fps", "per_second", "mb_s", "accuracy", "decoded", "identical", "speedup", "hits")
+LOWER_IS_BETTER = ("_ms", "_us", "_ns", "latency", "error", "jitter", "drift", "cpu", "dropped", "overflows", "rejected")
+MUST_STAY_ZERO = ("mismatches", "failures", "other_errors", "misdetections")
+IGNORED = ("max",)
+MIN_CHANGE = {"_ns": 50, "_us": 5, "_ms": 0.005} # Smaller changes of a time are noise, whatever the percentage
+
+# The bench_*.py modules, by short name (bench_nec.py is "nec")
+def discover():
+    return sorted(name[len("bench_"):-len(".py")] for name in os.listdir(DIRECTORY)
+                  if name.startswith("bench_") and name.endswith(".py"))
+
+# Make results JSON friendly: tuples to lists, NumPy scalars to numbers
+def plain(value):
+    if isinstance(value, dict):
+        return {str(key): plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        return value.item()
+    return value
+
+# ========================================= #
+#^ Running ^#
+def runBenchmark(name, quick):
+    """Run one benchmark in this process and return its entry for the results."""
+    start = time.perf_counter()
+    try:
+        module = __import__("benchmarks.bench_" + name, fromlist=["run"])
+        results = module.run(quick=quick)
+    except ImportError as error:
+        return {"status": "skipped", "reason": str(error)}
+    except Exception as error:
+        return {"status": "error", "reason": repr(error), "traceback": traceback.format_exc()}
+    return {"status": "ok", "seconds": time.perf_counter() - start, "gated": getattr(module, "GATED", True), "results": plain(results)}
+
+def runIsolated(name, quick):
+    """Run one benchmark in a child process and return its entry for the results."""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "result.json")
+        command = [sys.executable, "-m", "benchmarks", "--child", name, "--child-output", output]
+        if quick:
+            command.append("--quick")
+        child = subprocess.run(command, cwd=os.path.dirname(DIRECTORY), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if not os.path.exists(output):
+            return {"status": "error", "reason": f"exited with status {child.returncode}", "stderr": child.stderr[-2000:]}
+        with open(output) as file:
+            return json.load(file)
+
+def runSuite(names, quick, repeat=1, log=print):
+    results = {}
+    for name in names:
+        log(f"running {name}...")
+        entry = runIsolated(name, quick)
+        for _ in range(repeat - 1):
+            again = runIsolated(name, quick)
+            if entry["status"] == "ok" and again["status"] == "ok":
+                entry["results"] = best(entry["results"], again["results"], name)
+        results[name] = entry
+        if entry["status"] != "ok":
+            log(f"  {entry['status']}: {entry['reason']}")
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "quick": quick,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "hardware": os.environ.get("IR_HARDWARE", "auto"),
+        },
+        "benchmarks": results,
+    }
+
+# ========================================= #
+#^ Comparing ^#
+# {"nec.getIntegerCode_fps": 130720.0, ...} for every number in the results
+def flatten(value, prefix=""):
+    metrics = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            metrics.update(flatten(item, prefix + "." + key if prefix else key))
+    elif isinstance(value, (int, float)): # bools too, identical=True is 1.0
+        metrics[prefix] = float(value)
+    return metrics
+
+# The better of two runs' results, metric by metric, to take the noise out of repeated runs
+def best(first, second, path):
+    if isinstance(first, dict) and isinstance(second, dict):
+        return {key: best(value, second[key], path + "." + key) if key in second else value for key, value in first.items()}
+    if isinstance(first, (int, float)) and isinstance(second, (int, float)) and not isinstance(first, bool):
+        sign = direction(path)
+        if sign > 0:
+            return max(first, second)
+        if sign < 0:
+            return min(first, second, key=abs)
+    return first
+
+# +1 if a metric should go up, -1 if down, 0 if unknown or not worth comparing
+def direction(metric):
+    parts = metric.lower().split(".")
+    if parts[-1] in IGNORED:
+        return 0
+    if any(part in MUST_STAY_ZERO for part in parts):
+        return -1
+    for part in reversed(parts): # The innermost name that says anything decides
+        if any(fragment in part for fragment in HIGHER_IS_BETTER):
+            return 1
+        if any(fragment in part for fragment in LOWER_IS_BETTER):
+            return -1
+    return 0
+
+def compare(current, baseline, threshold=THRESHOLD):
+    """Return (regressions, improvements) as lists of (metric, baseline, current, change)."""
+    regressions = []
+    improvements = []
+    for name, entry in current["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if entry["status"] != "ok" or before is None or before["status"] != "ok" or not entry.get("gated", True):
+            continue
+        old = flatten(before["results"], name)
+        for metric, value in flatten(entry["results"], name).items():
+            sign = direction(metric)
+            if sign == 0 or metric not in old:
+                continue
+            previous = old[metric]
+            if sign < 0: # Lower is better, drifts and the like can be either side of zero
+                previous, value = abs(previous), abs(value)
+            if previous == 0:
+                if any(part in MUST_STAY_ZERO for part in metric.split(".")) and value > 0:
+                    regressions.append((metric, previous, value, float("inf")))
+                continue
+            if abs(value - previous) < minimumChange(metric):
+                continue
+            change = (value - previous) / previous
+            if change * sign < -threshold:
+                regressions.append((metric, previous, value, change))
+            elif change * sign > threshold:
+                improvements.append((metric, previous, value, change))
+    return regressions, improvements
+
+def minimumChange(metric):
+    for part in reversed(metric.lower().split(".")):
+        for unit, change in MIN_CHANGE.items():
+            if part.endswith(unit) or unit + "_" in part:
+                return change
+    return 0
+
+def printChanges(title, changes, log=print):
+    if not changes:
+        return
+    log(title)
+    for metric, previous, value, change in changes:
+        log(f"  {metric.ljust(56)}{previous:12.4g} -> {value:<12.4g} {change:+.0%}")
+
+# ========================================= #
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmarks and compare them with a baseline")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all), e.g. nec for bench_nec.py")
+    parser.add_argument("--quick", action="store_true", help="short runs, as a smoke test")
+    parser.add_argument("--output", help="write the results as JSON to this file ('-' for stdout)")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="relative change that counts as a regression")
+    parser.add_argument("--repeat", type=int, default=1, help="run every benchmark this many times and keep the best of each metric")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        entry = runBenchmark(args.child, args.quick)
+        with open(args.child_output, "w") as file:
+            json.dump(entry, file)
+        return
+
+    available = discover()
+    if args.list:
+        print("\n".join(available))
+        return
+    unknown = [name for name in args.names if name not in available]
+    if unknown:
+        parser.error(f"no such benchmark: {', '.join(unknown)} (have {', '.join(available)})")
+
+    log = (lambda message: print(message, file=sys.stderr)) if args.output == "-" else print
+    results = runSuite(args.names or available, args.quick, max(1, args.repeat), log)
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+    elif args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        log(f"saved the baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        log(f"no baseline at {args.baseline}, run with --save-baseline to record one")
+        return
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline["meta"].get("quick") != args.quick:
+        log("warning: the baseline was recorded with%s --quick" % ("" if baseline["meta"].get("quick") else "out"))
+
+    regressions, improvements = compare(results, baseline, args.threshold)
+    printChanges(f"improvements over {args.threshold:.0%}:", improvements, log)
+    printChanges(f"regressions over {args.threshold:.0%}:", regressions, log)
+    log(f"{len(regressions)} regressions against {args.baseline}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compare the polling and edge driven capture modes of pyIR.Receiver on simulated input.
+
+For every frame this measures the CPU used by the process while waiting for and
+capturing the frame, the error of each captured pulse against the scripted one, and the
+time from the last edge of the frame until getRAW returns. The simulated GPIO driver runs
+in the same process, so its own CPU time is included in both modes.
+"""
+
+import time
+
+import gpio_sim
+import pyIR
+from benchmarks.common import necPulses, summarise, printTable
+
+PIN = 11
+GATED = False # Real clock timing, too noisy on a shared machine to fail a run on (see benchmarks/__main__.py)
+
+def captureFrames(receiver,frames,delay):
+    cpu = []
+    jitter = []
+    latency = []
+    for word in frames:
+        pulses = necPulses(word)
+        wallStart = time.monotonic()
+        cpuStart = time.process_time()
+        edges = gpio_sim.scriptInput(PIN,pulses,delay=delay)
+        raw = receiver.getRAW()
+        done = time.monotonic_ns()
+        cpuUsed = time.process_time() - cpuStart
+        wall = time.monotonic() - wallStart
+
+        cpu.append(100.0 * cpuUsed / wall)
+        latency.append((done - edges[-1]) / 1000)
+        jitter.extend(abs(got - want) for (_, got), (_, want) in zip(raw, pulses))
+    return {"cpu_percent": summarise(cpu), "jitter_us": summarise(jitter), "frame_end_latency_us": summarise(latency)}
+
+def run(quick=False):
+    if pyIR.GPIO is not gpio_sim:
+        raise RuntimeError("bench_capture needs the simulated GPIO backend")
+
+    frames = [0x20DF10EF + i for i in range(5 if quick else 30)]
+    results = {}
+    for mode in ("poll", "edge"):
+        gpio_sim.cleanup()
+        receiver = pyIR.Receiver(PIN,mode=mode)
+        results[mode] = captureFrames(receiver,frames,delay=0.02)
+        receiver.close()
+    gpio_sim.cleanup()
+    return results
+
+def main():
+    results = run()
+    for mode, stats in results.items():
+        printTable("capture mode: " + mode,stats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Cost of turning an AC state into a waveform, first time and from the encode cache.
+
+Every state the brand supports is encoded once with an empty cache (the work /climate
+does the first time a setting is asked for) and then again from the cache.
+"""
+
+import itertools
+import time
+
+from climate import ACState, AC_ENCODERS
+from benchmarks.common import summarise, printTable
+
+def allStates(encoder):
+    temperatures = range(encoder.MIN_TEMPERATURE, encoder.MAX_TEMPERATURE + 1)
+    for power, mode, temperature, fan, swing in itertools.product((True, False), ACState.MODES, temperatures, ACState.FAN_SPEEDS, (True, False)):
+        yield ACState(power, mode, temperature, fan, swing)
+
+def timeEncodes(encoder,states):
+    times = []
+    for state in states:
+        start = time.perf_counter_ns()
+        encoder.encode(state)
+        times.append((time.perf_counter_ns() - start) / 1000)
+    return summarise(times)
+
+def run(quick=False):
+    results = {}
+    for brand, encoderClass in AC_ENCODERS.items():
+        encoder = encoderClass()
+        states = list(allStates(encoder))
+        if quick:
+            states = states[::10]
+        encoder.MAX_CACHED = len(states) # Keep every state so the second pass is all hits
+        results[brand + " first_us"] = timeEncodes(encoder,states)
+        results[brand + " cached_us"] = timeEncodes(encoder,states)
+    return results
+
+def main():
+    printTable("AC state encoding",run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Request latency with per-request devices versus the long-lived DeviceManager ones.
+
+Runs the work of a /transmit and a /data request both ways: the old code built a
+Transmitter (and GPIO.setup) for every transmit and a DHT11 (with its pulsein helper
+process) for every read, the DeviceManager keeps one of each. Uses the bit-bang
+backend on the simulated GPIO and the simulated DHT11.
+"""
+
+import time
+
+import dht_sim
+import pyIR
+from device_manager import DeviceManager
+from benchmarks.common import summarise, printTable
+
+TRANSMIT_PIN = 12
+SENSOR_PIN = 4
+
+def latencies(request,count):
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        request()
+        times.append((time.perf_counter() - start) * 1000)
+    return summarise(times)
+
+def run(quick=False):
+    count = 5 if quick else 30
+    raw_data = tuple(pyIR.NEC().getRawFromIntegerCode(0x20DF10EF))
+
+    def transmitPerRequest():
+        pyIR.Transmitter(TRANSMIT_PIN).sendSignal(raw_data)
+
+    def readPerRequest():
+        sensor = dht_sim.DHT11(SENSOR_PIN)
+        sensor.temperature, sensor.humidity
+        sensor.exit()
+
+    devices = DeviceManager(sensorFactory=dht_sim.DHT11)
+    results = {
+        "transmit_per_request_ms": latencies(transmitPerRequest,count),
+        "transmit_managed_ms": latencies(lambda: devices.transmit(TRANSMIT_PIN,raw_data),count),
+        "data_per_request_ms": latencies(readPerRequest,count),
+        "data_managed_ms": latencies(lambda: devices.readSensor(SENSOR_PIN),count),
+    }
+    devices.close()
+    return results
+
+def main():
+    printTable("request latency",run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Cost of the /debug profiler and allocation tracing.
+
+  sample_us            StackSampler.sample of 10 threads parked 20 frames deep
+  profile_load         CPU the sampler used over a 5 ms interval profile, as a fraction of a core (not compared)
+  alloc_ns             building a small dict, tracemalloc off
+  alloc_traced_ns      the same with tracemalloc on, 10 frames deep
+  snapshot_ms          MemoryTracker.report with tracing on
+The profiler costs nothing unless a profile is running, and tracing only starts with the
+first /debug/memory call, because alloc_traced_ns is several times alloc_ns.
+"""
+
+import threading
+import time
+
+import diagnostics
+from benchmarks.common import printTable
+
+def park(event,depth):
+    if depth:
+        return park(event,depth - 1)
+    event.wait()
+
+def allocationTime(count):
+    start = time.perf_counter_ns()
+    for i in range(count):
+        {"key": i, "other": (i, i)}
+    return (time.perf_counter_ns() - start) / count
+
+def run(quick=False):
+    release = threading.Event()
+    threads = [threading.Thread(target=park, args=(release, 20)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    try:
+        sampler = diagnostics.StackSampler()
+        skip = threading.get_ident()
+        sampler.sample(skip) # Fill the label cache
+        count = 200 if quick else 2000
+        start = time.perf_counter()
+        for _ in range(count):
+            sampler.sample(skip)
+        sample = (time.perf_counter() - start) * 1_000_000 / count
+
+        seconds = 0.2 if quick else 1.0
+        start = time.process_time()
+        sampler.profile(seconds, 0.005)
+        profileCpu = (time.process_time() - start) / seconds
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    count = 20_000 if quick else 200_000
+    untraced = allocationTime(count)
+    tracker = diagnostics.MemoryTracker()
+    tracker.report(10) # Starts tracing
+    traced = allocationTime(count)
+    start = time.perf_counter()
+    tracker.report(10)
+    snapshot = (time.perf_counter() - start) * 1000
+    tracker.stop()
+
+    return {"diagnostics": {
+        "sample_us": sample,
+        "profile_load": profileCpu,
+        "alloc_ns": untraced,
+        "alloc_traced_ns": traced,
+        "snapshot_ms": snapshot,
+    }}
+
+def main():
+    printTable("diagnostics",run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Property checks for the text remote format.
+
+round trip   thousands of generated remotes (any registered protocol, unicode names full of
+             ':', ',' and ';', codes up to 300 bits, duplicate names and codes) are saved
+             with saveRemote and must load back equal: same nickname, protocol, repeat
+             frames and buttons in the same order.
+mutations    saved files with random bytes inserted, deleted or replaced must either load
+             or raise RemoteFormatError; any other exception is a loader bug.
+
+The suite runs it with the fixed SEED, so every run checks the same remotes and mutations
+and any round trip failure or other_errors is a regression. On its own,
+python -m benchmarks.bench_fuzz [--remotes N] [--seed S] prints the failures and exits
+non-zero if there are any.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+import pyIR
+from benchmarks.common import printTable
+
+SEED = 1
+NAME_CHARACTERS = "abcXYZ019 _-:;,.'\"#=éü°℃→🙂\t"
+
+def randomName(rng,allowEmpty=False):
+    length = rng.randint(0 if allowEmpty else 1, 12)
+    return "".join(rng.choice(NAME_CHARACTERS) for _ in range(length))
+
+def randomRemote(rng):
+    protocol = rng.choice(list(pyIR.PROTOCOLS.values()))
+    remote = pyIR.Remote(randomName(rng,allowEmpty=True),protocol,rng.choice((0, 0, 1, 3)))
+    names = []
+    for _ in range(rng.randint(0, 20)):
+        name = rng.choice(names) if names and rng.random() < 0.1 else randomName(rng)
+        names.append(name)
+        remote.addButton(name,rng.getrandbits(rng.randint(1, 300)))
+    return remote
+
+def describe(remote):
+    return (remote.nickname, remote.protcol.getClassName(), remote.repeatFrames,
+            [(button.getNickname(), button.getIntegerCode()) for button in remote.buttons])
+
+def mutate(data,rng):
+    data = bytearray(data)
+    for _ in range(rng.randint(1, 4)):
+        position = rng.randrange(len(data) + 1)
+        action = rng.choice(("insert", "delete", "replace"))
+        byte = rng.choice(b":;,|\n\r0123456789abz \xff\xc3")
+        if action == "insert" or not data:
+            data.insert(position,byte)
+        elif action == "delete":
+            del data[min(position, len(data) - 1)]
+        else:
+            data[min(position, len(data) - 1)] = byte
+    return bytes(data)
+
+# The results and a description of every failure
+def check(count,seed):
+    rng = random.Random(seed)
+    failures = []
+    mutationResults = {"loaded": 0, "format_errors": 0, "other_errors": 0}
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory,"remote.txt")
+        for i in range(count):
+            remote = randomRemote(rng)
+            remote.saveRemote(filename)
+            loaded = pyIR.loadRemote(filename)
+            if describe(loaded) != describe(remote):
+                failures.append(("round trip", i, describe(remote), describe(loaded)))
+
+            with open(filename,"rb") as file:
+                saved = file.read()
+            with open(filename,"wb") as file:
+                file.write(mutate(saved,rng))
+            try:
+                pyIR.loadRemote(filename)
+                mutationResults["loaded"] += 1
+            except pyIR.RemoteFormatError:
+                mutationResults["format_errors"] += 1
+            except Exception as error:
+                mutationResults["other_errors"] += 1
+                failures.append(("mutation", i, saved, repr(error)))
+
+    return {"round_trip": {"remotes": count, "failures": sum(kind == "round trip" for kind, *_ in failures)},
+            "mutations": mutationResults}, failures
+
+def run(quick=False):
+    results, _ = check(300 if quick else 3000,SEED)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--remotes",type=int,default=3000)
+    parser.add_argument("--seed",type=int,default=SEED)
+    args = parser.parse_args()
+
+    results, failures = check(args.remotes,args.seed)
+    printTable("remote format fuzz",results)
+    for failure in failures[:10]:
+        print("FAIL", *failure)
+    if failures:
+        raise SystemExit(f"{len(failures)} failures")
+
+if __name__ == "__main__":
+    main()
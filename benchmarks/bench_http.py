@@ -0,0 +1,48 @@
+"""Latency of the HTTP routes through the Flask test client (no sockets).
+
+  transmit_ms       POST /transmit for a button of the default remote, including the frame
+                    being sent on the simulated GPIO through the hardware queue
+  transmit_miss_ms  POST /transmit for a button that doesn't exist
+  data_ms           GET /data, answered from the sampler's latest reading
+  infor_sensor_ms   POST /infor with the get_sensor_data intent
+  infor_transmit_ms POST /infor with the transmit_signal intent
+  climate_ms        GET /climate
+"""
+
+import time
+
+import Flask_API
+from benchmarks.common import summarise, printTable
+
+def latencies(request,count):
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = request()
+        times.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.request.path} answered {response.status_code}")
+    return summarise(times)
+
+def webhook(action,**parameters):
+    return {"queryResult": {"action": action, "parameters": parameters}}
+
+def run(quick=False):
+    client = Flask_API.app.test_client()
+    button = Flask_API.loaded_remote.buttons[0].getNickname()
+    Flask_API.sampler.getReading() # Wait for the first reading so /data answers from the cache
+    count = 5 if quick else 50
+    return {
+        "transmit_ms": latencies(lambda: client.post("/transmit",json={"button_name": button}),count),
+        "transmit_miss_ms": latencies(lambda: client.post("/transmit",json={"button_name": "no such button"}),count * 4),
+        "data_ms": latencies(lambda: client.get("/data"),count * 4),
+        "infor_sensor_ms": latencies(lambda: client.post("/infor",json=webhook("get_sensor_data")),count * 4),
+        "infor_transmit_ms": latencies(lambda: client.post("/infor",json=webhook("transmit_signal",button_name=button)),count),
+        "climate_ms": latencies(lambda: client.get("/climate"),count * 4),
+    }
+
+def main():
+    printTable("HTTP route latency (Flask test client)",run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Learning an AC remote from jittered presses with learning.cleanCaptures.
+
+Every state of a Whirlpool AC (hundreds of 343 pulse frames) is "pressed" several times
+with synthetic receiver noise: every pulse jittered, some presses with a space stretched
+over the bit threshold (a wrong bit) and some with a pulse split by a glitch.
+
+  single_accuracy    fraction of buttons whose first press alone decodes to the right code
+  learned_accuracy   fraction learnt with the right code from all the presses
+  learn_ms           cleanCaptures for every button
+  python_ms          the same median and outlier rejection in plain Python, for comparison
+  confidence         spread of the confidence scores
+  nec_unchecked      five jittered presses of an NEC code whose bytes aren't inverted (the
+                     shipped my_remote.txt button, from a Whirlpool AC remote): whether it is
+                     learnt with the right code, and its confidence
+"""
+
+import random
+import statistics
+import time
+
+import climate
+import learning
+import pyIR
+from benchmarks.common import summarise, printTable
+
+def pressFrame(widths,rng,jitter,wrongBit,glitch):
+    widths = [width + rng.randint(-jitter, jitter) for width in widths]
+    if rng.random() < wrongBit:
+        i = rng.randrange(3, len(widths), 2) # A short space stretched past ONE_THRESHOLD
+        widths[i] = 1300 if widths[i] < 1000 else 600
+    if rng.random() < glitch:
+        i = rng.randrange(2, len(widths) - 1)
+        widths[i:i + 1] = [widths[i] // 2, 40, widths[i] - widths[i] // 2 - 40]
+    return widths
+
+# Plain Python version of the median and outlier steps of cleanCaptures, for the timing comparison
+def pythonMedians(captures):
+    length = statistics.mode(len(capture) for capture in captures)
+    aligned = [capture for capture in captures if len(capture) == length]
+    median = [statistics.median(column) for column in zip(*aligned)]
+    tolerance = [max(learning.ABS_TOLERANCE, learning.REL_TOLERANCE * width) for width in median]
+    kept = [capture for capture in aligned
+            if all(abs(width - middle) <= limit for width, middle, limit in zip(capture, median, tolerance))]
+    return [statistics.median(column) for column in zip(*kept)] if kept else median
+
+def run(quick=False):
+    rng = random.Random(20)
+    encoder = climate.WhirlpoolAC()
+    states = [climate.ACState(mode=mode, temperature=temperature, fan=fan)
+              for mode in climate.ACState.MODES
+              for temperature in range(climate.ACState.MIN_TEMPERATURE, climate.ACState.MAX_TEMPERATURE + 1)
+              for fan in climate.ACState.FAN_SPEEDS]
+    if quick:
+        states = states[:40]
+    presses = 5
+
+    buttons = []
+    for state in states:
+        raw = encoder.encode(state)
+        code = encoder.protocol.decode(raw)
+        widths = [tme for _, tme in raw]
+        captures = [pressFrame(widths, rng, jitter=150, wrongBit=0.2, glitch=0.1) for _ in range(presses)]
+        buttons.append((code, captures))
+
+    single = sum(encoder.protocol.decode(captures[0]) == code for code, captures in buttons)
+
+    start = time.perf_counter()
+    signals = [learning.cleanCaptures(captures, encoder.PROTOCOL) for _, captures in buttons]
+    learnTime = (time.perf_counter() - start) * 1000
+    learned = sum(signal.code == code for signal, (code, _) in zip(signals, buttons))
+
+    cleaned = [[learning.removeGlitches(capture).tolist() for capture in captures] for _, captures in buttons]
+    start = time.perf_counter()
+    for captures in cleaned:
+        pythonMedians(captures)
+    pythonTime = (time.perf_counter() - start) * 1000
+
+    # NEC.decode rejects this code's bytes, learning with the remote's protocol still has to read it
+    nec = pyIR.NEC()
+    necCode = 16129253451
+    necWidths = [tme for _, tme in nec.getRawFromIntegerCode(necCode)]
+    necSignal = learning.cleanCaptures([pressFrame(necWidths, rng, jitter=150, wrongBit=0, glitch=0) for _ in range(presses)], pyIR.NEC)
+
+    return {
+        "nec_unchecked": {"decode_fails": nec.decode(necWidths) == -1, "learned_accuracy": float(necSignal.code == necCode),
+                          "checked": necSignal.checked, "confidence": necSignal.confidence},
+        "learning": {"buttons": len(buttons), "presses": presses, "pulses": len(buttons[0][1][0]),
+                     "single_accuracy": single / len(buttons), "learned_accuracy": learned / len(buttons),
+                     "learn_ms": learnTime, "python_ms": pythonTime},
+        "confidence": summarise([signal.confidence for signal in signals]),
+        "rejected_presses": summarise([signal.outliers for signal in signals]),
+    }
+
+def main():
+    printTable("learning from repeated presses",run())
+
+if __name__ == "__main__":
+    main()
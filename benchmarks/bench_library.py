@@ -0,0 +1,72 @@
+"""RemoteLibrary: batch import, and button lookups with and without the hot remote LRU.
+
+  import_ms      importRemoteFiles for every generated text remote in one transaction
+  hot_us         getWaveform for a remote already in the LRU (no database access)
+  cold_ms        getWaveform for a remote that has to be loaded and encoded first
+  find_code_us   findButton by (protocol, code) through the index
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from remote_library import RemoteLibrary
+from benchmarks.common import summarise, printTable
+
+def writeTextRemote(filename,name,buttons):
+    with open(filename,"w") as file:
+        file.write(f"nickname:{name}\nprotocol:NEC\nbuttons:")
+        file.write("".join(f"{button},{code}|" for button, code in buttons))
+
+def run(quick=False):
+    rng = random.Random(11)
+    remoteCount = 10 if quick else 50
+    buttonCount = 40 if quick else 100
+    with tempfile.TemporaryDirectory() as directory:
+        files = []
+        codes = []
+        for i in range(remoteCount):
+            buttons = [(f"button{j}", 3 << 32 | rng.getrandbits(32)) for j in range(buttonCount)]
+            codes.extend(code for _, code in buttons)
+            filename = os.path.join(directory,f"remote{i}.txt")
+            writeTextRemote(filename,f"room{i}",buttons)
+            files.append(filename)
+
+        library = RemoteLibrary(os.path.join(directory,"remotes.db"),cacheSize=8)
+        start = time.perf_counter()
+        names = library.importRemoteFiles(files)
+        importTime = (time.perf_counter() - start) * 1000
+
+        hot = []
+        cold = []
+        for _ in range(200 if quick else 1000):
+            name = rng.choice(names[:4]) # Four hot rooms fit in the LRU
+            start = time.perf_counter_ns()
+            library.getWaveform(name,f"button{rng.randrange(buttonCount)}")
+            hot.append((time.perf_counter_ns() - start) / 1000)
+        for name in names[4:]:
+            library.forget(name)
+            start = time.perf_counter_ns()
+            library.getWaveform(name,"button0")
+            cold.append((time.perf_counter_ns() - start) / 1e6)
+
+        find = []
+        for code in rng.sample(codes,200):
+            start = time.perf_counter_ns()
+            library.findButton("NEC",code)
+            find.append((time.perf_counter_ns() - start) / 1000)
+        library.close()
+
+    return {
+        "import": {"remotes": remoteCount, "buttons": remoteCount * buttonCount, "import_ms": importTime},
+        "hot_us": summarise(hot),
+        "cold_ms": summarise(cold),
+        "find_code_us": summarise(find),
+    }
+
+def main():
+    printTable("remote library",run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Button lookups on remotes of 10, 1k and 100k buttons.
+
+  identify_ns          Remote.identifyButton by integer code
+  identify_name_ns     Remote.identifyButtonByName
+  waveform_ns          Remote.getWaveform once the waveforms are precomputed
+  miss_ns              identifyButton for a code no button has
+  precompute_ms        encoding every button's waveform
+Lookups are dictionary hits, so the times should not grow with the size of the remote.
+"""
+
+import random
+import time
+
+import pyIR
+from benchmarks.common import printTable
+
+# Best of a few passes over the keys, in ns per lookup
+def lookupTime(lookup,keys,repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for key in keys:
+            lookup(key)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(keys)
+
+def run(quick=False):
+    rng = random.Random(22)
+    sizes = (10, 1000) if quick else (10, 1000, 100_000)
+    results = {}
+    for size in sizes:
+        remote = pyIR.Remote("bench", pyIR.NEC)
+        codes = rng.sample(range(1 << 32), size)
+        for i, code in enumerate(codes):
+            remote.addButton(f"button{i}", 3 << 32 | code)
+
+        start = time.perf_counter()
+        remote.precomputeWaveforms()
+        precompute = (time.perf_counter() - start) * 1000
+
+        count = 10_000
+        names = [f"button{rng.randrange(size)}" for _ in range(count)]
+        hits = [3 << 32 | rng.choice(codes) for _ in range(count)]
+        misses = [2 << 32 | rng.getrandbits(32) for _ in range(count)]
+        results[f"{size} buttons"] = {
+            "identify_ns": lookupTime(remote.identifyButton,hits),
+            "identify_name_ns": lookupTime(remote.identifyButtonByName,names),
+            "waveform_ns": lookupTime(remote.getWaveform,names),
+            "miss_ns": lookupTime(remote.identifyButton,misses),
+            "precompute_ms": precompute,
+        }
+    return results
+
+def main():
+    printTable("button lookups",run())
+
+if __name__ == "__main__":
+    main()
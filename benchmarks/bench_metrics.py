@@ -0,0 +1,77 @@
+"""Cost of updating and rendering the /metrics counters and histograms.
+
+  inc_ns             Counter.inc on an existing series
+  observe_ns         Histogram.observe with the default latency buckets
+  observe_4t_ns      the same from 4 threads at once, per call, lock contention included
+  render_ms          Registry.render with the series an API process typically has
+Updates run on every request and transmit, so they should stay well under a microsecond.
+"""
+
+import random
+import threading
+import time
+
+import metrics
+from benchmarks.common import printTable
+
+# Best of a few passes, in ns per call
+def updateTime(update,values,repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for value in values:
+            update(value)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(values)
+
+# ns per call with several threads updating the same series
+def threadedTime(update,values,threads=4):
+    barrier = threading.Barrier(threads + 1)
+    def work():
+        barrier.wait()
+        for value in values:
+            update(value)
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter_ns()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter_ns() - start) / (threads * len(values))
+
+def run(quick=False):
+    rng = random.Random(23)
+    count = 10_000 if quick else 100_000
+    registry = metrics.Registry()
+    requests = registry.register(metrics.Counter("requests_total", "", ("route",)))
+    latency = registry.register(metrics.Histogram("latency_seconds", "", ("method", "route", "status")))
+    values = [rng.expovariate(100) for _ in range(count)]
+
+    results = {
+        "inc_ns": updateTime(lambda value: requests.inc("/transmit"), values),
+        "observe_ns": updateTime(lambda value: latency.observe(value, "POST", "/transmit", "200"), values),
+        "observe_4t_ns": threadedTime(lambda value: latency.observe(value, "GET", "/data", "200"), values),
+    }
+
+    # Around what Flask_API ends up with: a dozen routes and statuses, a few dozen buttons
+    for route in range(12):
+        for status in ("200", "400", "503"):
+            latency.observe(0.01, "POST", f"/route{route}", status)
+    buttons = registry.register(metrics.Histogram("transmit_seconds", "", ("remote", "button"), metrics.TRANSMIT_BUCKETS))
+    for button in range(40):
+        buttons.observe(0.07, "remote", f"button{button}")
+    renders = 20 if quick else 200
+    start = time.perf_counter()
+    for _ in range(renders):
+        text = registry.render()
+    results["render_ms"] = (time.perf_counter() - start) * 1000 / renders
+    results["render_lines"] = text.count("\n")
+    return {"metrics": results}
+
+def main():
+    printTable("metrics",run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Decode throughput of the NEC decoders over synthetic jittered frames.
+
+Compares the original decimal-string getIntegerCode, the current bit-shifting one and
+the full NEC.decodeFrame, and checks the two getIntegerCode versions agree. Encoding
+(getRawFromIntegerCode) is timed over the decoded codes. The long
+frames (like the ~300 pulse air conditioner frames) show the cost of the string version
+growing with the frame length.
+"""
+
+import random
+import time
+
+import pyIR
+from benchmarks.common import necCommandPulses
+
+# The original decoder, kept here as the baseline
+def stringIntegerCode(rawDATA):
+    binary = 1
+    for (typ, tme) in rawDATA:
+        if typ == 1:
+            if tme > 1000:
+                binary = binary * 10 + 1
+            else:
+                binary *= 10
+    if len(str(binary)) > 34:
+        binary = int(str(binary)[:34])
+    return int(str(binary),2)
+
+# Best of a few passes, to keep scheduler noise out of the comparison
+def framesPerSecond(decode,frames,repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for frame in frames:
+            decode(frame)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best
+
+def run(quick=False):
+    rng = random.Random(1)
+    frames = [necCommandPulses(rng.randrange(256),rng.randrange(256),jitter=80,rng=rng) for _ in range(1000 if quick else 10000)]
+    nec = pyIR.NEC()
+
+    longFrames = [frame + frame[2:] * 4 for frame in frames[:len(frames) // 10]]
+
+    mismatches = sum(stringIntegerCode(f) != nec.getIntegerCode(f) for f in frames + longFrames)
+    invalid = sum(not nec.decodeFrame(f).valid for f in frames)
+    return {
+        "string_getIntegerCode_fps": framesPerSecond(stringIntegerCode,frames),
+        "getIntegerCode_fps": framesPerSecond(nec.getIntegerCode,frames),
+        "decodeFrame_fps": framesPerSecond(nec.decodeFrame,frames),
+        "string_long_frame_fps": framesPerSecond(stringIntegerCode,longFrames),
+        "getIntegerCode_long_frame_fps": framesPerSecond(nec.getIntegerCode,longFrames),
+        "getRawFromIntegerCode_fps": framesPerSecond(nec.getRawFromIntegerCode,[nec.getIntegerCode(f) for f in frames]),
+        "mismatches": mismatches,
+        "invalid_frames": invalid,
+    }
+
+def main():
+    for name, value in run().items():
+        print(name.ljust(32) + format(value, ".0f"))
+
+if __name__ == "__main__":
+    main()
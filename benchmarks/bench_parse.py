@@ -0,0 +1,70 @@
+"""Parse throughput of the text remote format.
+
+Compares pyIR.readRemote, the strict single pass parser, with the parser it replaced
+(kept below: readlines, split(":"), eval of the protocol) on remotes of growing size.
+Neither encodes waveforms, so this is parsing and building the Remote only. The old
+parser only understands ',' between a button's name and code, so the files use ','.
+"""
+
+import os
+import random
+import tempfile
+import time
+
+import pyIR
+from pyIR import Remote
+from benchmarks.common import printTable
+
+# The loader as it was before the strict parser, for comparison
+def legacyReadRemote(filename):
+    with open(filename) as file:
+        data = file.readlines()
+
+    remoteInfo = {}
+    for line in data:
+        propertyName, dataValue = line.split(":")
+        remoteInfo[propertyName] = dataValue
+
+    newRemote = Remote(remoteInfo["nickname"],eval(remoteInfo["protocol"],vars(pyIR))) # Evaluated in pyIR, where the loader lived
+    for button in remoteInfo["buttons"].split("|"):
+        if button != "":
+            buttonDat = button.split(",")
+            newRemote.addButton(buttonDat[0],int(buttonDat[1]))
+    return newRemote
+
+def best(function,filename,rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function(filename)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run(quick=False):
+    rng = random.Random(5)
+    sizes = (1000, 10000) if quick else (1000, 10000, 100000)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory,"remote.txt")
+        for size in sizes:
+            with open(filename,"w") as file:
+                file.write("nickname:Bench\nprotocol:NEC\nbuttons:")
+                file.write("".join(f"button{i},{3 << 32 | rng.getrandbits(32)}|" for i in range(size)))
+            megabytes = os.path.getsize(filename) / 1e6
+
+            rounds = 3 if size >= 100000 else 7
+            strict = best(pyIR.readRemote,filename,rounds)
+            legacy = best(legacyReadRemote,filename,rounds)
+            results[f"{size} buttons"] = {
+                "strict_mb_s": megabytes / strict,
+                "legacy_mb_s": megabytes / legacy,
+                "strict_buttons_s": size / strict,
+                "legacy_buttons_s": size / legacy,
+            }
+    return results
+
+def main():
+    printTable("text remote parsing",run())
+
+if __name__ == "__main__":
+    main()
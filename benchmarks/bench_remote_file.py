@@ -0,0 +1,73 @@
+"""Load times of the text and binary remote formats for remotes with thousands of buttons.
+
+For each size this saves a remote in the text format and in the binary format, then times:
+  text_save_ms      Remote.saveRemote
+  text_load_ms      pyIR.loadRemote (parse every line, build the Remote, encode waveforms)
+  binary_load_ms    remote_file.loadBinaryRemote (the same Remote from the binary file)
+  binary_read_ms    reading every button from a RemoteFile, without building a Remote
+  mmap_open_ms      opening a RemoteFile, which only reads the header
+  mmap_lookup_us    one getButton by name on the open RemoteFile
+  text_kb, binary_kb  the size of each file; the binary one's variable length records and
+                    narrow indexes keep it under the text one
+"""
+
+import os
+import random
+import tempfile
+import time
+
+import pyIR
+import remote_file
+
+def buildRemote(buttons):
+    remote = pyIR.Remote("Bench",pyIR.NEC)
+    for name, code in buttons:
+        remote.addButton(name,code)
+    return remote
+
+def timed(function,*args):
+    start = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+def run(quick=False):
+    rng = random.Random(7)
+    sizes = (1000,) if quick else (1000, 5000, 20000)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        textFile = os.path.join(directory,"remote.txt")
+        binaryFile = os.path.join(directory,"remote.irr")
+        for size in sizes:
+            buttons = [(f"button{i}", 3 << 32 | rng.getrandbits(32)) for i in range(size)]
+            saveTime, _ = timed(buildRemote(buttons).saveRemote,textFile)
+            textTime, remote = timed(pyIR.loadRemote,textFile)
+            remote_file.saveBinaryRemote(remote,binaryFile)
+            binaryTime, _ = timed(remote_file.loadBinaryRemote,binaryFile)
+
+            openTime, remoteFile = timed(remote_file.RemoteFile,binaryFile)
+            readTime, _ = timed(lambda: list(remoteFile.buttons()))
+            names = [rng.choice(buttons)[0] for _ in range(1000)]
+            start = time.perf_counter()
+            for name in names:
+                remoteFile.getButton(name)
+            lookup = (time.perf_counter() - start) / len(names) * 1e6
+            remoteFile.close()
+
+            results[f"{size} buttons"] = {
+                "text_save_ms": saveTime,
+                "text_load_ms": textTime,
+                "binary_load_ms": binaryTime,
+                "binary_read_ms": readTime,
+                "mmap_open_ms": openTime,
+                "mmap_lookup_us": lookup,
+                "text_kb": os.path.getsize(textFile) / 1024,
+                "binary_kb": os.path.getsize(binaryFile) / 1024,
+            }
+    return results
+
+def main():
+    from benchmarks.common import printTable
+    printTable("remote file loading",run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Cumulative drift of per-pulse sleeping versus PulseScheduler deadlines.
+
+Both pacing strategies record the perf_counter_ns time of every edge of a 67 pulse NEC
+frame and of a 300 pulse air conditioner style frame, and the error of each edge is
+measured against its ideal offset from the start of the frame.
+"""
+
+from time import perf_counter_ns, sleep
+
+import pyIR
+from pulse_scheduler import PulseScheduler
+from benchmarks.common import summarise, printTable
+
+GATED = False # Real clock timing, too noisy on a shared machine to fail a run on (see benchmarks/__main__.py)
+
+# The original pacing: set the level, then sleep for the pulse's duration
+def sleepPerPulse(raw_data,output):
+    for (typ, duration) in raw_data:
+        output(typ)
+        sleep(duration / 1_000_000)
+    output(0)
+
+def measure(pace,raw_data,frames):
+    edgeErrors = []
+    drift = []
+    for _ in range(frames):
+        edges = []
+        pace(raw_data,lambda level: edges.append((perf_counter_ns(), level)))
+        errors = pyIR.edgeTimingErrors(edges,raw_data)
+        edgeErrors.extend(abs(e) for e in errors)
+        drift.append(errors[-1])
+    return {"edge_error_us": summarise(edgeErrors), "cumulative_drift_us": summarise(drift)}
+
+def run(quick=False):
+    nec = tuple(pyIR.NEC().getRawFromIntegerCode(0x20DF10EF))
+    longFrame = nec[:-1] * 4 + nec[-1:] # Roughly the length of an AC frame
+    frames = 3 if quick else 20
+    scheduler = PulseScheduler()
+    results = {}
+    for frameName, raw_data in (("nec", nec), ("long", longFrame)):
+        results[frameName + "/sleep_per_pulse"] = measure(sleepPerPulse,raw_data,frames)
+        results[frameName + "/pulse_scheduler"] = measure(scheduler.run,raw_data,frames)
+    return results
+
+def main():
+    for name, stats in run().items():
+        printTable(name,stats)
+
+if __name__ == "__main__":
+    main()
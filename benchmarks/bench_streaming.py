@@ -0,0 +1,96 @@
+"""Stress pyIR.StreamingReceiver with held buttons on simulated input.
+
+Each press is a full NEC frame followed by NEC repeat codes every 108 ms for as long as
+the button is held, scripted back to back so the receiver never gets a quiet moment
+between presses. The benchmark checks that every frame comes out as an event (the first
+with the button, the rest as repeats of it), reports the pipeline's drop counters and
+the time from the end of each frame to its event being handed to the consumer.
+
+Only lost frames and drops count as a failure. Frames that decode to the wrong button
+(or none) are reported as unmatched; they come from the simulated driver delivering an
+edge late, which on a busy or single core machine happens without any receiver running.
+"""
+
+import time
+
+import gpio_sim
+import pyIR
+from benchmarks.common import necCommandPulses, summarise, printTable
+
+PIN = 13
+FRAME_PERIOD = 108000 # µs from the start of one frame to the start of the next while a button is held
+REPEAT_CODE = [(0, 9000), (1, 2250), (0, 560)]
+GATED = False # Real clock timing, too noisy on a shared machine to fail a run on (see benchmarks/__main__.py)
+
+# Pulses for one press held for `repeats` repeat codes, each frame padded out to the NEC frame period
+def heldPress(address,command,repeats):
+    frames = [necCommandPulses(address,command)] + [REPEAT_CODE] * repeats
+    pulses = []
+    for frame in frames:
+        pulses.extend(frame)
+        pulses.append((1, FRAME_PERIOD - sum(t for _, t in frame)))
+    return pulses
+
+def buildRemote(commands):
+    remote = pyIR.Remote("bench",pyIR.NEC)
+    nec = pyIR.NEC()
+    for command in commands:
+        code = nec.getIntegerCode(necCommandPulses(0x20,command))
+        remote.addButton("button%d" % command,code)
+    return remote
+
+def run(quick=False):
+    if pyIR.GPIO is not gpio_sim:
+        raise RuntimeError("bench_streaming needs the simulated GPIO backend")
+
+    presses = 3 if quick else 8
+    repeats = 9 if quick else 27 # About 1 s and 3 s held
+    commands = [0x10 + i for i in range(presses)]
+
+    gpio_sim.cleanup()
+    receiver = pyIR.StreamingReceiver(PIN)
+    receiver.addRemote(buildRemote(commands))
+    receiver.start()
+
+    # Script everything up front; the simulated driver plays the edges out in real time
+    frameEnds = []
+    for command in commands:
+        edges = gpio_sim.scriptInput(PIN,heldPress(0x20,command,repeats),delay=0.05)
+        # Frame ends are the edges followed by an idle gap (and the very last edge)
+        frameEnds.extend(edges[i] for i in range(len(edges)) if i + 1 == len(edges) or edges[i + 1] - edges[i] > receiver.idleGap)
+
+    expected = presses * (repeats + 1)
+    latency = []
+    unmatched = 0
+    events = 0
+    current = None
+    while events < expected:
+        event = receiver.getEvent(timeout=1.0)
+        if event is None:
+            break
+        latency.append((time.monotonic_ns() - frameEnds[events]) / 1000)
+        if not event.repeat:
+            current = event.button
+            if current is None or current.getNickname() != "button%d" % commands[events // (repeats + 1)]:
+                unmatched += 1
+        elif event.button is not current:
+            unmatched += 1
+        events += 1
+
+    receiver.stop()
+    gpio_sim.cleanup()
+    stats = receiver.getStats()
+    return {
+        "frames": {"expected": expected, "events": events, "unmatched": unmatched},
+        "drops": {k: stats[k] for k in ("edgeOverflows", "framesDropped", "eventsDropped")},
+        "event_latency_us": summarise(latency),
+    }
+
+def main():
+    results = run()
+    printTable("streaming receiver, held NEC buttons",results)
+    if results["frames"]["events"] != results["frames"]["expected"] or any(results["drops"].values()):
+        raise SystemExit("frames were lost")
+
+if __name__ == "__main__":
+    main()
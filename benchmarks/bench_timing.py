@@ -0,0 +1,71 @@
+"""Per-edge overhead of the old datetime based pulse timing versus the perf_counter_ns one.
+
+Both loops below mirror the edge handling in Receiver.getPulses, fed by a reader that
+changes level on every call, so each iteration records one pulse.
+"""
+
+import sys
+import time
+from array import array
+from datetime import datetime
+from itertools import cycle
+
+from benchmarks.common import necPulses
+
+# The original getRAW inner loop: datetime per edge, tuple per pulse
+def datetimeEdges(edges):
+    read = cycle((1, 0)).__next__
+    command = []
+    previousValue = 0
+    startTime = datetime.now()
+    for _ in range(edges):
+        value = read()
+        if value != previousValue:
+            now = datetime.now()
+            pulseLength = now - startTime
+            startTime = now
+            command.append((previousValue, pulseLength.microseconds))
+        previousValue = value
+    return command
+
+# The current loop: integer ns timestamps into a compact array
+def monotonicEdges(edges):
+    read = cycle((1, 0)).__next__
+    clock = time.perf_counter_ns
+    pulses = array('I')
+    previousValue = 0
+    startTime = clock()
+    for _ in range(edges):
+        value = read()
+        now = clock()
+        if value != previousValue:
+            pulses.append((now - startTime) // 1000)
+            startTime = now
+            previousValue = value
+    return pulses
+
+def perEdge(loop,edges,repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        loop(edges)
+        elapsed = (time.perf_counter_ns() - start) / edges
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(quick=False):
+    edges = 20_000 if quick else 200_000
+    frame = necPulses(0x20DF10EF)
+    return {
+        "datetime_ns_per_edge": perEdge(datetimeEdges,edges,3),
+        "perf_counter_ns_per_edge": perEdge(monotonicEdges,edges,3),
+        "tuple_frame_bytes": sys.getsizeof(frame) + sum(sys.getsizeof(p) for p in frame),
+        "array_frame_bytes": sys.getsizeof(array('I',[tme for _, tme in frame])),
+    }
+
+def main():
+    for name, value in run().items():
+        print(name.ljust(32) + format(value, ".1f"))
+
+if __name__ == "__main__":
+    main()
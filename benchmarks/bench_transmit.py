@@ -0,0 +1,55 @@
+"""Timing error of the transmit backends when sending an NEC frame.
+
+The bit-bang and waveform backends run on the simulated GPIO, whose output pin records
+the time of every level change; the simulated backend records its own edges. Errors are
+in µs against the ideal edge times, measured from the first edge of the frame.
+"""
+
+import gpio_sim
+import pyIR
+from benchmarks.common import summarise, printTable
+
+PIN = 12
+GATED = False # Real clock timing, too noisy on a shared machine to fail a run on (see benchmarks/__main__.py)
+
+def frameErrors(backendName,raw_data,frames):
+    errors = []
+    drift = []
+    backend = pyIR.TRANSMIT_BACKENDS[backendName](PIN)
+    for _ in range(frames):
+        if backendName == "sim":
+            backend.send(raw_data)
+            errs = pyIR.edgeTimingErrors(backend.edges,raw_data)
+        else:
+            gpio_sim.clearOutputs(PIN)
+            backend.send(raw_data)
+            edges = gpio_sim.getOutputs(PIN)
+            if backendName == "waveform":
+                wave = backend.compile(raw_data)
+                errs = [(t - edges[0][0] - offset) / 1000 for (t, _), (offset, _) in zip(edges, wave)]
+            else:
+                errs = pyIR.edgeTimingErrors(edges,raw_data)
+        errors.extend(abs(e) for e in errs)
+        drift.append(errs[-1])
+    backend.close()
+    return {"edge_error_us": summarise(errors), "end_of_frame_drift_us": summarise(drift)}
+
+def run(quick=False):
+    if pyIR.GPIO is not gpio_sim:
+        raise RuntimeError("bench_transmit needs the simulated GPIO backend")
+
+    gpio_sim.cleanup()
+    raw_data = tuple(pyIR.NEC().getRawFromIntegerCode(0x20DF10EF))
+    frames = 3 if quick else 20
+    results = {}
+    for name in ("bitbang", "waveform", "sim"):
+        results[name] = frameErrors(name,raw_data,frames)
+    gpio_sim.cleanup()
+    return results
+
+def main():
+    for name, stats in run().items():
+        printTable("backend: " + name,stats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Capture, transmit and sensor reads on simulated time (timebase.VirtualClock).
+
+On the real clock the simulated GPIO's timings depend on how busy the machine is. On a
+VirtualClock every sleep and busy-wait is simulated, so these numbers are the same on
+every run and every machine and a change in them is a change in the code:
+
+  capture        NEC frames scripted on the input pin and read by the polling Receiver:
+                 error of every captured pulse and whether the frame decoded right
+  transmit       an NEC frame sent by the bit-bang backend: error of every recorded edge
+  macro          a four step macro sent as one DeviceManager.transmitSequence: how late each
+                 step started against its schedule
+  sensor         scripted DHT11 readings (including failures) through dht_sim
+  repeatable     whether a second run came out exactly the same
+  wall_ms        real time the simulated run took
+"""
+
+import random
+import time
+
+import dht_sim
+import gpio_sim
+import pyIR
+import timebase
+from device_manager import DeviceManager
+from benchmarks.common import necCommandPulses, summarise, printTable
+
+RECEIVE_PIN = 11
+TRANSMIT_PIN = 12
+SENSOR_PIN = 4
+
+def simulate(frames):
+    rng = random.Random(21)
+    gpio_sim.cleanup()
+    receiver = pyIR.Receiver(RECEIVE_PIN)
+    nec = pyIR.NEC()
+    pulseErrors = []
+    decoded = 0
+    for _ in range(frames):
+        address, command = rng.randrange(256), rng.randrange(256)
+        pulses = necCommandPulses(address, command, jitter=100, rng=rng)
+        gpio_sim.scriptInput(RECEIVE_PIN, pulses, delay=0.01)
+        captured = receiver.getPulses(timeout=1)
+        pulseErrors.extend(abs(got - want) for got, (_, want) in zip(captured, pulses))
+        frame = nec.decodeFrame(captured)
+        decoded += frame.valid and frame.data == (address | (address ^ 0xFF) << 8 | command << 16 | (command ^ 0xFF) << 24)
+
+    transmitter = pyIR.Transmitter(TRANSMIT_PIN)
+    raw_data = tuple(nec.getRawFromIntegerCode(0x20DF10EF))
+    edgeErrors = []
+    for _ in range(frames):
+        gpio_sim.clearOutputs(TRANSMIT_PIN)
+        transmitter.sendSignal(raw_data)
+        edgeErrors.extend(abs(error) for error in pyIR.edgeTimingErrors(gpio_sim.getOutputs(TRANSMIT_PIN), raw_data))
+
+    remote = pyIR.Remote("bench", pyIR.NEC)
+    remote.addButton("power", 3 << 32 | 0x20DF10EF)
+    remote.addButton("up", 3 << 32 | 0x20DF40BF)
+    macro = pyIR.Macro.fromList("macro", [{"button_name": "power"}, {"button_name": "up", "repeats": 2, "gap_us": 150000},
+                                          {"button_name": "up"}, {"button_name": "power", "gap_us": 50000}])
+    schedule = remote.scheduleMacro(macro)
+    devices = DeviceManager(sensorFactory=None)
+    stepLateness = []
+    for _ in range(max(1, frames // 5)):
+        results = devices.transmitSequence(TRANSMIT_PIN, [(raw_data, start) for (step, raw_data, start) in schedule])
+        stepLateness.extend(abs(result["late_us"]) for result in results)
+    devices.close()
+
+    dht_sim.scriptReadings(SENSOR_PIN, [(21, 40), None, (22, 41), (23, 42)])
+    sensor = dht_sim.DHT11(SENSOR_PIN, use_pulseio=False)
+    readings = []
+    for _ in range(4):
+        try:
+            readings.append((sensor.temperature, sensor.humidity))
+        except RuntimeError:
+            readings.append(None)
+        timebase.clock.sleep(sensor.MIN_INTERVAL + 0.1)
+    sensor.exit()
+    dht_sim.clearReadings(SENSOR_PIN)
+    gpio_sim.cleanup()
+
+    return {
+        "capture": {"frames": frames, "decoded": decoded, **{"pulse_error_" + k: v for k, v in summarise(pulseErrors).items()}},
+        "transmit": {"frames": frames, **{"edge_error_" + k: v for k, v in summarise(edgeErrors).items()}},
+        "macro": {"steps": len(stepLateness), "step_late_us": summarise(stepLateness)},
+        "sensor": {"readings": readings},
+    }
+
+def run(quick=False):
+    if pyIR.GPIO is not gpio_sim:
+        raise RuntimeError("bench_virtual needs the simulated GPIO backend")
+
+    frames = 5 if quick else 30
+    previous = timebase.clock.virtual
+    try:
+        start = time.perf_counter()
+        timebase.useVirtualClock()
+        first = simulate(frames)
+        wall = (time.perf_counter() - start) * 1000
+        timebase.useVirtualClock()
+        second = simulate(frames)
+    finally:
+        if previous is None:
+            timebase.useRealClock()
+        else:
+            timebase.useVirtualClock(previous)
+
+    first["repeatable"] = {"identical": first == second, "wall_ms": wall}
+    return first
+
+def main():
+    printTable("simulated time", run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Latency of /infor webhook requests answered in-process versus over an HTTP loopback.
+
+Serves Flask_API on a local threaded server and times webhook requests for the
+get_sensor_data intent. For comparison the benchmark registers a 'loopback' intent that
+fetches /data from the same server over HTTP, which is what the webhook used to do.
+"""
+
+import json
+import threading
+import time
+import urllib.request
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import Flask_API
+from benchmarks.common import summarise, printTable
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self,*args):
+        pass
+
+def post(url,payload):
+    request = urllib.request.Request(url,data=json.dumps(payload).encode(),headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def latencies(url,action,count):
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        post(url,{"queryResult": {"action": action, "parameters": {}}})
+        times.append((time.perf_counter() - start) * 1000)
+    return summarise(times)
+
+def run(quick=False):
+    server = make_server("127.0.0.1",0,Flask_API.app,threaded=True,request_handler=QuietHandler)
+    base = "http://127.0.0.1:%d" % server.server_port
+    thread = threading.Thread(target=server.serve_forever,daemon=True)
+    thread.start()
+
+    @Flask_API.intent('loopback_sensor_data')
+    def loopback(parameters):
+        with urllib.request.urlopen(base + "/data") as response:
+            data = json.loads(response.read())
+        return "The temperature is %.1f°C" % data["temperature_c"]
+
+    try:
+        Flask_API.sampler.getReading() # Wait for the first reading so both paths hit the cache
+        count = 20 if quick else 200
+        return {
+            "loopback_ms": latencies(base + "/infor","loopback_sensor_data",count),
+            "in_process_ms": latencies(base + "/infor","get_sensor_data",count),
+        }
+    finally:
+        del Flask_API.intent_handlers['loopback_sensor_data']
+        server.shutdown()
+
+def main():
+    printTable("/infor get_sensor_data latency",run())
+
+if __name__ == "__main__":
+    main()
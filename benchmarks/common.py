@@ -0,0 +1,38 @@
+"""Helpers shared by the benchmark scripts."""
+
+import random
+
+# Build a receiver-side NEC frame (LOW = carrier on) for a 32 bit word sent MSB first
+def necPulses(word,jitter=0,rng=random):
+    def us(t):
+        return t + rng.randint(-jitter,jitter) if jitter else t
+
+    pulses = [(0, us(9000)), (1, us(4500))]
+    for i in range(31, -1, -1):
+        pulses.append((0, us(560)))
+        pulses.append((1, us(1690) if (word >> i) & 1 else us(560)))
+    pulses.append((0, us(560)))
+    return pulses
+
+# Build a receiver-side NEC frame for an address and command, sent least significant bit first
+def necCommandPulses(address,command,jitter=0,rng=random):
+    data = address | (address ^ 0xFF) << 8 | command << 16 | (command ^ 0xFF) << 24
+    word = int(format(data, "032b")[::-1], 2)
+    return necPulses(word,jitter,rng)
+
+# Summarise a list of numbers as mean / p50 / p99 / max
+def summarise(values):
+    if not values:
+        return {"mean": 0, "p50": 0, "p99": 0, "max": 0}
+    ordered = sorted(values)
+    return {
+        "mean": sum(ordered) / len(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "max": ordered[-1],
+    }
+
+def printTable(title,rows):
+    print(title)
+    for name, stats in rows.items():
+        print("  " + name.ljust(28) + "  ".join(k + "=" + (format(v, ".1f") if isinstance(v, float) else str(v)) for k, v in stats.items()))
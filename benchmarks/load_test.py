@@ -0,0 +1,84 @@
+"""Load test for /transmit with the simulated GPIO.
+
+Serves Flask_API on a local threaded server and has a number of client threads post
+/transmit as fast as they can for a fixed time. Reports latency percentiles of the
+accepted requests, throughput, and how many were turned away with 503 + Retry-After
+because the hardware queue was full.
+
+    python -m benchmarks.load_test --clients 16 --duration 10
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import Flask_API
+from benchmarks.common import summarise, printTable
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self,*args):
+        pass
+
+def client(url,button,stopAt,results):
+    body = json.dumps({"button_name": button}).encode()
+    while time.monotonic() < stopAt:
+        request = urllib.request.Request(url,data=body,headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+            results["ok"].append((time.perf_counter() - start) * 1000)
+        except urllib.error.HTTPError as error:
+            if error.code == 503:
+                results["busy"] += 1
+                results["retry_after"].append(int(error.headers.get("Retry-After", 0)))
+                time.sleep(0.01)
+            else:
+                results["errors"] += 1
+
+def run(quick=False,clients=None,duration=None):
+    clients = clients or (4 if quick else 16)
+    duration = duration or (2.0 if quick else 10.0)
+    button = Flask_API.loaded_remote.buttons[0].getNickname()
+
+    server = make_server("127.0.0.1",0,Flask_API.app,threaded=True,request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever,daemon=True)
+    thread.start()
+    url = "http://127.0.0.1:%d/transmit" % server.server_port
+
+    results = {"ok": [], "busy": 0, "errors": 0, "retry_after": []}
+    started = time.monotonic()
+    stopAt = started + duration
+    workers = [threading.Thread(target=client,args=(url,button,stopAt,results)) for _ in range(clients)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    server.shutdown()
+
+    return {
+        "latency_ms": summarise(results["ok"]),
+        "requests": {
+            "accepted": len(results["ok"]),
+            "rejected_503": results["busy"],
+            "errors": results["errors"],
+            "throughput_per_s": len(results["ok"]) / elapsed,
+            "max_retry_after_s": max(results["retry_after"], default=0),
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients",type=int,default=16)
+    parser.add_argument("--duration",type=float,default=10.0)
+    args = parser.parse_args()
+    printTable("/transmit under load",run(clients=args.clients,duration=args.duration))
+
+if __name__ == "__main__":
+    main()
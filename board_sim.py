@@ -0,0 +1,12 @@
+"""Simulated stand-in for Adafruit Blinka's board module.
+
+Only the pin names are needed off the Pi. They are plain BCM numbers here, which dht_sim
+accepts as the sensor pin like any other value.
+"""
+
+for _number in range(28):
+    globals()["D" + str(_number)] = _number
+del _number
+
+SDA = 2 # D2
+SCL = 3 # D3
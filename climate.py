@@ -0,0 +1,326 @@
+"""Whole-state air conditioner control.
+
+An AC remote sends everything (power, mode, temperature, fan speed, swing) in every
+frame, with a checksum, so rather than recording a button per combination an ACState
+is encoded into a frame on demand by the encoder for the unit's brand. Encoded frames
+are memoised per state, so flicking between a handful of settings costs nothing after
+the first time.
+
+Encoders turn a state into the frame's bytes and back. The bytes are sent least
+significant bit first, and pyIR's PulseDistance protocols turn them into the raw
+waveform. Climate tracks the state last sent to a unit and sends new states through a
+DeviceManager.
+"""
+
+import math
+import threading
+
+import pyIR
+
+class ACState:
+    """One complete setting of an air conditioner. States are immutable so they can key the encode cache."""
+
+    MODES = ("auto", "cool", "dry", "fan", "heat")
+    FAN_SPEEDS = ("auto", "low", "medium", "high")
+    MIN_TEMPERATURE = 16
+    MAX_TEMPERATURE = 30
+    FIELDS = ("power", "mode", "temperature", "fan", "swing")
+
+    def __init__(self, power=True, mode="cool", temperature=24, fan="auto", swing=False):
+        if not isinstance(power, bool) or not isinstance(swing, bool):
+            raise ValueError("power and swing must be true or false")
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {', '.join(self.MODES)}")
+        if fan not in self.FAN_SPEEDS:
+            raise ValueError(f"Unknown fan speed {fan!r}, expected one of {', '.join(self.FAN_SPEEDS)}")
+        if isinstance(temperature, bool) or not isinstance(temperature, (int, float)) \
+                or not math.isfinite(temperature) or temperature != int(temperature):
+            raise ValueError(f"Temperature must be a whole number of degrees, not {temperature!r}")
+        if not self.MIN_TEMPERATURE <= temperature <= self.MAX_TEMPERATURE:
+            raise ValueError(f"Temperature must be between {self.MIN_TEMPERATURE} and {self.MAX_TEMPERATURE} °C")
+
+        object.__setattr__(self, "power", power)
+        object.__setattr__(self, "mode", mode)
+        object.__setattr__(self, "temperature", int(temperature))
+        object.__setattr__(self, "fan", fan)
+        object.__setattr__(self, "swing", swing)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ACState is immutable, use replace()")
+
+    # Return a copy with some fields changed, raising ValueError for unknown fields or bad values
+    def replace(self, **changes):
+        unknown = set(changes) - set(self.FIELDS)
+        if unknown:
+            raise ValueError("Unknown AC setting: " + ", ".join(sorted(unknown)))
+        fields = self.toDict()
+        fields.update(changes)
+        return ACState(**fields)
+
+    def toDict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def key(self):
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def __eq__(self, other):
+        return isinstance(other, ACState) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return "ACState(" + ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS) + ")"
+
+# ----------------- #
+# Frame bytes to a pyIR integer code (a leading 1, then each byte least significant bit first) and back
+def codeFromBytes(data):
+    code = 1
+    for byte in data:
+        for bit in range(8):
+            code = code << 1 | (byte >> bit) & 1
+    return code
+
+def bytesFromCode(code):
+    bits = code.bit_length() - 1
+    data = bytearray(bits // 8)
+    for i in range(len(data) * 8):
+        if (code >> (bits - 1 - i)) & 1:
+            data[i // 8] |= 1 << (i % 8)
+    return data
+
+def xorBytes(data):
+    result = 0
+    for byte in data:
+        result ^= byte
+    return result
+
+# ========================================= #
+#^ Brand encoders ^#
+class ACEncoder:
+    """
+    Base class for a brand's frame layout. Subclasses set the class attributes and
+    implement encodeBytes(state, powerToggle) and decodeBytes(data).
+
+    Some brands have no on/off setting in the frame, only a bit that toggles the power
+    (POWER_TOGGLE); for those the caller says whether this frame should flip it.
+    """
+
+    PROTOCOL = pyIR.PulseDistance
+    STATE_LENGTH = 0 # Bytes in one copy of the state
+    FRAME_COPIES = 1 # Times the state is repeated in a frame
+    MIN_TEMPERATURE = ACState.MIN_TEMPERATURE
+    MAX_TEMPERATURE = ACState.MAX_TEMPERATURE
+    POWER_TOGGLE = False
+    MAX_CACHED = 128
+
+    def __init__(self):
+        self.protocol = self.PROTOCOL()
+        self.cache = {} # (state, powerToggle) -> raw data
+        self.hits = 0
+        self.misses = 0
+
+    # ----------------- #
+    # Return the transmit raw data for a state, encoding it only the first time it is asked for
+    def encode(self, state, powerToggle=False):
+        key = (state, powerToggle and self.POWER_TOGGLE)
+        raw_data = self.cache.get(key)
+        if raw_data is not None:
+            self.hits += 1
+            return raw_data
+
+        self.misses += 1
+        if not self.MIN_TEMPERATURE <= state.temperature <= self.MAX_TEMPERATURE:
+            raise ValueError(f"{self.getName()} units take {self.MIN_TEMPERATURE} to {self.MAX_TEMPERATURE} °C")
+        data = bytes(self.encodeBytes(state, key[1]))
+        raw_data = tuple(self.protocol.getRawFromIntegerCode(codeFromBytes(data * self.FRAME_COPIES)))
+
+        if len(self.cache) >= self.MAX_CACHED:
+            self.cache.clear()
+        self.cache[key] = raw_data
+        return raw_data
+
+    # Return (state, powerToggle) for a captured frame, raising ValueError if it isn't one of this brand's
+    def decode(self, rawDATA):
+        code = self.protocol.decode(rawDATA)
+        if code == -1:
+            raise ValueError("Not a " + self.protocol.getClassName() + " frame")
+        data = bytesFromCode(code)
+        if len(data) != self.STATE_LENGTH * self.FRAME_COPIES:
+            raise ValueError(f"Expected {self.STATE_LENGTH * self.FRAME_COPIES} bytes, got {len(data)}")
+        return self.decodeBytes(bytes(data[:self.STATE_LENGTH]))
+
+    def getCacheStats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self.cache)}
+
+    def getName(self):
+        return self.__class__.__name__
+
+    # Look a value up in a (name -> value) table and the reverse, raising ValueError for unknown values
+    def lookup(self, table, name):
+        if name not in table:
+            raise ValueError(f"{self.getName()} units have no {name!r} setting")
+        return table[name]
+
+    def reverseLookup(self, table, value, what):
+        for name, tableValue in table.items():
+            if tableValue == value:
+                return name
+        raise ValueError(f"Unknown {what} value {value:#x} in {self.getName()} frame")
+
+class WhirlpoolAC(ACEncoder):
+    """
+    21 byte frames in sections of 6, 8 and 7 bytes with an XOR checksum at the end of the
+    second and third sections, as in the ir_transmitter.py sample (a Whirlpool DG11J1-91
+    style remote, temperatures 16-30 °C).
+
+    Power is a toggle bit, and byte 15 names the button that was pressed: power when the
+    frame toggles the power, otherwise mode, as the unit applies the whole state anyway.
+    """
+
+    STATE_LENGTH = 21
+    POWER_TOGGLE = True
+    # Sample frame with the state fields and checksums cleared
+    TEMPLATE = bytes((0x83, 0x06, 0x00, 0x00, 0x00, 0x00, 0x80, 0x00, 0x00, 0x00, 0x00,
+                      0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x38, 0x00, 0x00))
+    MODES = {"heat": 0, "auto": 1, "cool": 2, "dry": 3, "fan": 4} # Byte 3, bits 0-2
+    FAN_SPEEDS = {"auto": 0, "high": 1, "medium": 2, "low": 3} # Byte 2, bits 0-1
+    POWER_BIT = 0x04 # Byte 2
+    SWING_BITS = ((2, 0x80), (8, 0x40)) # (byte, bit) both set for swing
+    COMMAND_POWER = 0x01 # Byte 15
+    COMMAND_MODE = 0x06
+
+    def encodeBytes(self, state, powerToggle):
+        data = bytearray(self.TEMPLATE)
+        data[2] = self.lookup(self.FAN_SPEEDS, state.fan) | (self.POWER_BIT if powerToggle else 0)
+        data[3] = self.lookup(self.MODES, state.mode) | (state.temperature - self.MIN_TEMPERATURE) << 4
+        if state.swing:
+            for byte, bit in self.SWING_BITS:
+                data[byte] |= bit
+        data[15] = self.COMMAND_POWER if powerToggle else self.COMMAND_MODE
+        data[13] = xorBytes(data[2:13])
+        data[20] = xorBytes(data[14:20])
+        return data
+
+    def decodeBytes(self, data):
+        if data[:2] != self.TEMPLATE[:2]:
+            raise ValueError("Not a Whirlpool frame")
+        if data[13] != xorBytes(data[2:13]) or data[20] != xorBytes(data[14:20]):
+            raise ValueError("Whirlpool frame checksum does not match")
+        state = ACState(
+            power=True, # Not in the frame, which only says whether to toggle it
+            mode=self.reverseLookup(self.MODES, data[3] & 0x07, "mode"),
+            temperature=self.MIN_TEMPERATURE + (data[3] >> 4),
+            fan=self.reverseLookup(self.FAN_SPEEDS, data[2] & 0x03, "fan"),
+            swing=bool(data[2] & self.SWING_BITS[0][1]),
+        )
+        return state, bool(data[2] & self.POWER_BIT)
+
+class MitsubishiACProtocol(pyIR.PulseDistance):
+    """The Mitsubishi 144 bit AC frame: the 18 byte state is sent twice, each copy with its own leader."""
+    LEADER_MARK = 3400
+    LEADER_SPACE = 1750
+    BIT_MARK = 450
+    ZERO_SPACE = 420
+    ONE_SPACE = 1300
+    SECTION_GAP = 17100
+    SECTION_LEADER = True
+    SECTIONS = (144, 144)
+    MIN_LEADER_MARK = 2800
+    MAX_LEADER_MARK = 4500 # Longer is a 9 ms leader
+    MIN_LEADER_SPACE = 1300
+    MIN_GAP = 10000
+    ONE_THRESHOLD = 860
+    MAX_BIT_MARK = 800
+    DETECT_COST = 290
+
+    def matches(self,widths):
+        return super().matches(widths) and widths[0] < self.MAX_LEADER_MARK
+
+    def getClassName(self):
+        return "MitsubishiAC"
+
+class MitsubishiAC(ACEncoder):
+    """18 byte Mitsubishi (MSZ/MSY range) frames with an additive checksum, sent twice. Temperatures 16-30 °C."""
+
+    PROTOCOL = MitsubishiACProtocol
+    STATE_LENGTH = 18
+    FRAME_COPIES = 2
+    HEADER = bytes((0x23, 0xCB, 0x26, 0x01, 0x00))
+    POWER_ON = 0x20 # Byte 5
+    MODES = {"heat": 1, "dry": 2, "cool": 3, "auto": 4, "fan": 7} # Byte 6, bits 3-5
+    MODE_EXTRA = {"heat": 0x30, "dry": 0x32, "cool": 0x36, "auto": 0x30, "fan": 0x37} # Byte 8 goes with the mode
+    FAN_SPEEDS = {"auto": 0, "low": 1, "medium": 2, "high": 3} # Byte 9, bits 0-2
+    FAN_AUTO = 0x80 # Byte 9
+    VANE_SWING = 0x78 # Byte 9, vane position 7 (swing) with the vane bit
+
+    def encodeBytes(self, state, powerToggle):
+        data = bytearray(self.STATE_LENGTH)
+        data[:5] = self.HEADER
+        data[5] = self.POWER_ON if state.power else 0
+        data[6] = self.lookup(self.MODES, state.mode) << 3
+        data[7] = state.temperature - self.MIN_TEMPERATURE
+        data[8] = self.MODE_EXTRA[state.mode]
+        data[9] = self.lookup(self.FAN_SPEEDS, state.fan) | (self.FAN_AUTO if state.fan == "auto" else 0)
+        if state.swing:
+            data[9] |= self.VANE_SWING
+        data[17] = sum(data[:17]) & 0xFF
+        return data
+
+    def decodeBytes(self, data):
+        if data[:5] != self.HEADER:
+            raise ValueError("Not a Mitsubishi frame")
+        if data[17] != sum(data[:17]) & 0xFF:
+            raise ValueError("Mitsubishi frame checksum does not match")
+        state = ACState(
+            power=bool(data[5] & self.POWER_ON),
+            mode=self.reverseLookup(self.MODES, (data[6] >> 3) & 0x07, "mode"),
+            temperature=self.MIN_TEMPERATURE + (data[7] & 0x0F),
+            fan=self.reverseLookup(self.FAN_SPEEDS, data[9] & 0x07, "fan"),
+            swing=data[9] & self.VANE_SWING == self.VANE_SWING,
+        )
+        return state, False
+
+# Encoders by the brand names used in configuration
+AC_ENCODERS = {"whirlpool": WhirlpoolAC, "mitsubishi": MitsubishiAC}
+
+# ========================================= #
+#^ Tracking the state of a unit ^#
+class Climate:
+    """
+    Send AC states to a unit through a DeviceManager and remember the last one sent.
+
+    The unit's real state can't be read back, so this assumes it matches the last frame
+    sent (starting from `state`, powered off by default). That is also what decides
+    whether a toggling brand's frame has to flip the power.
+    """
+
+    def __init__(self, devices, pin, encoder, state=None):
+        self.devices = devices
+        self.pin = pin
+        self.encoder = encoder
+        self.state = state or ACState(power=False)
+        # Make the brand's protocol known to remote files, the library and detection
+        if pyIR.PROTOCOLS.get(encoder.protocol.getClassName()) is not encoder.PROTOCOL:
+            pyIR.registerProtocol(encoder.PROTOCOL)
+        self.lock = threading.Lock() # One state change at a time, so toggles can't cross
+
+    # Send a complete state and return the transmitter's result
+    # Raises ValueError if the brand can't represent the state, or HardwareBusy from the hardware queue
+    def apply(self, state):
+        with self.lock:
+            return self.send(state)
+
+    # Change some settings, keeping the rest as last sent. The merge and the send happen
+    # under one hold of the lock, so overlapping updates can't drop each other's changes
+    def update(self, **changes):
+        with self.lock:
+            return self.send(self.state.replace(**changes))
+
+    # Send a state and remember it, with the lock held
+    def send(self, state):
+        powerToggle = state.power != self.state.power
+        raw_data = self.encoder.encode(state, powerToggle)
+        result = self.devices.transmit(self.pin, raw_data)
+        self.state = state
+        return result
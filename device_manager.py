@@ -0,0 +1,360 @@
+"""Long-lived ownership of the IR transmitters and DHT sensors used by the API.
+
+Creating a Transmitter re-runs GPIO.setup and creating an adafruit_dht sensor starts
+(and exit() kills) a pulsein helper process, so doing either per request is slow. The
+DeviceManager creates one of each per pin the first time it is needed, keeps it for the
+life of the process, serialises access to it with a lock per device and releases
+everything in close(), which is registered with atexit.
+
+With a HardwareQueue all device work runs on one worker thread, so however many
+requests the web server handles at once, only one IR frame or sensor read is ever in
+progress; when the queue is full new transmissions are turned away with HardwareBusy.
+A sequence of frames (transmitSequence) is a single job, so no other frame can land
+between its steps.
+"""
+
+import atexit
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+from pulse_scheduler import PulseScheduler
+from pyIR import Transmitter
+from timebase import clock
+
+SENSOR_READS = metrics.counter("dht_reads_total", "DHT sensor reads by pin and result: ok, empty (no data), error (the driver's 'try again') or failed (any other exception)", ("pin", "result"))
+SENSOR_READ_SECONDS = metrics.histogram("dht_read_duration_seconds", "Time taken by DHT sensor reads, failed ones included", ("pin",),
+                                        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+# Used when no sensor factory is given; imported here so the module loads without the Adafruit driver
+# (off the Pi hardware.adafruit_dht is dht_sim)
+def adafruitDHT11(pin):
+    import hardware
+    return hardware.adafruit_dht.DHT11(pin)
+
+class DeviceManager:
+    """One transmitter and one sensor per pin, each behind its own lock."""
+
+    def __init__(self, transmitterFactory=Transmitter, sensorFactory=adafruitDHT11, hardwareQueue=None):
+        self.transmitterFactory = transmitterFactory
+        self.sensorFactory = sensorFactory
+        self.hardwareQueue = hardwareQueue # When set, every device call runs on its worker thread
+        self.transmitters = {} # pin -> (Transmitter, lock)
+        self.sensors = {} # pin -> (sensor, lock)
+        self.lock = threading.Lock() # Guards creating devices, not using them
+        self.closed = False
+        atexit.register(self.close)
+
+    # ----------------- #
+    # Return the (device, lock) pair for a pin, creating the device the first time
+    def getDevice(self, devices, factory, pin):
+        entry = devices.get(pin)
+        if entry is None:
+            with self.lock:
+                if self.closed:
+                    raise RuntimeError("Device manager has been closed")
+                entry = devices.get(pin)
+                if entry is None:
+                    entry = (factory(pin), threading.Lock())
+                    devices[pin] = entry
+        return entry
+
+    def getTransmitter(self, pin):
+        return self.getDevice(self.transmitters, self.transmitterFactory, pin)[0]
+
+    def getSensor(self, pin):
+        return self.getDevice(self.sensors, self.sensorFactory, pin)[0]
+
+    # ----------------- #
+    # Send raw data on a pin; only one frame is ever being sent on a pin at a time
+    # Raises HardwareBusy straight away if the hardware queue is full
+    def transmit(self, pin, raw_data):
+        if self.hardwareQueue is not None:
+            return self.hardwareQueue.call(self.transmitNow, pin, raw_data)
+        return self.transmitNow(pin, raw_data)
+
+    def transmitNow(self, pin, raw_data):
+        transmitter, lock = self.getDevice(self.transmitters, self.transmitterFactory, pin)
+        with lock:
+            return transmitter.sendSignal(raw_data)
+
+    # Send (raw data, start µs) frames as a single job, e.g. a Remote.scheduleMacro schedule
+    # Returns a dict per frame: when it started, how late that was, how long it took and the backend's timing
+    def transmitSequence(self, pin, frames):
+        if self.hardwareQueue is not None:
+            return self.hardwareQueue.call(self.transmitSequenceNow, pin, frames)
+        return self.transmitSequenceNow(pin, frames)
+
+    def transmitSequenceNow(self, pin, frames):
+        transmitter, lock = self.getDevice(self.transmitters, self.transmitterFactory, pin)
+        timer = clock.perf_counter_ns
+        scheduler = PulseScheduler()
+        results = []
+        with lock:
+            origin = timer()
+            earliest = origin
+            for index, (raw_data, start) in enumerate(frames):
+                # On time if possible, but never closer to the last frame than the schedule's space after it
+                scheduler.waitUntil(max(origin + start * 1000, earliest))
+                begun = timer()
+                timing = transmitter.sendSignal(raw_data)
+                ended = timer()
+                if index + 1 < len(frames):
+                    space = frames[index + 1][1] - start - sum(tme for (typ, tme) in raw_data)
+                    earliest = ended + space * 1000
+                results.append({
+                    "start_us": (begun - origin) / 1000,
+                    "late_us": (begun - origin) / 1000 - start,
+                    "duration_us": (ended - begun) / 1000,
+                    "timing": timing,
+                })
+        return results
+
+    # Read (temperature °C, humidity %) from the sensor on a pin, one read at a time
+    # RuntimeError is the sensor's normal 'try again' failure and is passed straight up
+    # Sensor reads wait for room in the hardware queue rather than being turned away
+    def readSensor(self, pin):
+        if self.hardwareQueue is not None:
+            return self.hardwareQueue.call(self.readSensorNow, pin, block=True)
+        return self.readSensorNow(pin)
+
+    def readSensorNow(self, pin):
+        sensor, lock = self.getDevice(self.sensors, self.sensorFactory, pin)
+        label = str(pin)
+        with lock:
+            start = time.perf_counter()
+            result = "failed"
+            try:
+                reading = sensor.temperature, sensor.humidity
+                result = "empty" if None in reading else "ok"
+                return reading
+            except RuntimeError:
+                result = "error"
+                raise
+            finally:
+                SENSOR_READ_SECONDS.observe(time.perf_counter() - start, label)
+                SENSOR_READS.inc(label, result)
+
+    # Throw away a sensor after an unexpected error so the next read starts a fresh one
+    def resetSensor(self, pin):
+        with self.lock:
+            entry = self.sensors.pop(pin, None)
+        if entry is not None:
+            sensor, lock = entry
+            with lock:
+                sensor.exit()
+
+    # ----------------- #
+    # Release every device; safe to call more than once
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            sensors = list(self.sensors.values())
+            transmitters = list(self.transmitters.values())
+            self.sensors.clear()
+            self.transmitters.clear()
+
+        for sensor, lock in sensors:
+            with lock:
+                sensor.exit()
+        for transmitter, lock in transmitters:
+            with lock:
+                transmitter.cleanup()
+
+# ========================================= #
+#^ Single worker queue for hardware access ^#
+class HardwareBusy(RuntimeError):
+    """The hardware queue is full; retryAfter is a suggested wait in whole seconds."""
+
+    def __init__(self, retryAfter):
+        super().__init__(f"Hardware queue is full, try again in {retryAfter} s")
+        self.retryAfter = retryAfter
+
+class HardwareQueue:
+    """
+    Run hardware jobs one at a time, in order, on a dedicated worker thread.
+
+    The queue holds at most maxsize waiting jobs. Non-blocking submissions beyond that
+    raise HardwareBusy with a Retry-After estimate from the queue depth and the average
+    job time, which the API turns into an HTTP 503.
+    """
+
+    def __init__(self, maxsize=8):
+        self.jobs = queue.Queue(maxsize)
+        self.averageJobTime = 0.1 # s, moving average used for the Retry-After estimate
+        self.rejected = 0
+        self.completed = 0
+        self.thread = threading.Thread(target=self.run, name="hardware-queue", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, function, *args, block=False):
+        """Queue function(*args) and return a Future for its result."""
+        future = Future()
+        try:
+            self.jobs.put((future, function, args), block=block)
+        except queue.Full:
+            self.rejected += 1
+            raise HardwareBusy(self.retryAfter()) from None
+        return future
+
+    def call(self, function, *args, block=False):
+        """Queue function(*args) and wait for its result."""
+        return self.submit(function, *args, block=block).result()
+
+    def depth(self):
+        return self.jobs.qsize()
+
+    def retryAfter(self):
+        return max(1, math.ceil((self.depth() + 1) * self.averageJobTime))
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            future, function, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = time.monotonic()
+            try:
+                future.set_result(function(*args))
+            except BaseException as error:
+                future.set_exception(error)
+            self.averageJobTime = 0.8 * self.averageJobTime + 0.2 * (time.monotonic() - start)
+            self.completed += 1
+
+    # Finish the jobs already queued, then stop the worker
+    def close(self):
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            if self.thread is not threading.current_thread():
+                self.thread.join()
+
+# ========================================= #
+#^ Background sensor sampling ^#
+class SensorReading:
+    """One good reading from a sensor"""
+
+    def __init__(self, temperature_c, humidity):
+        self.temperature_c = temperature_c
+        self.humidity = humidity
+        self.time = time.monotonic() # For working out the age
+        self.timestamp = time.time() # For reporting to clients
+
+    def age(self):
+        return time.monotonic() - self.time
+
+class SensorSampler:
+    """
+    Read a sensor on a fixed cadence in a background thread and keep the latest good reading.
+
+    The sampler thread is the only thing that reads the sensor, so any number of clients
+    can ask for a reading without ever causing two hardware reads at once. A client that
+    needs a fresher reading than the cached one wakes the thread and waits for its next
+    sample. Failed reads are retried a few times before the round is given up.
+
+    Reads are always at least MIN_READ_INTERVAL apart, retries and early wakeups included:
+    adafruit_dht hands back its previous values for a read within 2 s of the last one, and
+    those must not be stored as a new reading.
+    """
+
+    MIN_READ_INTERVAL = 2.0 # s, adafruit_dht's cache window
+
+    def __init__(self, devices, pin, interval=2.0, retries=3, retryDelay=1.0):
+        self.devices = devices
+        self.pin = pin
+        self.interval = interval # s between samples, the DHT11 can't be read more than once a second
+        self.retries = retries
+        self.retryDelay = retryDelay
+        self.reading = None
+        self.lastError = "No reading taken yet"
+        self.lastFailure = None # monotonic time the last round gave up
+        self.failures = 0
+        self.lastRead = None # monotonic time of the last hardware read
+        self.condition = threading.Condition()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    # Safe to call any number of times; getReading calls it, so a process that never asks for a
+    # reading (such as the Werkzeug reloader's watching parent) never reads the sensor
+    def start(self):
+        with self.condition:
+            if self.thread is None and not self.stopping.is_set():
+                self.thread = threading.Thread(target=self.run, name="sensor-sampler", daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wake.clear() # Requests made while sampling wake the next wait straight away
+            self.sample()
+            self.wake.wait(self.interval)
+
+    # ----------------- #
+    # Take one reading, retrying failed reads, and publish the result to any waiting clients
+    def sample(self):
+        for attempt in range(self.retries):
+            if attempt:
+                self.stopping.wait(self.retryDelay)
+            if self.lastRead is not None:
+                self.stopping.wait(self.lastRead + self.MIN_READ_INTERVAL - time.monotonic())
+            if self.stopping.is_set():
+                break
+            try:
+                temperature_c, humidity = self.devices.readSensor(self.pin)
+            except RuntimeError as error: # The usual DHT 'try again'
+                self.lastError = error.args[0]
+                continue
+            except Exception as error:
+                self.lastError = str(error)
+                self.devices.resetSensor(self.pin)
+                continue
+            finally:
+                self.lastRead = time.monotonic() # Once the read is over, so it is later than the driver's own timestamp
+            if temperature_c is None or humidity is None:
+                self.lastError = "Sensor returned no data"
+                continue
+
+            with self.condition:
+                self.reading = SensorReading(temperature_c, humidity)
+                self.condition.notify_all()
+            return
+
+        with self.condition:
+            self.failures += 1
+            self.lastFailure = time.monotonic()
+            self.condition.notify_all()
+
+    # ----------------- #
+    # Return the latest reading, or wait for a new one if it is older than maxAge seconds
+    # Raises RuntimeError with the sensor's last error if no good reading arrives in time
+    def getReading(self, maxAge=None, timeout=10.0):
+        self.start()
+        with self.condition:
+            reading = self.reading
+            if reading is not None and (maxAge is None or reading.age() <= maxAge):
+                return reading
+
+            requested = time.monotonic()
+            self.wake.set()
+            arrived = self.condition.wait_for(
+                lambda: (self.reading is not None and self.reading.time >= requested)
+                or (self.lastFailure is not None and self.lastFailure >= requested),
+                timeout)
+            if arrived and self.reading is not None and self.reading.time >= requested:
+                return self.reading
+            raise RuntimeError(self.lastError)
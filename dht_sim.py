@@ -0,0 +1,92 @@
+"""Simulated stand-in for adafruit_dht.
+
+The DHT11/DHT22 classes have the same temperature / humidity / exit interface as the
+Adafruit driver. Like the real driver (which starts a libgpiod_pulsein helper process
+for every sensor object) each sensor starts a helper process that lives until exit(),
+so creating and tearing down sensors costs about what it does on the Pi. Readings can
+fail at a configurable rate with the same RuntimeError the real driver raises, or be
+scripted per pin with scriptReadings for exact, repeatable responses. Time is read
+through timebase.clock, so on a VirtualClock the read time and MIN_INTERVAL are simulated.
+"""
+
+import random
+import subprocess
+import sys
+from collections import deque
+
+from timebase import clock
+
+_scripted = {} # Pin -> deque of readings still to be returned
+
+# Queue the readings the sensor on a pin returns next, in order: (temperature, humidity)
+# tuples, or None for a read that fails. Once they run out readings are random again
+def scriptReadings(pin, readings):
+    _scripted.setdefault(pin, deque()).extend(readings)
+
+def clearReadings(pin=None):
+    if pin is None:
+        _scripted.clear()
+    else:
+        _scripted.pop(pin, None)
+
+class DHTBase:
+    MIN_INTERVAL = 2.0 # s, as adafruit_dht: a read this soon after the last returns the last values
+
+    def __init__(self, pin, use_pulseio=True, temperature=24.0, humidity=55.0, failureRate=0.0, readTime=0.005, seed=None):
+        self.pin = pin
+        self.baseTemperature = temperature
+        self.baseHumidity = humidity
+        self.failureRate = failureRate
+        self.readTime = readTime # s spent clocking the 40 data bits in
+        self.rng = random.Random(seed)
+        self.reads = 0
+        self.lastRead = None
+        self.lastValues = (None, None)
+        self.helper = None
+        if use_pulseio:
+            self.helper = subprocess.Popen([sys.executable, "-c", "import sys; sys.stdin.read()"], stdin=subprocess.PIPE)
+
+    def measure(self):
+        now = clock.monotonic()
+        if self.lastRead is not None and now - self.lastRead <= self.MIN_INTERVAL:
+            return
+        clock.sleep(self.readTime)
+        self.lastRead = now
+        self.reads += 1
+
+        scripted = _scripted.get(self.pin)
+        if scripted:
+            reading = scripted.popleft()
+            if reading is None:
+                raise RuntimeError("Checksum did not validate. Try again.")
+            self.lastValues = tuple(reading)
+            return
+
+        if self.rng.random() < self.failureRate:
+            raise RuntimeError("Checksum did not validate. Try again.")
+        self.lastValues = (
+            round(self.baseTemperature + self.rng.uniform(-0.5, 0.5)),
+            round(self.baseHumidity + self.rng.uniform(-2, 2)),
+        )
+
+    @property
+    def temperature(self):
+        self.measure()
+        return self.lastValues[0]
+
+    @property
+    def humidity(self):
+        self.measure()
+        return self.lastValues[1]
+
+    def exit(self):
+        if self.helper is not None:
+            self.helper.kill()
+            self.helper.wait()
+            self.helper = None
+
+class DHT11(DHTBase):
+    pass
+
+class DHT22(DHTBase):
+    pass
@@ -0,0 +1,177 @@
+"""CPU and memory diagnostics for a long running API process, served under /debug.
+
+The IR_DEBUG environment variable turns them on when this module is first imported:
+
+  off       (the default) no /debug routes are registered and nothing is traced
+  local     the /debug routes answer requests from this machine only
+  any       the /debug routes answer any client
+
+StackSampler looks at every thread's stack (sys._current_frames) every few milliseconds
+for a given time and counts identical stacks. The result is in the collapsed format
+("thread;file:function;file:function count" per line) that flamegraph.pl and speedscope
+read. Sampling is wall clock, so threads blocked on a lock or a sleep show up too, which
+is what matters for a service that mostly waits on hardware.
+
+MemoryTracker starts tracemalloc the first time it is asked for a snapshot, not before,
+since tracing slows every allocation down. Every snapshot is compared with the one before
+it, so two calls some hours apart show what has grown in between.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+MODES = ("off", "local", "any")
+
+MODE = os.environ.get("IR_DEBUG", "off").strip().lower() or "off"
+if MODE not in MODES:
+    raise ValueError(f"Unknown IR_DEBUG mode {MODE!r}, expected one of {', '.join(MODES)}")
+ENABLED = MODE != "off"
+
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+MAX_PROFILE_SECONDS = 60
+MIN_INTERVAL = 0.001 # s, sampling faster than this mostly profiles the sampler
+
+# The client may use the /debug routes
+def allowed(remoteAddress):
+    return MODE == "any" or (MODE == "local" and remoteAddress in LOCAL_ADDRESSES)
+
+# ========================================= #
+#^ Stack sampling ^#
+class ProfilerBusy(RuntimeError):
+    """A profile is already running; only one runs at a time."""
+
+class StackSampler:
+    """Count the stacks of every thread over a period, for a flame graph."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval # s between samples
+        self.labels = {} # code object -> "file:function", so each frame is formatted once
+        self.lock = threading.Lock() # Held for the whole of a profile
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+        return label
+
+    # One stack per thread, root first, as a tuple of labels
+    def sample(self, skip):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            stacks.append(tuple(stack))
+        return stacks
+
+    def profile(self, seconds, interval=None):
+        """
+        Sample every other thread for seconds and return (Counter of stack -> samples,
+        samples taken). Raises ProfilerBusy if another profile is running.
+        """
+        interval = max(MIN_INTERVAL, interval or self.interval)
+        if not self.lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            counts = Counter()
+            skip = threading.get_ident()
+            samples = 0
+            deadline = time.monotonic() + seconds
+            next = time.monotonic()
+            while next < deadline:
+                counts.update(self.sample(skip))
+                samples += 1
+                next += interval
+                delay = next - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else: # Fell behind, don't try to catch up with a burst of samples
+                    next = time.monotonic()
+            return counts, samples
+        finally:
+            self.lock.release()
+
+def collapse(counts):
+    """Collapsed stack text, heaviest stack first."""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common())
+
+# ========================================= #
+#^ Allocation tracking ^#
+class MemoryTracker:
+    """tracemalloc snapshots, each compared with the one before."""
+
+    GROUPINGS = ("lineno", "filename", "traceback")
+
+    def __init__(self, frames=10):
+        self.frames = frames # Stack depth recorded per allocation, for grouping by traceback
+        self.previous = None
+        self.previousTime = None
+        self.lock = threading.Lock()
+
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        with self.lock:
+            tracemalloc.stop()
+            self.previous = None
+            self.previousTime = None
+
+    def report(self, limit=20, groupBy="lineno"):
+        """
+        Take a snapshot and return a dict of the largest allocation sites and the sites
+        that grew most since the last report. The first report starts tracing, so only
+        allocations made after it are seen.
+        """
+        if groupBy not in self.GROUPINGS:
+            raise ValueError(f"Unknown grouping {groupBy!r}, expected one of {', '.join(self.GROUPINGS)}")
+        with self.lock:
+            started = not tracemalloc.is_tracing()
+            self.start()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            now = time.time()
+            current, peak = tracemalloc.get_traced_memory()
+            report = {
+                "started_tracing": started,
+                "traced_bytes": current,
+                "peak_bytes": peak,
+                "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+                "top": [statisticDict(stat) for stat in snapshot.statistics(groupBy)[:limit]],
+                "diff": None,
+                "since_seconds": None,
+            }
+            if self.previous is not None:
+                report["diff"] = [statisticDict(stat) for stat in snapshot.compare_to(self.previous, groupBy)[:limit]]
+                report["since_seconds"] = now - self.previousTime
+            self.previous = snapshot
+            self.previousTime = now
+        return report
+
+def statisticDict(stat):
+    entry = {
+        "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "bytes": stat.size,
+        "count": stat.count,
+    }
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        entry["bytes_diff"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    return entry
@@ -0,0 +1,164 @@
+"""Simulated stand-in for the RPi.GPIO module.
+
+Input pins are driven by scripted pulse trains that are replayed against the monotonic
+clock, and output pins remember every level written to them. This lets the capture and
+transmit code in pyIR run (and be benchmarked) on a normal Linux machine with no GPIO.
+The clock is timebase.clock, so after timebase.useVirtualClock (or with IR_HARDWARE=virtual)
+scripted input and recorded output are on simulated time and repeat exactly run to run.
+"""
+
+import threading
+from bisect import bisect_right
+
+from timebase import clock
+
+# Same values as RPi.GPIO so code can compare against either module
+BOARD = 10
+BCM = 11
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+RISING = 31
+FALLING = 32
+BOTH = 33
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+
+SPIN_NS = 200_000 # Edge callbacks sleep until this close to the edge, then spin
+
+_mode = None
+_pins = {}
+
+# ========================================= #
+#^ State kept for every pin that has been set up ^#
+class _Pin:
+    def __init__(self,channel,direction,idle):
+        self.channel = channel
+        self.direction = direction
+        self.idle = idle # Level the pin rests at when nothing is scripted
+        self.edges = [] # Monotonic ns timestamps of scripted input edges
+        self.outputs = [] # (monotonic ns, level) for every output call
+        self.lock = threading.Condition()
+        self.dispatcher = None
+        self.callbacks = []
+        self.detecting = False
+
+    # Level of a scripted input at time t
+    def levelAt(self,t):
+        if bisect_right(self.edges,t) % 2:
+            return 1 - self.idle
+        return self.idle
+
+    # Fire the callbacks at every scripted edge until detection is removed
+    def dispatch(self):
+        nextEdge = bisect_right(self.edges,clock.monotonic_ns())
+        while True:
+            with self.lock:
+                while self.detecting and nextEdge >= len(self.edges):
+                    self.lock.wait()
+                if not self.detecting:
+                    return
+                edgeTime = self.edges[nextEdge]
+                nextEdge += 1
+
+            remaining = edgeTime - clock.monotonic_ns()
+            if remaining > SPIN_NS:
+                clock.sleep((remaining - SPIN_NS) / 1e9)
+            while clock.monotonic_ns() < edgeTime:
+                pass
+
+            for callback in list(self.callbacks):
+                callback(self.channel)
+
+def _getPin(channel):
+    try:
+        return _pins[channel]
+    except KeyError:
+        raise RuntimeError("The GPIO channel has not been set up as an input or output")
+
+# ========================================= #
+#^ The subset of the RPi.GPIO API used by this project ^#
+def setmode(mode):
+    global _mode
+    _mode = mode
+
+def getmode():
+    return _mode
+
+def setwarnings(flag):
+    pass
+
+def setup(channel,direction,pull_up_down=PUD_OFF,initial=LOW):
+    if _mode is None:
+        raise RuntimeError("Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)")
+    idle = LOW if direction == OUT or pull_up_down == PUD_DOWN else HIGH # IR receivers idle high
+    _pins[channel] = _Pin(channel,direction,idle)
+
+def input(channel):
+    return _getPin(channel).levelAt(clock.monotonic_ns())
+
+def output(channel,value):
+    pin = _getPin(channel)
+    if pin.direction != OUT:
+        raise RuntimeError("The GPIO channel has not been set up as an OUTPUT")
+    pin.outputs.append((clock.monotonic_ns(),1 if value else 0))
+
+def add_event_detect(channel,edge,callback=None,bouncetime=None):
+    pin = _getPin(channel)
+    if pin.detecting:
+        raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+    pin.callbacks = [callback] if callback else []
+    pin.detecting = True
+    pin.dispatcher = threading.Thread(target=pin.dispatch,daemon=True)
+    pin.dispatcher.start()
+
+def add_event_callback(channel,callback):
+    _getPin(channel).callbacks.append(callback)
+
+def remove_event_detect(channel):
+    pin = _getPin(channel)
+    with pin.lock:
+        pin.detecting = False
+        pin.lock.notify_all()
+    if pin.dispatcher is not None and pin.dispatcher is not threading.current_thread():
+        pin.dispatcher.join()
+    pin.dispatcher = None
+    pin.callbacks = []
+
+def cleanup(channel=None):
+    channels = list(_pins) if channel is None else [channel]
+    for ch in channels:
+        if ch in _pins:
+            if _pins[ch].detecting:
+                remove_event_detect(ch)
+            del _pins[ch]
+
+# ========================================= #
+#^ Simulation helpers (not part of RPi.GPIO) ^#
+# Schedule a pulse train on an input pin, starting `delay` seconds after the previous one ends
+# Pulses are (level, µs) tuples like Receiver.getRAW returns; returns the edge timestamps in ns
+def scriptInput(channel,pulses,delay=0.001):
+    pin = _getPin(channel)
+    with pin.lock:
+        t = max(clock.monotonic_ns(),pin.edges[-1] if pin.edges else 0) + int(delay * 1e9)
+        level = pin.idle
+        edges = []
+        for (typ, tme) in pulses:
+            if typ != level:
+                edges.append(t)
+                level = typ
+            t += tme * 1000
+        if level != pin.idle:
+            edges.append(t)
+        pin.edges.extend(edges)
+        pin.lock.notify_all()
+    return edges
+
+# Return the (monotonic ns, level) history written to an output pin
+def getOutputs(channel):
+    return list(_getPin(channel).outputs)
+
+def clearOutputs(channel):
+    _getPin(channel).outputs.clear()
@@ -0,0 +1,70 @@
+"""Choose between the Raspberry Pi drivers and the simulated hardware.
+
+The IR_HARDWARE environment variable picks the backend when this module is first imported:
+
+  pi        (the default) RPi.GPIO, board and adafruit_dht, as on the Pi
+  sim       gpio_sim, board_sim and dht_sim, on the real clock
+  virtual   the simulators on a timebase.VirtualClock, so sleeps and busy-waits take no
+            real time and captures and transmits come out the same on every run
+  auto      pi when RPi.GPIO can be imported, sim with a logged warning otherwise
+
+The simulators are never picked unless asked for: a Pi with a broken RPi.GPIO install
+fails to start instead of answering every transmit with a success while sending nothing.
+BACKEND is the backend in use, which /metrics and the API's index page report.
+
+pyIR takes GPIO from here, and Flask_API takes board and adafruit_dht, so the whole
+service runs on a Linux box with no GPIO. board and adafruit_dht are only imported the
+first time they are used, since a Pi that only sends IR may not have them installed.
+"""
+
+import importlib
+import logging
+import os
+
+import timebase
+
+BACKENDS = ("auto", "pi", "sim", "virtual")
+
+BACKEND = os.environ.get("IR_HARDWARE", "pi").strip().lower() or "pi"
+if BACKEND not in BACKENDS:
+    raise ValueError(f"Unknown IR_HARDWARE backend {BACKEND!r}, expected one of {', '.join(BACKENDS)}")
+
+if BACKEND == "auto":
+    try:
+        import RPi.GPIO as GPIO
+        BACKEND = "pi"
+    except ImportError as error: # Not running on a Pi
+        logging.warning(f"IR_HARDWARE=auto: RPi.GPIO couldn't be imported ({error}), using the simulated hardware, no IR will be sent")
+        BACKEND = "sim"
+
+if BACKEND == "pi":
+    try:
+        import RPi.GPIO as GPIO
+    except ImportError as error:
+        raise ImportError(f"RPi.GPIO couldn't be imported ({error}); off the Pi set IR_HARDWARE=sim or IR_HARDWARE=virtual") from error
+else:
+    import gpio_sim as GPIO
+    if BACKEND == "virtual":
+        timebase.useVirtualClock()
+
+SIMULATED = BACKEND != "pi"
+
+# The module behind each lazily imported driver, by backend
+DRIVERS = {
+    "board": {"pi": "board", "sim": "board_sim"},
+    "adafruit_dht": {"pi": "adafruit_dht", "sim": "dht_sim"},
+}
+
+def __getattr__(name):
+    if name not in DRIVERS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(DRIVERS[name]["sim" if SIMULATED else "pi"])
+    globals()[name] = module
+    return module
+
+# ----------------- #
+# Set up a pin, choosing the GPIO.BOARD numbering first if nothing has chosen a numbering yet
+def setupPin(channel, direction, **kwargs):
+    if GPIO.getmode() is None:
+        GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(channel, direction, **kwargs)
@@ -1,5 +1,7 @@
 # Import classes from pyIR.py
 from pyIR import Receiver, Remote, NEC
+from learning import learnButton
+from remote_file import saveBinaryRemote
 import threading
 import sys
 
@@ -9,6 +11,11 @@ receiver = Receiver(pin=11)
 # Create a remote with name 'MyRemote' and NEC protocol
 my_remote = Remote(name='MyRemote', protocol=NEC)
 
+# Each button is learnt from several presses, see learning.py
+PRESSES = 5
+MIN_CONFIDENCE = 0.5
+learned_pulses = {} # Cleaned waveform of every button, saved alongside the codes
+
 # Flag to control the recording loop
 stop_flag = threading.Event()
 
@@ -26,22 +33,23 @@ def recordButtons():
             stop_flag.set()
             break
         
-        print("Press the button on the remote that you want to record...")
+        print(f"Press the button on the remote that you want to record {PRESSES} times, one press at a time...")
         
-        # Wait for the user to press the button on the remote
-        rawData = receiver.getRAW()  # Get raw data from the remote
-        print(f"Raw data received: {rawData}")  # Debugging output
+        # Wait for the user to press the button on the remote a few times
+        signal = learnButton(my_remote, receiver, button_name, presses=PRESSES, minConfidence=MIN_CONFIDENCE)
+        print(f"Learnt: {signal}")  # Debugging output
         
-        if rawData:
-            code = my_remote.getIntegerCode(rawData)  # Convert raw data to binary code
-            print(f"Decoded code: {code}")  # Debugging output
-            
-            # Add the button to the remote
-            my_remote.addButton(button_name, code)
-            
-            print(f"Button '{button_name}' has been recorded with code: {hex(code)}")
-        else:
+        if signal.inliers + signal.outliers == 0:
             print("No signal detected. Please press the button on the remote again.")
+        elif signal.inliers == 0 or (signal.code != -1 and signal.confidence < MIN_CONFIDENCE):
+            print(f"The presses didn't agree well enough (confidence {signal.confidence:.2f}). Please record '{button_name}' again.")
+        elif signal.code == -1:
+            print(f"The presses agreed but weren't {my_remote.protcol.getClassName()} frames. Please record '{button_name}' again.")
+        else:
+            learned_pulses[button_name] = signal.pulses
+            print(f"Button '{button_name}' has been recorded with code: {hex(signal.code)}")
+            if not signal.checked:
+                print(f"Note: its check bytes don't follow the {my_remote.protcol.getClassName()} standard, which is normal for some AC remotes.")
 
 # Start the recording thread
 recording_thread = threading.Thread(target=recordButtons)
@@ -55,5 +63,6 @@ my_remote.displayButtons()
 
 # Save the remote configuration to a file
 my_remote.saveRemote('my_remote.txt')
+saveBinaryRemote(my_remote, 'my_remote.irr', raws=learned_pulses)
 
-print("Remote configuration has been saved to 'my_remote.txt'.")
+print("Remote configuration has been saved to 'my_remote.txt', with the learnt waveforms in 'my_remote.irr'.")
@@ -1,44 +1,32 @@
 import RPi.GPIO as GPIO
-import time
+from pulse_scheduler import PulseScheduler
 
 class Transmitter:
     def __init__(self, pin):
         self.pin = pin
+        self.scheduler = PulseScheduler()
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self.pin, GPIO.OUT)
 
     def transmit(self, raw_data):
         """
         Truyền dữ liệu IR dưới dạng raw data.
-        
-        :param raw_data: Danh sách các tuple, mỗi tuple chứa (0 hoặc 1, độ dài)
-        """
-        for pulse, length in raw_data:
-            if pulse == 1:
-                self._send_high(length)
-            else:
-                self._send_low(length)
-        self._send_low()  # Đảm bảo tín hiệu kết thúc với mức thấp
 
-    def _send_high(self, length):
-        """
-        Gửi tín hiệu cao trong một khoảng thời gian nhất định.
-
-        :param length: Thời gian giữ mức cao (số giây)
+        Mỗi xung được phát tại thời điểm tuyệt đối tính từ lúc bắt đầu khung, nên sai số
+        của một xung không cộng dồn sang các xung sau.
+        
+        :param raw_data: Danh sách các tuple, mỗi tuple chứa (0 hoặc 1, độ dài tính bằng micro giây)
+        :return: Sai số thời gian lớn nhất và trung bình của khung (micro giây)
         """
-        GPIO.output(self.pin, GPIO.HIGH)
-        time.sleep(length)
+        return self.scheduler.run(raw_data, self._set_level)  # Kết thúc khung ở mức thấp
 
-    def _send_low(self, length=None):
+    def _set_level(self, level):
         """
-        Gửi tín hiệu thấp trong một khoảng thời gian nhất định (hoặc không).
+        Đặt mức tín hiệu của chân phát.
 
-        :param length: Thời gian giữ mức thấp (số giây), mặc định là 0.00056 giây
+        :param level: 1 cho mức cao, 0 cho mức thấp
         """
-        if length is None:
-            length = 0.00056  # Thay đổi nếu cần
-        GPIO.output(self.pin, GPIO.LOW)
-        time.sleep(length)
+        GPIO.output(self.pin, GPIO.HIGH if level == 1 else GPIO.LOW)
 
     def cleanup(self):
         GPIO.cleanup()
@@ -94,6 +82,7 @@ if __name__ == "__main__":
             (0, 510), (1, 589), (0, 509), (1, 592), (0, 510), (1, 1746), (0, 507), (1, 1750),
             (0, 510), (1, 1754), (0, 507), (1, 1758), (0, 510), (1, 581), (0, 507)
         ]
-        transmitter.transmit(raw_data)
+        timing = transmitter.transmit(raw_data)
+        print(f"Sai số thời gian: lớn nhất {timing['max_error_us']:.1f} µs, trung bình {timing['mean_error_us']:.1f} µs")
     finally:
         transmitter.cleanup()
@@ -0,0 +1,168 @@
+"""Learning buttons from several presses instead of one.
+
+A single capture can come out with a pulse stretched or split by noise, and then decodes
+to the wrong code. learnButton captures the same button a few times and cleanCaptures
+turns the presses into one waveform:
+
+  1. Glitches (pulses too short to be real, where noise split a pulse in three) are
+     merged back into their neighbours.
+  2. Captures are aligned by pulse count, and the most common count wins. Any other
+     count is a capture that lost or gained pulses, so it is rejected.
+  3. The aligned captures are stacked into one array. Every pulse's median is taken
+     across the presses, and a capture with any pulse off the median by more than the
+     tolerance is rejected as an outlier. The median is then taken again over the
+     captures that are left.
+
+The cleaned waveform is decoded into the button's code, and it is kept too. Store it
+with RemoteLibrary.addCapture or the raws of remote_file.saveBinaryRemote. Steps 2 and 3
+are NumPy operations over every press and pulse at once, so a whole AC remote of long
+frames learns in milliseconds.
+"""
+
+from array import array
+
+import numpy as np
+
+import pyIR
+
+ABS_TOLERANCE = 400 # µs a pulse may be off the median by, well under the 1130 µs between a 0 and a 1 space...
+REL_TOLERANCE = 0.3 # ...or this fraction of the median, whichever is larger
+GLITCH_WIDTH = 100 # Pulses shorter than this (µs) are noise, no protocol uses them
+MIN_FRAME_PULSES = 8 # Shorter frames are repeat codes or noise, not a press
+
+class LearnedSignal:
+    """The waveform and code learnt for a button, with how far the presses can be trusted."""
+
+    def __init__(self, pulses, protocol, code, confidence, inliers, outliers, jitter, checked=True):
+        self.pulses = pulses # Cleaned pulse widths (array('I')), starting with a mark
+        self.protocol = protocol # Protocol object that decoded the waveform, None if none did
+        self.code = code # Integer code, or -1 if the waveform didn't decode
+        self.checked = checked # False if the code was read without the protocol's validity checks passing
+        self.confidence = confidence # 0 to 1, see cleanCaptures
+        self.inliers = inliers # Number of presses the waveform is the median of
+        self.outliers = outliers # Number of presses rejected
+        self.jitter = jitter # Mean distance (µs) of the kept presses' pulses from the median
+
+    def __repr__(self):
+        protocol = self.protocol.getClassName() if self.protocol is not None else None
+        return (f"LearnedSignal({protocol}, code={hex(self.code) if self.code != -1 else -1}, "
+                f"confidence={self.confidence:.2f}, presses={self.inliers}/{self.inliers + self.outliers}"
+                f"{'' if self.checked else ', unchecked'})")
+
+    def toDict(self):
+        return {"protocol": self.protocol.getClassName() if self.protocol is not None else None,
+                "code": self.code, "checked": self.checked, "confidence": self.confidence, "inliers": self.inliers,
+                "outliers": self.outliers, "jitter_us": self.jitter, "pulses": len(self.pulses)}
+
+# ========================================= #
+#^ Cleaning captures ^#
+# Merge pulses shorter than minWidth into the pulses either side of them, keeping marks and spaces alternating
+# A glitch at the very start or end of a frame is dropped instead
+def removeGlitches(widths, minWidth=GLITCH_WIDTH):
+    widths = np.asarray(pyIR.pulseWidths(widths), dtype=np.int64)
+    if not (widths < minWidth).any():
+        return widths
+
+    merged = []
+    i = 0
+    while i < len(widths):
+        width = int(widths[i])
+        if width >= minWidth:
+            merged.append(width)
+            i += 1
+        elif not merged:
+            i += 2 # A glitch before the frame, drop it and the space after it so the frame still starts with a mark
+        elif i == len(widths) - 1:
+            merged.pop() # A glitch after the frame, drop it and the space before it
+            i += 1
+        else:
+            merged[-1] += width + int(widths[i + 1])
+            i += 2
+    return np.array(merged, dtype=np.int64)
+
+# The captures with the most common pulse count, as one (presses, pulses) array, and how many didn't have it
+# Ties go to the longer count, as losing pulses is more likely than gaining them
+def alignCaptures(captures):
+    captures = [capture for capture in captures if len(capture)]
+    if not captures:
+        return np.zeros((0, 0), dtype=np.int64), 0
+    lengths = np.array([len(capture) for capture in captures])
+    counts = np.bincount(lengths)
+    length = len(counts) - 1 - int(np.argmax(counts[::-1]))
+    stack = np.vstack([capture for capture in captures if len(capture) == length])
+    return stack, len(captures) - len(stack)
+
+def cleanCaptures(captures, protocol=None, absTolerance=ABS_TOLERANCE, relTolerance=REL_TOLERANCE):
+    """
+    Combine several captures of one button (pulse arrays or getRAW tuples) into a LearnedSignal.
+
+    protocol is the protocol class (or object) the button is decoded with; without one the
+    protocol is detected from the cleaned waveform. When the protocol is given, a frame of
+    its shape that fails its validity checks (NEC's inverted bytes, which some AC remotes
+    don't send) is still read with getIntegerCode and comes back with checked False.
+    confidence is the fraction of presses kept, scaled down by how much they disagree:
+    (kept / pressed) * (1 - mean deviation / tolerance). A clean press of every capture
+    gives about 0.9, and two presses agreeing out of five under 0.4. A single capture can't
+    be checked against anything, so its confidence is at most 0.5.
+    """
+    total = len(captures)
+    stack, misaligned = alignCaptures([removeGlitches(capture) for capture in captures])
+    if not len(stack):
+        return LearnedSignal(array('I'), None, -1, 0.0, 0, total, 0.0)
+
+    median = np.median(stack, axis=0)
+    tolerance = np.maximum(absTolerance, relTolerance * median)
+    outliers = (np.abs(stack - median) > tolerance).any(axis=1)
+    if outliers.all(): # Nothing agrees with the median of everything, trust none of it
+        return LearnedSignal(array('I', np.rint(median).astype(np.uint32).tobytes()), None, -1, 0.0, 0, total, 0.0)
+
+    kept = stack[~outliers]
+    median = np.median(kept, axis=0)
+    deviation = np.abs(kept - median) / tolerance
+    pulses = array('I', np.rint(median).astype(np.uint32).tobytes())
+
+    confidence = len(kept) / total * (1 - float(deviation.mean()))
+    if total == 1:
+        confidence *= 0.5
+    jitter = float((deviation * tolerance).mean())
+
+    checked = True
+    if protocol is None:
+        protocol, code = pyIR.detectProtocol(pulses)
+    else:
+        protocol = protocol() if isinstance(protocol, type) else protocol
+        code = protocol.decode(pulses)
+        if code == -1 and protocol.matches(pyIR.pulseWidths(pulses)): # The user picked the protocol, so trust its shape
+            code = protocol.getIntegerCode(pulses)
+            checked = False
+        if code == -1:
+            protocol = None
+    if code == -1:
+        confidence = 0.0
+    return LearnedSignal(pulses, protocol, code, confidence, len(kept), total - len(kept), jitter, checked)
+
+# ========================================= #
+#^ Capturing ^#
+# Capture presses of a button, skipping repeat codes and noise, until there are enough or timeout seconds pass without one
+def capturePresses(receiver, presses=5, timeout=10):
+    captures = []
+    while len(captures) < presses:
+        pulses = receiver.getPulses(timeout)
+        if not pulses:
+            break
+        if len(pulses) >= MIN_FRAME_PULSES:
+            captures.append(pulses)
+    return captures
+
+def learnButton(remote, receiver, name, presses=5, timeout=10, minConfidence=0.5):
+    """
+    Learn a button of a remote from several presses and add it to the remote.
+
+    Returns the LearnedSignal. The button is only added when the waveform decoded with the
+    remote's protocol and the confidence reached minConfidence, otherwise the caller should
+    ask for the presses again.
+    """
+    signal = cleanCaptures(capturePresses(receiver, presses, timeout), remote.protcol)
+    if signal.code != -1 and signal.confidence >= minConfidence:
+        remote.addButton(name, signal.code)
+    return signal
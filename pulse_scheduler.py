@@ -0,0 +1,50 @@
+"""Deadline based pacing for bit-banged IR pulses.
+
+Every pulse edge gets an absolute target time measured from a single perf_counter_ns
+origin, so a late wakeup on one pulse is not carried into the next one the way it is
+when sleeping for each pulse's duration in turn. Waiting sleeps for most of the gap and
+busy-waits for the last stretch, where time.sleep is too coarse.
+
+This module has no GPIO dependency so both pyIR and ir_transmitter can use it. Time is
+read through timebase.clock, so on a VirtualClock the waits take no real time.
+"""
+
+from timebase import clock
+
+class PulseScheduler:
+    """Output (level, µs) pulses at absolute deadlines and measure how late each edge was."""
+
+    def __init__(self, spin=300):
+        self.spin = spin * 1000 # Busy-wait for the last `spin` µs before each deadline (stored in ns)
+        self.lastTiming = None
+
+    def waitUntil(self, deadline):
+        """Block until perf_counter_ns() reaches deadline."""
+        timer = clock.perf_counter_ns
+        remaining = deadline - timer()
+        if remaining > self.spin:
+            clock.sleep((remaining - self.spin) / 1e9)
+        while timer() < deadline:
+            pass
+
+    def run(self, raw_data, output):
+        """
+        Call output(level) at the start of every pulse and output(0) when the last one ends.
+
+        Returns the frame's timing: how long it took and the max and mean lateness of the
+        edges, all in µs.
+        """
+        timer = clock.perf_counter_ns
+        errors = []
+        origin = target = timer()
+        for (typ, duration) in raw_data:
+            self.waitUntil(target)
+            errors.append(timer() - target)
+            output(typ)
+            target += duration * 1000
+        self.waitUntil(target)
+        errors.append(timer() - target)
+        output(0)
+
+        self.lastTiming = {"duration_us": (timer() - origin) / 1000, "max_error_us": max(errors) / 1000, "mean_error_us": sum(errors) / len(errors) / 1000}
+        return self.lastTiming
@@ -1,19 +1,35 @@
 
-from time import sleep
-import RPi.GPIO as GPIO
-from datetime import datetime
+from array import array
+import json
+import threading
+import queue
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pulse_scheduler import PulseScheduler
+from timebase import clock
+from hardware import GPIO, setupPin # RPi.GPIO on a Pi, gpio_sim elsewhere (see hardware.py)
 
-#Setup GPIO connection
-GPIO.setmode(GPIO.BOARD)
+# Pins use the GPIO.BOARD numbering scheme, set when the first one is set up
 
 # Create a hardware sensor class
 class Receiver:
     """Create a hardware sensor object."""
 
-    def __init__(self,pin):
+    def __init__(self,pin,mode="poll",edgeSource=None,idleGap=20000):
         self.sensorPin = pin # Note: this program uses the GPIO.BOARD numbering scheme
-        GPIO.setup(self.sensorPin,GPIO.IN)
+        setupPin(self.sensorPin,GPIO.IN)
         self.remotes = []
+        self.idleGap = idleGap * 1000 # A HIGH period this long (ns) ends a frame
+        self.codeIndex = [] # (protocol, {code: button}) pairs used by listen
+        self.droppedFrames = 0 # Frames frames() had no room to queue
+        self.indexedVersions = None
+
+        # In "edge" mode frames are timestamped from edge callbacks instead of polling the pin
+        self.capture = None
+        if mode == "edge":
+            self.capture = EdgeCapture(edgeSource or GPIOEdgeSource(pin),idleGap=idleGap)
+        elif mode != "poll":
+            raise ValueError("Unknown capture mode: " + str(mode))
 
     # ----------------- #
     # Add a remote object to this receiver
@@ -21,104 +37,924 @@ class Receiver:
         self.remotes.append(remote)
     
     # ----------------- #
-    # Wait for data to be received then return it
+    # Wait for data to be received then return it as (HIGH/LOW, time µs) tuples
     def getRAW(self):
-        num1s = 0 # Number of consecutive 1s
-        command = [] # Pulses and their timings
+        return rawFromPulses(self.getPulses())
+
+    # ----------------- #
+    # Wait for data to be received then return the pulse widths in µs, starting with a LOW pulse
+    # Returns an empty array if no frame starts within timeout seconds
+    def getPulses(self,timeout=None):
+        if self.capture is not None:
+            return self.capture.getFrame(timeout)
+
+        pulses = array('I') # Pulse widths, alternating LOW / HIGH
+        read = GPIO.input # Local names keep attribute lookups out of the hot loop
+        timer = clock.perf_counter_ns
+        pin = self.sensorPin
+        idleGap = self.idleGap
+
+        giveUp = None if timeout is None else timer() + int(timeout * 1e9)
+        while read(pin): # Waits until pin is pulled low
+            if giveUp is not None and timer() > giveUp:
+                return pulses
+            clock.sleep(0.0001)
+
         previousValue = 0 # The previous pin state
+        startTime = timer() # Time of the last change in state (ns)
 
-        value = GPIO.input(self.sensorPin) # Current pin state
-        
-        while value: # Waits until pin is pulled low
-            sleep(0.0001)
-            value = GPIO.input(self.sensorPin)
-        
-        startTime = datetime.now() # Sets start time
-        
-        while num1s < 10000:
-            if value != previousValue: # Waits until change in state occurs
-                now = datetime.now() # Records the current time
-                pulseLength = now - startTime # Calculate time in between pulses
-                startTime = now # Resets the start time
-                command.append((previousValue, pulseLength.microseconds)) # Adds pulse time to array (previous val acts as an alternating 1 / 0 to show whether time is the on time or off time)
-            
-            # Interrupts code if an extended high period is detected (End Of Command)	
-            if value:
-                num1s += 1
-            else:
-                num1s = 0
-            
-            # Reads values again
-            previousValue = value
-            value = GPIO.input(self.sensorPin)
-        
-        return command # Returns the raw information about the high and low pulses (HIGH/LOW, time µs)
+        while True:
+            value = read(pin)
+            now = timer()
+            if value != previousValue: # Change in state, store how long the previous one lasted
+                pulses.append((now - startTime) // 1000)
+                startTime = now
+                previousValue = value
+            elif value and now - startTime > idleGap: # Extended high period (End Of Command)
+                break
+
+        return pulses
 
     # ----------------- #
     # Listen for incoming data and identify button
     def listen(self,remotes=[]):
         if remotes == []:
             remotes = self.remotes
+        index = self.getCodeIndex(remotes)
 
         while True:
-            raw = self.getRAW()
-            for remote in remotes:
-                match = remote.identifyButton(remote.getIntegerCode(raw))
-                if match != -1:
+            raw = self.getPulses()
+            for protocol, buttons in index: # Decode once per protocol, then a single dictionary lookup
+                match = buttons.get(protocol.getIntegerCode(raw))
+                if match is not None:
                     return match
 
+    # ----------------- #
+    # Index the buttons of all the remotes by integer code, grouped by protocol as each decodes differently
+    # The index is rebuilt only when a remote has had buttons added since it was last built
+    def getCodeIndex(self,remotes):
+        versions = [(id(remote), remote.version) for remote in remotes]
+        if versions == self.indexedVersions:
+            return self.codeIndex
+
+        byProtocol = {}
+        for remote in remotes: # Earlier remotes win a shared code, as they were checked first
+            protocol = remote.protcol.getClassName()
+            if protocol not in byProtocol:
+                byProtocol[protocol] = (remote.protcol, {})
+            buttons = byProtocol[protocol][1]
+            for code, button in remote.buttonsByCode.items():
+                buttons.setdefault(code,button)
+
+        self.codeIndex = list(byProtocol.values())
+        self.indexedVersions = versions
+        return self.codeIndex
+
+    # ----------------- #
+    # Async iterator over captured frames (pulse arrays): async for frame in receiver.frames()
+    # Capturing runs on its own thread and hands frames to the event loop through an asyncio.Queue;
+    # if the consumer falls more than maxsize frames behind, new frames are dropped and counted
+    async def frames(self,maxsize=16):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize)
+        stop = threading.Event()
+
+        def deliver(pulses):
+            try:
+                queue.put_nowait(pulses)
+            except asyncio.QueueFull:
+                self.droppedFrames += 1
+
+        def capture():
+            while not stop.is_set():
+                pulses = self.getPulses(timeout=0.1) # Wake up now and again to check for stop
+                if pulses:
+                    loop.call_soon_threadsafe(deliver,pulses)
+
+        thread = threading.Thread(target=capture,name="ir-capture",daemon=True)
+        thread.start()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            stop.set()
+            await asyncio.to_thread(thread.join)
+
+    # ----------------- #
+    # Stop listening for edges (only needed in "edge" mode)
+    def close(self):
+        if self.capture is not None:
+            self.capture.close()
+
+# ========================================= #
+#^ Edge driven capture ^#
+class GPIOEdgeSource:
+    """Edge source that gets a callback from GPIO on every change of the sensor pin."""
+
+    def __init__(self,pin):
+        self.pin = pin
+
+    def start(self,callback):
+        GPIO.add_event_detect(self.pin,GPIO.BOTH,callback=callback)
+
+    def stop(self):
+        GPIO.remove_event_detect(self.pin)
+
+class EdgeCapture:
+    """Timestamp edges from an edge source into a preallocated buffer and split them into frames.
+
+    Any object with start(callback) and stop() methods can be used as the edge source; the
+    callback takes an optional channel argument like the RPi.GPIO callbacks do. The source
+    keeps running between frames, so a frame only starts on an edge that follows at least
+    idleGap microseconds of idle line: the falling edge of a leader, never an edge from the
+    middle of a frame that was already under way when getFrame was called. A frame ends
+    once no edge has been seen for idleGap microseconds.
+    """
+
+    def __init__(self,source,maxEdges=1024,idleGap=20000):
+        self.source = source
+        self.idleGap = idleGap * 1000 # Stored in ns to compare against the timestamps
+        self.timestamps = array('Q',[0]) * maxEdges
+        self.count = 0
+        self.overflows = 0 # Edges dropped because the buffer was full
+        self.skipped = 0 # Edges dropped because they weren't the start of a frame
+        self.lastEdge = None # monotonic_ns of the latest edge, recorded or not
+        self.armed = False # Whether getFrame is waiting for a frame
+        self.edgeSeen = threading.Event()
+        self.running = False
+
+    # ----------------- #
+    # Called from the edge source's thread on every edge
+    def onEdge(self,channel=None):
+        now = clock.monotonic_ns()
+        last = self.lastEdge
+        self.lastEdge = now
+        if not self.armed:
+            return
+        if self.count == 0 and last is not None and now - last < self.idleGap:
+            self.skipped += 1 # Mid-frame, wait for the line to go idle and the next leader
+            return
+        if self.count < len(self.timestamps):
+            self.timestamps[self.count] = now
+            self.count += 1
+        else:
+            self.overflows += 1
+        if self.count == 1:
+            self.edgeSeen.set()
+
+    # ----------------- #
+    # Wait for the next frame and return it in the same format as Receiver.getPulses
+    def getFrame(self,timeout=None):
+        self.count = 0
+        self.edgeSeen.clear()
+        self.armed = True
+        if not self.running:
+            self.source.start(self.onEdge)
+            self.running = True
+
+        if not self.edgeSeen.wait(timeout):
+            self.armed = False
+            return array('I')
+
+        # Keep sleeping until the line has been idle for a full gap after the latest edge
+        # (no wakeup per edge, so the capture thread stays out of the way of the callbacks)
+        while True:
+            remaining = self.timestamps[self.count - 1] + self.idleGap - clock.monotonic_ns()
+            if remaining <= 0:
+                break
+            clock.sleep(remaining / 1e9)
+        self.armed = False
+
+        # The first edge of a frame is the falling edge of the leader, so widths alternate from LOW.
+        # An edge of the next frame can slip in just before the callback is disarmed, the idle gap cuts it off
+        stamps = self.timestamps
+        widths = array('I')
+        for i in range(self.count - 1):
+            width = stamps[i + 1] - stamps[i]
+            if width >= self.idleGap:
+                break
+            widths.append(width // 1000)
+        return widths
+
+    def close(self):
+        if self.running:
+            self.source.stop()
+            self.running = False
+
+# ========================================= #
+#^ Continuous capture pipeline ^#
+class IREvent:
+    """A frame that came out of the StreamingReceiver pipeline"""
+
+    def __init__(self,pulses,timestamp,code=None,button=None,repeat=False):
+        self.pulses = pulses # Pulse widths as returned by Receiver.getPulses
+        self.timestamp = timestamp # monotonic_ns of the frame's first edge
+        self.code = code # Integer code, None for repeat codes
+        self.button = button # Matching button, or the held button for a repeat code
+        self.repeat = repeat
+
+    def __repr__(self):
+        name = self.button.getNickname() if self.button is not None else None
+        return "IREvent(button=%r, code=%r, repeat=%r)" % (name, self.code, self.repeat)
+
+class StreamingReceiver(Receiver):
+    """
+    Capture continuously so frames keep arriving while earlier ones are being decoded.
+
+    The edge source's callback (the producer) writes timestamps into a fixed size ring
+    buffer. A segmenter thread drains the ring and cuts frames wherever the line has been
+    idle for idleGap µs, and a decoder thread turns frames into IREvents matched against
+    the added remotes. NEC repeat codes become repeat events for the last button seen.
+    Every stage is bounded; when one is full the newest item is dropped and counted in
+    getStats() instead of blocking the stage before it.
+    """
+
+    def __init__(self,pin,edgeSource=None,ringSize=4096,idleGap=20000,maxFrames=64,maxEvents=256):
+        super().__init__(pin,idleGap=idleGap)
+        if ringSize & (ringSize - 1):
+            raise ValueError("ringSize must be a power of two")
+        self.source = edgeSource or GPIOEdgeSource(pin)
+        self.ring = array('Q',[0]) * ringSize
+        self.ringMask = ringSize - 1
+        self.head = 0 # Edges written, only the producer changes this
+        self.tail = 0 # Edges read, only the segmenter changes this
+        self.frameQueue = queue.Queue(maxFrames)
+        self.events = queue.Queue(maxEvents)
+        self.pollInterval = idleGap / 4e6 # s between segmenter passes
+        self.repeatDecoder = NEC()
+        self.stats = {"edges": 0, "edgeOverflows": 0, "frames": 0, "framesDropped": 0, "events": 0, "eventsDropped": 0}
+        self.running = False
+        self.threads = []
+
+    # ----------------- #
+    # Producer: called from the edge source's thread on every edge
+    def onEdge(self,channel=None):
+        head = self.head
+        if head - self.tail > self.ringMask:
+            self.stats["edgeOverflows"] += 1
+            return
+        self.ring[head & self.ringMask] = clock.monotonic_ns()
+        self.head = head + 1
+
+    # ----------------- #
+    # Segmenter: cut the edge stream into frames on idle gaps
+    def segment(self):
+        stamps = [] # Timestamps of the frame being built
+        ring = self.ring
+        mask = self.ringMask
+        idleGap = self.idleGap
+        while self.running:
+            clock.sleep(self.pollInterval)
+            head = self.head
+            tail = self.tail
+            while tail < head:
+                stamp = ring[tail & mask]
+                tail += 1
+                if stamps and stamp - stamps[-1] > idleGap: # Edges of the next frame are already in
+                    self.emitFrame(stamps)
+                    stamps = []
+                stamps.append(stamp)
+            self.tail = tail
+            self.stats["edges"] = head
+
+            if stamps and clock.monotonic_ns() - stamps[-1] > idleGap:
+                self.emitFrame(stamps)
+                stamps = []
+
+    def emitFrame(self,stamps):
+        pulses = array('I',[(stamps[i + 1] - stamps[i]) // 1000 for i in range(len(stamps) - 1)])
+        try:
+            self.frameQueue.put_nowait((stamps[0], pulses))
+            self.stats["frames"] += 1
+        except queue.Full:
+            self.stats["framesDropped"] += 1
+
+    # ----------------- #
+    # Decoder: match frames to buttons and publish events
+    def decode(self):
+        lastButton = None
+        while True:
+            item = self.frameQueue.get()
+            if item is None:
+                return
+            timestamp, pulses = item
+
+            if len(pulses) < 5 and self.repeatDecoder.decodeFrame(pulses).repeat:
+                event = IREvent(pulses,timestamp,button=lastButton,repeat=True)
+            else:
+                event = IREvent(pulses,timestamp)
+                for protocol, buttons in self.getCodeIndex(self.remotes):
+                    event.code = protocol.getIntegerCode(pulses)
+                    event.button = buttons.get(event.code)
+                    if event.button is not None:
+                        break
+                lastButton = event.button
+
+            try:
+                self.events.put_nowait(event)
+                self.stats["events"] += 1
+            except queue.Full:
+                self.stats["eventsDropped"] += 1
+
+    # ----------------- #
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self.segment,name="ir-segmenter",daemon=True),
+            threading.Thread(target=self.decode,name="ir-decoder",daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        self.source.start(self.onEdge)
+
+    def stop(self):
+        if not self.running:
+            return
+        self.source.stop()
+        self.running = False
+        self.threads[0].join()
+        self.frameQueue.put(None)
+        self.threads[1].join()
+        self.threads = []
+
+    # Return the next event, or None if none arrives within timeout seconds
+    def getEvent(self,timeout=None):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def getStats(self):
+        stats = dict(self.stats)
+        stats["ringDepth"] = self.head - self.tail
+        stats["eventBacklog"] = self.events.qsize()
+        return stats
+
+    def close(self):
+        self.stop()
+
+# ========================================= #
+#^ Conversions between the two raw data formats ^#
+# Pulse array (alternating LOW / HIGH widths) to the (HIGH/LOW, time µs) tuples used by getRAW
+def rawFromPulses(pulses):
+    return [(i % 2, tme) for i, tme in enumerate(pulses)]
+
+# True for pulse widths (an array from getPulses or a list already run through pulseWidths)
+def isPulses(rawDATA):
+    return isinstance(rawDATA, array) or not rawDATA or not isinstance(rawDATA[0], tuple)
+
+# Return every pulse width from either raw data format
+def pulseWidths(rawDATA):
+    if isPulses(rawDATA):
+        return rawDATA
+    return [tme for (typ, tme) in rawDATA]
+
+# Return just the HIGH period widths from either raw data format
+def highPeriods(rawDATA):
+    if isPulses(rawDATA):
+        return rawDATA[1::2]
+    return [tme for (typ, tme) in rawDATA if typ]
+
 # ========================================= #
 #^ Information for functions relating to the NEC IR Protocol ^#
 class NEC:
+    # Pulse timings in µs, with the thresholds used to tell them apart when decoding
+    LEADER_MARK = 9000
+    LEADER_SPACE = 4500
+    REPEAT_SPACE = 2250
+    BIT_MARK = 560
+    ZERO_SPACE = 560
+    ONE_SPACE = 1690
+    FRAME_PERIOD = 108000 # Frames (and repeat codes) start every 108 ms
+    MIN_LEADER_MARK = 7000 # Anything shorter can't be the 9 ms leader
+    MIN_LEADER_SPACE = 3500 # Longer than this after the leader means a data frame follows...
+    MIN_REPEAT_SPACE = 1700 # ...between this and MIN_LEADER_SPACE it is a repeat code
+    ONE_THRESHOLD = 1000 # A space over 1000 µs is a logical 1
+    CODE_BITS = 34 # Integer codes are a leading 1, the leader bit and the 32 data bits
+    MAX_PULSES = 75 # Allows for a few rogue periods on the end, anything longer is another protocol
+    ADDRESS_MASK = 0xFF
+    DETECT_COST = 67 # Pulses a full decode looks at, detection tries the cheapest protocols first
+
+    # ----------------- #
+    # Quick check on the pulse count and leader that rules out most frames of other protocols
+    def matches(self,widths):
+        return self.CODE_BITS * 2 - 1 <= len(widths) <= self.MAX_PULSES and widths[0] >= self.MIN_LEADER_MARK and widths[1] >= self.MIN_LEADER_SPACE
+
+    # Return the integer code if the frame is a valid frame of this protocol, otherwise -1
+    def decode(self,rawDATA):
+        widths = pulseWidths(rawDATA)
+        if not self.matches(widths):
+            return -1
+        frame = self.decodeFrame(widths)
+        if not frame.valid or frame.repeat:
+            return -1
+        return self.getIntegerCode(widths)
+
+    # The inverted address and command bytes have to match
+    def checkData(self,data):
+        return ((data >> 8) & 0xFF) == (data & 0xFF) ^ 0xFF and (data >> 24) == ((data >> 16) & 0xFF) ^ 0xFF
+
     # ----------------- #
-    # Take the data about the times of pulses and convert to a binary data string according to NEC protocol
+    # Take the data about the times of pulses and convert to an integer code according to NEC protocol
+    # Accepts either the (HIGH/LOW, time) tuples from getRAW or the pulse array from getPulses
     def getIntegerCode(self,rawDATA):
-        binary = 1 # Decoded binary command
+        binary = 1 # Decoded binary command, starting from a leading 1
+        threshold = self.ONE_THRESHOLD
         
-        # Covers data to binary
-        for (typ, tme) in rawDATA:
-            if typ == 1: # Ignore the LOW periods, these should be consitant and thus irrelevant
-                if tme > 1000: # According to NEC protocol a gap of 1687.5 microseconds represents a logical 1 so over 1000 should make a big enough distinction
-                    binary = binary * 10 + 1
-                else:
-                    binary *= 10
-                    
-        if len(str(binary)) > 34: # Sometimes the binary has two rouge characters on the end
-            binary = int(str(binary)[:34])
+        # Shift in one bit per HIGH period, ignoring the LOW periods as these should be consistent and thus irrelevant
+        # (sometimes there are rogue periods on the end, so stop once the code is full)
+        for tme in highPeriods(rawDATA)[:self.CODE_BITS - 1]:
+            binary = binary << 1 | (tme > threshold)
         
-        return int(str(binary),2)
-    
-    def getRawFromIntegerCode(self, integer_code):
+        return binary
+
+    # ----------------- #
+    # Fully decode a frame: check the leader, repeat code and stop bit and split out the address and command
+    def decodeFrame(self,rawDATA):
+        widths = pulseWidths(rawDATA)
+        if len(widths) < 3 or widths[0] < self.MIN_LEADER_MARK:
+            return NECFrame(valid=False)
+
+        leaderSpace = widths[1]
+        if self.MIN_REPEAT_SPACE <= leaderSpace < self.MIN_LEADER_SPACE:
+            return NECFrame(repeat=True,valid=True)
+        if leaderSpace < self.MIN_LEADER_SPACE or len(widths) < 67: # Leader + 32 bits + stop bit
+            return NECFrame(valid=False)
+
+        # Bits are sent least significant first, so shift each one in at its own position
+        data = 0
+        threshold = self.ONE_THRESHOLD
+        for bit in range(32):
+            if widths[3 + 2 * bit] > threshold:
+                data |= 1 << bit
+
+        address = data & self.ADDRESS_MASK
+        command = (data >> 16) & 0xFF
+        return NECFrame(address,command,data=data,valid=self.checkData(data))
+
+    # ----------------- #
+    # Decode a whole batch of captures at once with NumPy (imported here so only batch users need it)
+    # Returns the 32 bit data words (as NECFrame.data) and a mask of the frames that decodeFrame would
+    # call valid; repeat codes carry no data so they are left out of the mask
+    def decodeMany(self,frames):
+        import numpy as np
+
+        if isinstance(frames, np.ndarray):
+            widths = frames[:, :67]
+        else:
+            widths = np.zeros((len(frames), 67), dtype=np.uint32)
+            for i, frame in enumerate(frames):
+                frame = pulseWidths(frame)[:67]
+                widths[i, :len(frame)] = frame
+
+        if widths.shape[1] < 67: # Every frame too short to hold the stop bit
+            return np.zeros(len(widths), dtype=np.uint32), np.zeros(len(widths), dtype=bool)
+
+        # Threshold every data space in one go, then pack them into bytes least significant bit first
+        bits = widths[:, 3:67:2] > self.ONE_THRESHOLD
+        packed = np.packbits(bits, axis=1, bitorder='little')
+        codes = packed.view('<u4').ravel()
+
+        valid = (widths[:, 0] >= self.MIN_LEADER_MARK) & (widths[:, 1] >= self.MIN_LEADER_SPACE) & (widths[:, 66] > 0)
+        valid &= (packed[:, 0] ^ packed[:, 1]) == 0xFF
+        valid &= (packed[:, 2] ^ packed[:, 3]) == 0xFF
+        return codes, valid
+
+    def getRawFromIntegerCode(self, integer_code, repeats=0):
         """
         Convert an integer code back to raw data for NEC protocol.
+
+        The frame is the 9 ms leader, the 32 data bits in the order they were received and the
+        stop bit, followed by `repeats` repeat codes spaced one frame period apart. Levels are
+        for the transmitter, so 1 means the LED is on.
         """
-        binary_string = bin(integer_code)[2:].zfill(32)  # Convert to binary and pad with zeros
-        raw_data = []
+        raw_data = [(1, self.LEADER_MARK), (0, self.LEADER_SPACE)]
         
-        # Generate raw data based on NEC protocol timing
-        for bit in binary_string:
-            if bit == '1':
-                raw_data.append((1, 560))  # Timing for HIGH (logical 1)
-                raw_data.append((0, 560))  # Timing for LOW
-            else:
-                raw_data.append((1, 560))
-                raw_data.append((0, 1680))  # Timing for LOW (logical 0)
+        # Generate raw data based on NEC protocol timing, first received bit first
+        data = integer_code & 0xFFFFFFFF
+        for bit in range(31, -1, -1):
+            raw_data.append((1, self.BIT_MARK))
+            raw_data.append((0, self.ONE_SPACE if (data >> bit) & 1 else self.ZERO_SPACE))
+        raw_data.append((1, self.BIT_MARK))  # Stop bit
+
+        frameLength = sum(tme for (typ, tme) in raw_data)
+        for _ in range(repeats):
+            raw_data.append((0, self.FRAME_PERIOD - frameLength))
+            raw_data.extend(((1, self.LEADER_MARK), (0, self.REPEAT_SPACE), (1, self.BIT_MARK)))
+            frameLength = self.LEADER_MARK + self.REPEAT_SPACE + self.BIT_MARK
 
         return raw_data
 
-    
     def getClassName(self):
         return "NEC"
 
+# Result of NEC.decodeFrame
+class NECFrame:
+    """A decoded NEC frame"""
+
+    def __init__(self,address=None,command=None,repeat=False,valid=False,data=None):
+        self.address = address
+        self.command = command
+        self.repeat = repeat # True for the short 'button still held' frame, which carries no data
+        self.valid = valid # Leader, stop bit and the inverted address/command bytes all checked out
+        self.data = data # All 32 data bits, first received bit in bit 0
+
+    def __repr__(self):
+        return "NECFrame(address=%r, command=%r, repeat=%r, valid=%r)" % (self.address, self.command, self.repeat, self.valid)
+
+# ========================================= #
+#^ Other IR protocols ^#
+# Every protocol has the same interface as NEC: matches (a cheap check on the pulse count and
+# leader), decode (-1 unless the frame is valid for the protocol), getIntegerCode for receivers,
+# getRawFromIntegerCode for transmitters and getClassName for the remote file.
+# Unless a protocol says otherwise, integer codes are a leading 1 followed by the data bits in
+# the order they were received, so the leading 1 keeps track of how many bits there are.
+class NECext(NEC):
+    """Extended NEC: a 16 bit address, so only the command is sent with its inverse"""
+    ADDRESS_MASK = 0xFFFF
+
+    def checkData(self,data):
+        return (data >> 24) == ((data >> 16) & 0xFF) ^ 0xFF
+
+    def getClassName(self):
+        return "NECext"
+
+class Samsung(NEC):
+    """Samsung32: NEC bit timings after a 4.5 ms leader, and the whole frame is resent while a button is held"""
+    LEADER_MARK = 4500
+    LEADER_SPACE = 4500
+    MIN_LEADER_MARK = 3500
+    MAX_LEADER_MARK = 7000 # Longer is the NEC leader
+
+    def matches(self,widths):
+        return super().matches(widths) and widths[0] < self.MAX_LEADER_MARK
+
+    # The address byte is sent twice and the command with its inverse
+    def checkData(self,data):
+        return ((data >> 8) & 0xFF) == data & 0xFF and (data >> 24) == ((data >> 16) & 0xFF) ^ 0xFF
+
+    def getRawFromIntegerCode(self, integer_code, repeats=0):
+        frame = NEC.getRawFromIntegerCode(self, integer_code)
+        return repeatFrame(frame, repeats, self.FRAME_PERIOD)
+
+    def getClassName(self):
+        return "Samsung"
+
+class SIRC:
+    """Sony SIRC: pulse width coding, 12, 15 or 20 bits sent least significant bit first"""
+    HEADER_MARK = 2400
+    SPACE = 600
+    ONE_MARK = 1200
+    ZERO_MARK = 600
+    FRAME_PERIOD = 45000
+    MIN_HEADER_MARK = 1800
+    MAX_HEADER_MARK = 3000
+    MAX_SPACE = 800 # The RC6 leader space is longer
+    ONE_THRESHOLD = 900 # A mark over 900 µs is a logical 1
+    LENGTHS = (25, 31, 41) # Header mark plus a space and a mark for each of the 12, 15 or 20 bits
+    DETECT_COST = 25
+
+    def matches(self,widths):
+        return len(widths) in self.LENGTHS and self.MIN_HEADER_MARK <= widths[0] <= self.MAX_HEADER_MARK and widths[1] <= self.MAX_SPACE
+
+    def decode(self,rawDATA):
+        widths = pulseWidths(rawDATA)
+        if not self.matches(widths) or max(widths[1::2]) > self.MAX_SPACE:
+            return -1
+        return self.getIntegerCode(widths)
+
+    # Shift in one bit per mark after the header
+    def getIntegerCode(self,rawDATA):
+        widths = pulseWidths(rawDATA)
+        binary = 1
+        threshold = self.ONE_THRESHOLD
+        for tme in widths[2::2]:
+            binary = binary << 1 | (tme > threshold)
+        return binary
+
+    def getRawFromIntegerCode(self, integer_code, repeats=0):
+        raw_data = [(1, self.HEADER_MARK)]
+        for bit in range(integer_code.bit_length() - 2, -1, -1):
+            raw_data.append((0, self.SPACE))
+            raw_data.append((1, self.ONE_MARK if (integer_code >> bit) & 1 else self.ZERO_MARK))
+        return repeatFrame(raw_data, repeats, self.FRAME_PERIOD)
+
+    def getClassName(self):
+        return "SIRC"
+
+class RC5:
+    """
+    Philips RC5: 14 Manchester coded bits of 1.778 ms, a 1 being a mark in the second half of the bit.
+
+    The third bit is the toggle bit, which flips on every new press. It is always 0 in integer codes
+    so a button has the same code whichever way it was last toggled.
+    """
+    UNIT = 889 # Half a bit
+    BITS = 14
+    TOGGLE_MASK = 1 << 11 # Third of the 14 bits
+    FRAME_PERIOD = 113778
+    MIN_FIRST_MARK = 600 # The first pulse is the second half of the first start bit
+    MAX_FIRST_MARK = 2000
+    DETECT_COST = 28
+
+    def matches(self,widths):
+        return self.BITS - 1 <= len(widths) <= 2 * self.BITS - 1 and self.MIN_FIRST_MARK <= widths[0] <= self.MAX_FIRST_MARK
+
+    def decode(self,rawDATA):
+        widths = pulseWidths(rawDATA)
+        if not self.matches(widths):
+            return -1
+        # The first half of the first start bit is a space, which can't be seen
+        halves = unitLevels(widths, self.UNIT, 2, [False])
+        if halves is None or len(halves) > 2 * self.BITS:
+            return -1
+        halves += [False] * (2 * self.BITS - len(halves)) # So can a space at the end
+
+        binary = 1
+        for i in range(0, 2 * self.BITS, 2):
+            if halves[i] == halves[i + 1]:
+                return -1
+            binary = binary << 1 | halves[i + 1]
+        return binary & ~self.TOGGLE_MASK
+
+    def getIntegerCode(self,rawDATA):
+        return self.decode(rawDATA)
+
+    def getRawFromIntegerCode(self, integer_code, repeats=0):
+        halves = []
+        for bit in range(self.BITS - 1, -1, -1):
+            one = bool((integer_code >> bit) & 1)
+            halves += [not one, one]
+        return repeatFrame(rawFromUnits(halves, self.UNIT), repeats, self.FRAME_PERIOD)
+
+    def getClassName(self):
+        return "RC5"
+
+class RC6:
+    """
+    Philips RC6 mode 0: a 2.666 ms leader, then Manchester coded bits with a mark in the first
+    half for a 1. There is a start bit, 3 mode bits, a double length trailer (toggle) bit and
+    16 data bits. As with RC5 the toggle bit is always 0 in integer codes.
+    """
+    UNIT = 444 # Half a bit
+    LEADER_MARK = 2666
+    LEADER_SPACE = 889
+    MIN_LEADER_MARK = 2000
+    MAX_LEADER_MARK = 3300
+    MIN_LEADER_SPACE = 700 # The SIRC header space is shorter
+    MAX_LEADER_SPACE = 1200
+    MIN_PULSES = 17 # Leader plus the 44 half bits in pulses of 1 to 3 halves
+    MAX_PULSES = 46
+    FIELDS = (1, 1, 1, 1, 2) + (1,) * 16 # Length of each bit in half bits: start, mode, trailer, data
+    TOGGLE_MASK = 1 << 16
+    FRAME_PERIOD = 106667
+    DETECT_COST = 44
+
+    def matches(self,widths):
+        return (self.MIN_LEADER_MARK <= widths[0] <= self.MAX_LEADER_MARK and self.MIN_LEADER_SPACE <= widths[1] <= self.MAX_LEADER_SPACE
+            and self.MIN_PULSES <= len(widths) <= self.MAX_PULSES)
+
+    def decode(self,rawDATA):
+        widths = pulseWidths(rawDATA)
+        if not self.matches(widths):
+            return -1
+        units = unitLevels(widths[2:], self.UNIT, 3, [])
+        total = 2 * sum(self.FIELDS)
+        if units is None or len(units) > total:
+            return -1
+        units += [False] * (total - len(units)) # A space at the end can't be seen
+
+        binary = 1
+        position = 0
+        for length in self.FIELDS:
+            first = units[position]
+            if units[position + length] == first:
+                return -1
+            binary = binary << 1 | first
+            position += 2 * length
+        return binary & ~self.TOGGLE_MASK
+
+    def getIntegerCode(self,rawDATA):
+        return self.decode(rawDATA)
+
+    def getRawFromIntegerCode(self, integer_code, repeats=0):
+        units = []
+        bit = len(self.FIELDS)
+        for length in self.FIELDS:
+            bit -= 1
+            one = bool((integer_code >> bit) & 1)
+            units += [one] * length + [not one] * length
+        frame = [(1, self.LEADER_MARK), (0, self.LEADER_SPACE)] + rawFromUnits(units, self.UNIT)
+        return repeatFrame(frame, repeats, self.FRAME_PERIOD)
+
+    def getClassName(self):
+        return "RC6"
+
+class PulseDistance:
+    """
+    Long pulse distance frames as sent by air conditioners: a leader, then one bit per space
+    (short for 0, long for 1), split into sections by gaps of several milliseconds.
+
+    Integer codes hold every bit of every section. Encoding splits them back into sections
+    of SECTIONS bits, the layout of the sample frame in ir_transmitter.py; a unit that lays
+    its frame out differently needs a subclass with its own SECTIONS and timings.
+    """
+    LEADER_MARK = 9000
+    LEADER_SPACE = 4500
+    BIT_MARK = 560
+    ZERO_SPACE = 560
+    ONE_SPACE = 1690
+    SECTION_GAP = 8000
+    SECTION_LEADER = False # Whether every section starts with its own leader
+    REPEAT_GAP = 40000 # Between whole frames, if a frame is sent more than once
+    SECTIONS = (48, 64, 56)
+    MIN_LEADER_MARK = 7000
+    MIN_LEADER_SPACE = 3500
+    MIN_GAP = 5000 # A space this long ends a section
+    MAX_BIT_MARK = 1000
+    ONE_THRESHOLD = 1000
+    MIN_PULSES = 99 # Anything shorter is a consumer protocol
+    DETECT_COST = 200
+
+    def matches(self,widths):
+        return len(widths) >= self.MIN_PULSES and widths[0] >= self.MIN_LEADER_MARK and widths[1] >= self.MIN_LEADER_SPACE
+
+    def decode(self,rawDATA):
+        widths = pulseWidths(rawDATA)
+        if not self.matches(widths):
+            return -1
+        return self.getIntegerCode(widths)
+
+    # One bit per space, skipping the section gaps and any leader that follows them
+    # Returns -1 if a bit mark is too long to be one
+    def getIntegerCode(self,rawDATA):
+        widths = pulseWidths(rawDATA)
+        binary = 1
+        threshold = self.ONE_THRESHOLD
+        i = 2
+        while i + 1 < len(widths):
+            if widths[i] > self.MAX_BIT_MARK:
+                return -1
+            space = widths[i + 1]
+            i += 2
+            if space > self.MIN_GAP:
+                if i < len(widths) and widths[i] >= self.MIN_LEADER_MARK:
+                    i += 2
+                continue
+            binary = binary << 1 | (space > threshold)
+        return binary
+
+    def getRawFromIntegerCode(self, integer_code, repeats=0):
+        bits = integer_code.bit_length() - 1
+        sections = self.SECTIONS if sum(self.SECTIONS) == bits else (bits,)
+
+        raw_data = [(1, self.LEADER_MARK), (0, self.LEADER_SPACE)]
+        for section, length in enumerate(sections):
+            if section:
+                raw_data.append((0, self.SECTION_GAP))
+                if self.SECTION_LEADER:
+                    raw_data.extend(((1, self.LEADER_MARK), (0, self.LEADER_SPACE)))
+            for _ in range(length):
+                bits -= 1
+                raw_data.append((1, self.BIT_MARK))
+                raw_data.append((0, self.ONE_SPACE if (integer_code >> bits) & 1 else self.ZERO_SPACE))
+            raw_data.append((1, self.BIT_MARK)) # Stop bit
+        
+        frame = list(raw_data)
+        for _ in range(repeats):
+            raw_data.append((0, self.REPEAT_GAP))
+            raw_data.extend(frame)
+        return raw_data
+
+    def getClassName(self):
+        return "PulseDistance"
+
+# ----------------- #
+# Manchester helpers
+# Expand pulse widths (starting with a mark) into one True (mark) / False (space) per time unit
+# Returns None if a pulse isn't 1 to maxUnits units long
+def unitLevels(widths, unit, maxUnits, levels):
+    for i, tme in enumerate(widths):
+        count = (tme + unit // 2) // unit
+        if not 1 <= count <= maxUnits:
+            return None
+        levels.extend([i % 2 == 0] * count)
+    return levels
+
+# Merge per unit on/off levels into transmit raw data, dropping the idle time at either end
+def rawFromUnits(units, unit):
+    raw_data = []
+    for on in units:
+        level = 1 if on else 0
+        if raw_data and raw_data[-1][0] == level:
+            raw_data[-1] = (level, raw_data[-1][1] + unit)
+        elif raw_data or level:
+            raw_data.append((level, unit))
+    if raw_data and raw_data[-1][0] == 0:
+        raw_data.pop()
+    return raw_data
+
+# Send a frame repeats more times, each starting a period after the last
+def repeatFrame(frame, repeats, period):
+    raw_data = list(frame)
+    frameLength = sum(tme for (typ, tme) in frame)
+    for _ in range(repeats):
+        raw_data.append((0, period - frameLength))
+        raw_data.extend(frame)
+    return raw_data
+
+# The shortest space to leave after raw data before another frame of a protocol may start,
+# in µs: up to the next frame period, or the protocol's gap between repeated frames
+def frameGap(protocol, raw_data):
+    period = getattr(protocol, "FRAME_PERIOD", 0)
+    if period:
+        return period - sum(tme for (typ, tme) in raw_data) % period
+    return getattr(protocol, "REPEAT_GAP", 0)
+
+# ========================================= #
+#^ Protocol registry ^#
+# Protocols by the name saved in remote files
+PROTOCOLS = {}
+
+def registerProtocol(protocol):
+    """Make a protocol class available to loadRemote and auto-detection under its getClassName()."""
+    global defaultDetector
+    PROTOCOLS[protocol().getClassName()] = protocol
+    defaultDetector = None
+    return protocol
+
+for protocol in (NEC, NECext, Samsung, SIRC, RC5, RC6, PulseDistance):
+    registerProtocol(protocol)
+
+# Return the protocol class saved under a name, used instead of eval when loading remotes
+def getProtocol(name):
+    protocol = PROTOCOLS.get(name)
+    if protocol is None:
+        raise ValueError("Unknown IR protocol: " + repr(name))
+    return protocol
+
+class ProtocolDetector:
+    """
+    Work out which protocol a captured frame was sent with.
+
+    Every protocol's matches() check looks at no more than the pulse count and the first two
+    pulses, so most protocols reject a frame in a few comparisons. Only the protocols that pass
+    get a full decode, cheapest (fewest pulses to look at) first, and the first one that decodes
+    the frame as valid wins. Where protocols overlap (NEC is also valid NECext) the stricter one
+    is registered first.
+    """
+
+    def __init__(self, protocols=None):
+        protocols = PROTOCOLS.values() if protocols is None else protocols
+        self.protocols = sorted((protocol() for protocol in protocols), key=lambda protocol: protocol.DETECT_COST)
+        self.decodes = 0 # Full decodes run, for measuring how well matches() screens frames
+
+    # Return (protocol object, integer code), or (None, -1) if no protocol decodes the frame
+    def detect(self, rawDATA):
+        widths = pulseWidths(rawDATA)
+        if len(widths) < 2:
+            return None, -1
+        for protocol in self.protocols:
+            if protocol.matches(widths):
+                self.decodes += 1
+                code = protocol.decode(widths)
+                if code != -1:
+                    return protocol, code
+        return None, -1
+
+defaultDetector = None
+
+# Detect a frame's protocol with the registered protocols, see ProtocolDetector.detect
+def detectProtocol(rawDATA):
+    global defaultDetector
+    if defaultDetector is None:
+        defaultDetector = ProtocolDetector()
+    return defaultDetector.detect(rawDATA)
+
 # ========================================= #
 #^ Remote control objects ^#
 class Remote:
     """All functions related to a remote are stored here"""
 
-    def __init__(self,name,protocol):
+    def __init__(self,name,protocol,repeatFrames=0):
         self.nickname = name
         self.buttons = []
         self.protcol = protocol()
+        self.repeatFrames = repeatFrames # Repeat codes sent after each button's frame
+
+        # Lookup indexes, the first button added with a name or code wins as the list order did
+        self.buttonsByName = {}
+        self.buttonsByCode = {}
+        self.version = 0 # Bumped on every change so receivers know to rebuild their indexes
+
+        # Encoded waveforms by button nickname, rebuilt whenever the set of buttons changes
+        self.waveforms = None
+        self.waveformHits = 0
+        self.waveformMisses = 0
+
+        self.macros = {} # Macro name -> Macro
     
     # Return the binary value from raw data using the remote's protocol's method
     def getIntegerCode(self, raw):
@@ -129,7 +965,7 @@ class Remote:
         print("Ready to record data. Press the button on your remote! ")
         rawData = sensor.getRAW()
         
-        self.buttons.append(Button(buttonNickname,rawData))
+        self.addButton(buttonNickname,self.getIntegerCode(rawData))
 
     # Pint out a table that shows all of the buttons in the current remote
     def displayButtons(self):
@@ -145,11 +981,23 @@ class Remote:
             print(ROW_SEPARATOR)
     
     # Save remote data to a file
+    # Raises ValueError for names that can't be written: newlines, a '|' in a button name or an empty button name
     def saveRemote(self,filename):
-        with open(filename,'w') as file:
+        if "\n" in self.nickname or "\r" in self.nickname:
+            raise ValueError("Remote nickname can't contain a line break")
+        for button in self.buttons:
+            name = button.getNickname()
+            if name == "" or any(character in name for character in "|\n\r"):
+                raise ValueError("Button name %r can't be saved, it must be non-empty with no '|' or line break" % name)
+
+        with open(filename,'w',encoding="utf-8") as file:
             # Save properties of the class
             file.writelines("nickname:"+self.nickname+"\n")
             file.writelines("protocol:"+self.protcol.getClassName()+"\n")
+            if self.repeatFrames:
+                file.writelines("repeatFrames:"+str(self.repeatFrames)+"\n")
+            if self.macros:
+                file.writelines("macros:"+json.dumps({name: macro.toList() for name, macro in self.macros.items()},ensure_ascii=False)+"\n")
 
             # Save buttons to file separated by '|'
             file.writelines("buttons:")
@@ -158,18 +1006,92 @@ class Remote:
     
     # Add a button with given name and binary
     def addButton(self,name,integerValue):
-        self.buttons.append(Button(name,integerValue))
+        button = Button(name,integerValue)
+        self.buttons.append(button)
+        self.buttonsByName.setdefault(name,button)
+        self.buttonsByCode.setdefault(integerValue,button)
+        self.version += 1
+        self.waveforms = None
+
+    # ----------------- #
+    # Encode the transmit waveform of every button up front so sending needs no encoding work
+    def precomputeWaveforms(self):
+        waveforms = {}
+        for name, button in self.buttonsByName.items():
+            waveforms[name] = tuple(self.protcol.getRawFromIntegerCode(button.getIntegerCode(),self.repeatFrames))
+            self.waveformMisses += 1
+        self.waveforms = waveforms
+
+    # Return the cached transmit waveform for a button name, or -1 if there is no such button
+    def getWaveform(self,name):
+        if self.waveforms is None:
+            self.precomputeWaveforms()
+        waveform = self.waveforms.get(name)
+        if waveform is None:
+            return -1
+        self.waveformHits += 1
+        return waveform
 
-    # Return button object based on given binary value
+    # Waveform cache counters, misses count every button that had to be encoded
+    def getWaveformStats(self):
+        return {"hits": self.waveformHits, "misses": self.waveformMisses, "cached": len(self.waveforms or ())}
+
+    # Return button object based on given binary value, or -1 if there is none
     def identifyButton(self,code):
-        for button in self.buttons:
-            if button.getIntegerCode() == code:
-                return button
+        return self.buttonsByCode.get(code,-1)
+
     def identifyButtonByName(self, name):
-        for button in self.buttons:
-            if button.getNickname() == name:
-                return button
-        return -1
+        return self.buttonsByName.get(name,-1)
+
+    # ----------------- #
+    # Add (or replace) a macro; raises ValueError if a step names a button the remote doesn't have
+    def addMacro(self,macro):
+        for step in macro.steps:
+            if step.button not in self.buttonsByName:
+                raise ValueError("Macro %r uses %r, which isn't a button of %s" % (macro.name, step.button, self.nickname))
+        self.macros[macro.name] = macro
+
+    # Return the macro with a name, or -1 if there is none
+    def getMacro(self,name):
+        return self.macros.get(name,-1)
+
+    def scheduleMacro(self,macro,maxDuration=None):
+        """
+        Work out when every step of a macro is sent, as (step, raw data, start µs) tuples.
+
+        A step is its button's frame followed by its repeats (the remote's repeatFrames when
+        the step doesn't say), encoded by the protocol as holding the button would send them.
+        The next step starts no sooner than the step's gap after it ends, nor before the
+        protocol's next frame period (see frameGap). Returns -1 if a button doesn't exist.
+        Raises ValueError if the macro would take longer than maxDuration µs, which is
+        checked before a step's repeats are encoded.
+        """
+        schedule = []
+        start = 0
+        for step in macro.steps:
+            button = self.buttonsByName.get(step.button)
+            if button is None:
+                return -1
+            if step.repeats is None or step.repeats == self.repeatFrames:
+                raw_data = self.getWaveform(step.button)
+            else:
+                if maxDuration is not None and start + self.repeatedLength(button.getIntegerCode(),step.repeats) > maxDuration:
+                    raise ValueError("Macro %r would take over %g s" % (macro.name, maxDuration / 1e6))
+                raw_data = tuple(self.protcol.getRawFromIntegerCode(button.getIntegerCode(),step.repeats))
+            end = start + sum(tme for (typ, tme) in raw_data)
+            if maxDuration is not None and end > maxDuration:
+                raise ValueError("Macro %r would take over %g s" % (macro.name, maxDuration / 1e6))
+            schedule.append((step, raw_data, start))
+            start = end + max(step.gap, frameGap(self.protcol, raw_data))
+        return schedule
+
+    # Length in µs of a code sent with repeats, from one and two repeats rather than encoding them all
+    # (every protocol spaces its repeats evenly after the first)
+    def repeatedLength(self,code,repeats):
+        lengths = [sum(tme for (typ, tme) in self.protcol.getRawFromIntegerCode(code,count)) for count in range(min(repeats, 2) + 1)]
+        if repeats <= 2:
+            return lengths[repeats]
+        return lengths[2] + (repeats - 2) * (lengths[2] - lengths[1])
     
 # ========================================= #
 #^ Class for each button ^#
@@ -194,50 +1116,434 @@ class Button:
     def getData(self): # Get data in format that can be written to data file
         return ";".join([self.nickname,str(self.integerCode)])
 
+# ========================================= #
+#^ Macros: several buttons sent as one transmission ^#
+class MacroStep:
+    """One button of a macro, with how many repeats to send and the least space (µs) to leave after it"""
+
+    def __init__(self,button,repeats=None,gap=0):
+        self.button = button
+        self.repeats = repeats # None sends the remote's repeatFrames
+        self.gap = gap
+
+class Macro:
+    """An ordered list of button presses, e.g. power, then mode, then the temperature"""
+
+    MAX_STEPS = 64
+    MAX_REPEATS = 50
+    MAX_GAP = 10_000_000 # µs
+
+    def __init__(self,name,steps=()):
+        self.name = name
+        self.steps = []
+        for step in steps:
+            self.addStep(step.button,step.repeats,step.gap)
+
+    def addStep(self,button,repeats=None,gap=0):
+        if len(self.steps) >= self.MAX_STEPS:
+            raise ValueError("A macro can't have more than %d steps" % self.MAX_STEPS)
+        if not isinstance(button,str) or button == "":
+            raise ValueError("Macro step needs a button name, got %r" % (button,))
+        for value, what, limit, optional in ((repeats, "repeats", self.MAX_REPEATS, True), (gap, "gap_us", self.MAX_GAP, False)):
+            if value is None and optional:
+                continue # The remote's repeatFrames
+            if not isinstance(value,int) or isinstance(value,bool) or not 0 <= value <= limit:
+                raise ValueError("Macro step %s must be a whole number from 0 to %d, got %r" % (what, limit, value))
+        self.steps.append(MacroStep(button,repeats,gap))
+
+    # Steps as the JSON friendly dicts saved in remote files and taken by /transmit/batch
+    def toList(self):
+        steps = []
+        for step in self.steps:
+            entry = {"button_name": step.button}
+            if step.repeats is not None:
+                entry["repeats"] = step.repeats
+            if step.gap:
+                entry["gap_us"] = step.gap
+            steps.append(entry)
+        return steps
+
+    # Build a macro from toList's dicts; raises ValueError for anything else
+    @classmethod
+    def fromList(cls,name,steps):
+        if not isinstance(steps,list) or not steps:
+            raise ValueError("Macro %r needs a non-empty list of steps" % name)
+        macro = cls(name)
+        for step in steps:
+            if not isinstance(step,dict) or not set(step) <= {"button_name", "repeats", "gap_us"}:
+                raise ValueError("Macro step must be an object with button_name and optionally repeats and gap_us, got %r" % (step,))
+            macro.addStep(step.get("button_name"),step.get("repeats"),step.get("gap_us",0))
+        return macro
+
 # ========================================= #
 #^ Create a remote object from an information file ^#
-# Load remote data from file into object
+class RemoteFormatError(ValueError):
+    """A remote file that can't be loaded, with the line and column (both from 1) of the problem"""
+
+    def __init__(self,filename,line,column,message):
+        super().__init__("%s:%d:%d: %s" % (filename, line, column, message))
+        self.filename = filename
+        self.line = line
+        self.column = column
+
+REMOTE_PROPERTIES = ("nickname", "protocol", "repeatFrames", "buttons", "macros")
+REQUIRED_PROPERTIES = ("nickname", "protocol", "buttons")
+
+# Load remote data from file into object, with every button's waveform encoded ready to send
 def loadRemote(filename):
-    # Open file and read data
-    with open(filename) as file:
-        data = file.readlines()
+    newRemote = readRemote(filename)
+    newRemote.precomputeWaveforms()
+    return newRemote
 
-    # Load all properties from file into dictionary
-    remoteInfo = {}
-    for line in data:
-        propertyName, dataValue = line.split(":")
-        remoteInfo[propertyName] = dataValue
+# Parse a remote file into a Remote without encoding any waveforms
+# The file is read a line at a time in one pass. Each line is 'property:value', split at the first
+# colon only, and buttons are 'name;code' entries separated by '|' (',' written by older versions
+# is accepted too). The optional macros are a JSON object of macro name -> Macro.toList() steps.
+# Anything else raises RemoteFormatError saying where the problem is.
+def readRemote(filename):
+    remoteInfo = {} # Property -> (value, line, column)
+    buttons = []
+    lineNumber = 0
+    with open(filename,"rb") as file:
+        for lineNumber, line in enumerate(file,1):
+            line = decodeLine(filename,line,lineNumber)
+            if line == "":
+                continue
+            propertyName, colon, dataValue = line.partition(":")
+            if not colon:
+                raise RemoteFormatError(filename,lineNumber,1,"expected 'property:value'")
+            if propertyName not in REMOTE_PROPERTIES:
+                raise RemoteFormatError(filename,lineNumber,1,"unknown property " + repr(propertyName))
+            if propertyName in remoteInfo:
+                raise RemoteFormatError(filename,lineNumber,1,"duplicate property " + repr(propertyName))
+            column = len(propertyName) + 2
+            remoteInfo[propertyName] = (dataValue, lineNumber, column)
+            if propertyName == "buttons":
+                parseButtons(filename,dataValue,lineNumber,column,buttons)
 
+    for propertyName in REQUIRED_PROPERTIES:
+        if propertyName not in remoteInfo:
+            raise RemoteFormatError(filename,lineNumber + 1,1,"missing '%s' property" % propertyName)
+
+    protocolName, line, column = remoteInfo["protocol"]
     try:
-        newRemote = Remote(remoteInfo["nickname"],eval(remoteInfo["protocol"])) # Create remote object from dictionary
+        protocol = getProtocol(protocolName)
+    except ValueError as error:
+        raise RemoteFormatError(filename,line,column,str(error)) from None
 
-        # Handle all buttons that were specified in the save
-        for button in remoteInfo["buttons"].split("|"): # Different buttons separated by '|'
-            if button != "":
-                buttonDat = button.split(",") # Button information separated by commas
-                newRemote.addButton(buttonDat[0],int(buttonDat[1]))
-        
-        return newRemote
+    repeatFrames = 0
+    if "repeatFrames" in remoteInfo:
+        dataValue, line, column = remoteInfo["repeatFrames"]
+        repeatFrames = parseNumber(filename,dataValue,line,column,"repeat frame count")
+
+    newRemote = Remote(remoteInfo["nickname"][0],protocol,repeatFrames)
+    for name, code in buttons:
+        newRemote.addButton(name,code)
+    if "macros" in remoteInfo:
+        parseMacros(filename,newRemote,*remoteInfo["macros"])
+    return newRemote
+
+# Decode one UTF-8 line and take off its line ending ('\n' or '\r\n')
+def decodeLine(filename,line,lineNumber):
+    try:
+        line = line.decode("utf-8")
+    except UnicodeDecodeError as error:
+        column = len(line[:error.start].decode("utf-8",errors="replace")) + 1
+        raise RemoteFormatError(filename,lineNumber,column,"invalid UTF-8") from None
+    line = line[:-2] if line.endswith("\r\n") else line.rstrip("\n")
+    if "\r" in line:
+        raise RemoteFormatError(filename,lineNumber,line.index("\r") + 1,"stray carriage return")
+    return line
+
+# Parse the 'name;code|name;code|' buttons value into (name, code) pairs
+def parseButtons(filename,dataValue,line,column,buttons):
+    entries = dataValue.split("|")
+    if entries[-1] == "": # Every entry is written with a '|' after it
+        entries.pop()
+    append = buttons.append
+    for index, entry in enumerate(entries):
+        # Codes are digits, so the last separator is the one; ',' is what older versions wrote
+        name, separator, code = entry.rpartition(";")
+        if not separator or "," in code:
+            name, separator, code = entry.rpartition(",")
+        if name and code.isdigit() and code.isascii():
+            append((name,int(code)))
+        else:
+            buttonError(filename,entries,index,line,column)
 
-    except KeyError:
-        print("File Invalid! Not all properties present.")
+# Work out what is wrong with a button entry and where, only needed once parsing has failed
+def buttonError(filename,entries,index,line,column):
+    column += sum(len(entry) + 1 for entry in entries[:index])
+    entry = entries[index]
+    separator = max(entry.rfind(";"),entry.rfind(","))
+    if entry == "":
+        raise RemoteFormatError(filename,line,column,"empty button entry")
+    if separator == -1:
+        raise RemoteFormatError(filename,line,column,"expected 'name;code' for button " + repr(entry))
+    if separator == 0:
+        raise RemoteFormatError(filename,line,column,"missing button name")
+    parseNumber(filename,entry[separator + 1:],line,column + separator + 1,"integer code")
+
+# Add the macros line's macros to a remote, once its buttons are in
+def parseMacros(filename,remote,dataValue,line,column):
+    try:
+        macros = json.loads(dataValue)
+    except json.JSONDecodeError as error:
+        raise RemoteFormatError(filename,line,column + error.pos,"invalid macros JSON: " + error.msg) from None
+    if not isinstance(macros,dict):
+        raise RemoteFormatError(filename,line,column,"macros must be a JSON object of name -> steps")
+    for name, steps in macros.items():
+        try:
+            remote.addMacro(Macro.fromList(name,steps))
+        except ValueError as error:
+            raise RemoteFormatError(filename,line,column,str(error)) from None
+
+def parseNumber(filename,text,line,column,what):
+    if not (text.isascii() and text.isdigit()):
+        raise RemoteFormatError(filename,line,column,"expected a decimal %s, got %r" % (what, text))
+    return int(text)
     
     """Class to handle sending IR signals via GPIO."""
 class Transmitter:
     """Class for transmitting IR signals using the NEC protocol."""
     
-    def __init__(self, pin):
-        """Initialize the transmitter with the specified GPIO pin."""
+    def __init__(self, pin, backend="bitbang"):
+        """
+        Initialize the transmitter with the specified GPIO pin.
+
+        The backend does the actual pin timing. It can be one of the names in
+        TRANSMIT_BACKENDS or an already constructed backend object.
+        """
         self.transmitPin = pin
-        GPIO.setup(self.transmitPin, GPIO.OUT)
+        if isinstance(backend, str):
+            backend = TRANSMIT_BACKENDS[backend](pin)
+        self.backend = backend
+        self.executor = None # Created by the first await send()
     
     def sendSignal(self, raw_data):
-        """Send an IR signal based on raw NEC data."""
-        for (typ, duration) in raw_data:
-            GPIO.output(self.transmitPin, GPIO.HIGH if typ == 1 else GPIO.LOW)
-            sleep(duration / 1_000_000)  # Convert microseconds to seconds
-        GPIO.output(self.transmitPin, GPIO.LOW)  # Ensure pin is low after transmission
+        """Send an IR signal based on raw NEC data, returning the backend's timing report if it has one."""
+        return self.backend.send(raw_data)
+
+    async def send(self, signal, protocol=None):
+        """
+        Send an IR signal without blocking the event loop: await transmitter.send(code).
+
+        The signal is raw data or an integer code, which is encoded with the protocol
+        (NEC by default). Sending runs on this transmitter's own single worker thread, so
+        frames from concurrent tasks go out one after another, never interleaved.
+        """
+        if isinstance(signal, int):
+            signal = (protocol or NEC()).getRawFromIntegerCode(signal)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ir-transmit")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.sendSignal, signal)
 
     def cleanup(self):
         """Clean up GPIO settings."""
-        GPIO.cleanup()
\ No newline at end of file
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.backend.close()
+        GPIO.cleanup()
+
+# ========================================= #
+#^ Transmit backends ^#
+class BitBangBackend:
+    """Drive the pin with GPIO.output at deadlines kept by a PulseScheduler (no carrier)."""
+
+    def __init__(self, pin, scheduler=None):
+        self.pin = pin
+        self.scheduler = scheduler or PulseScheduler()
+        setupPin(self.pin, GPIO.OUT)
+
+    def send(self, raw_data):
+        """Output each (level, µs) pulse in turn and return the frame's timing error."""
+        pin = self.pin
+        return self.scheduler.run(raw_data, lambda level: GPIO.output(pin, GPIO.HIGH if level == 1 else GPIO.LOW))
+
+    def close(self):
+        pass
+
+class WaveformBackend:
+    """
+    Compile the whole carrier-modulated waveform to a list of edges before sending it.
+
+    Every mark is expanded into carrier cycles (38 kHz, 1/3 duty by default) and the
+    resulting (ns offset, level) edge list is cached per waveform, in the same way as
+    pigpio's wave_add_generic / wave_send_once. When a connected pigpio.pi is given the
+    edges are played by its DMA engine (the pin is then a BCM number); otherwise they
+    are played from Python at PulseScheduler deadlines (sleeping through the spaces and
+    spinning through the carrier).
+
+    pigpio can only hold so many pulses and DMA control blocks at once. Raw data that won't
+    fit in one wave (a long frame sent with repeats) is split at its spaces between frames
+    and sent one wave per frame, each at its own start time; a single frame too big for a
+    wave raises ValueError.
+    """
+
+    MAX_CACHED = 64
+    SPLIT_GAP = 20000 # µs, spaces at least this long are where raw data is split into waves
+
+    def __init__(self, pin, carrier=38000, dutyCycle=1 / 3, pi=None, scheduler=None):
+        self.pin = pin
+        self.period = 1e9 / carrier # ns
+        self.onTime = self.period * dutyCycle
+        self.pi = pi
+        self.scheduler = scheduler or PulseScheduler()
+        self.compiled = {}
+        if pi is None:
+            setupPin(self.pin, GPIO.OUT)
+        else:
+            import pigpio
+            pi.set_mode(self.pin, pigpio.OUTPUT)
+            self.maxPulses = pi.wave_get_max_pulses()
+            self.maxControlBlocks = pi.wave_get_max_cbs()
+
+    def compile(self, raw_data):
+        """Return the modulated edge list for raw data, building it on first use."""
+        key = raw_data if isinstance(raw_data, tuple) else tuple(raw_data)
+        wave = self.compiled.get(key)
+        if wave is not None:
+            return wave
+
+        wave = []
+        start = 0
+        for (typ, duration) in key:
+            end = start + duration * 1000
+            if typ == 1:
+                cycle = start
+                while cycle < end:
+                    wave.append((round(cycle), 1))
+                    wave.append((round(min(cycle + self.onTime, end)), 0))
+                    cycle += self.period
+            start = end
+        wave.append((round(start), 0)) # Hold the pin low until the last pulse is over
+
+        if len(self.compiled) >= self.MAX_CACHED:
+            self.compiled.clear()
+        self.compiled[key] = wave
+        return wave
+
+    def send(self, raw_data):
+        """
+        Send the compiled waveform for raw data and return its timing, as the other backends
+        do: duration_us, and the lateness of the edges (None with pigpio, whose DMA engine
+        times every edge itself).
+        """
+        if self.pi is not None:
+            return self.sendPigpio(raw_data)
+
+        wave = self.compile(raw_data)
+        output = GPIO.output
+        waitUntil = self.scheduler.waitUntil
+        timer = clock.perf_counter_ns
+        pin = self.pin
+        errors = []
+        origin = timer()
+        for (offset, level) in wave:
+            waitUntil(origin + offset)
+            errors.append(timer() - origin - offset)
+            output(pin, level)
+        return {"duration_us": (timer() - origin) / 1000, "max_error_us": max(errors) / 1000, "mean_error_us": sum(errors) / len(errors) / 1000}
+
+    def sendPigpio(self, raw_data):
+        """Hand the edges to pigpio as one wave per segment and wait for the last to finish."""
+        segments = [(start, self.pigpioPulses(self.compile(segment))) for start, segment in self.pigpioSegments(raw_data)]
+        timer = clock.perf_counter_ns
+        origin = timer()
+        for start, pulses in segments:
+            self.scheduler.waitUntil(origin + start * 1000)
+            self.pi.wave_clear()
+            self.pi.wave_add_generic(pulses)
+            waveId = self.pi.wave_create()
+            self.pi.wave_send_once(waveId)
+            while self.pi.wave_tx_busy():
+                clock.sleep(0.0002)
+            self.pi.wave_delete(waveId)
+        return {"duration_us": (timer() - origin) / 1000, "max_error_us": None, "mean_error_us": None}
+
+    # (start µs, raw data) pieces that each fit in a pigpio wave: all of it when it fits,
+    # otherwise the frames between long spaces
+    def pigpioSegments(self, raw_data):
+        raw_data = tuple(raw_data)
+        if self.fitsWave(self.compile(raw_data)):
+            return [(0, raw_data)]
+
+        segments = []
+        segment = []
+        start = now = 0
+        for (typ, duration) in raw_data:
+            if typ == 0 and duration >= self.SPLIT_GAP:
+                if segment:
+                    segments.append((start, tuple(segment)))
+                segment = []
+                start = now + duration
+            else:
+                segment.append((typ, duration))
+            now += duration
+        if segment:
+            segments.append((start, tuple(segment)))
+
+        for start, segment in segments:
+            wave = self.compile(segment)
+            if not self.fitsWave(wave):
+                raise ValueError(f"A frame of {len(wave)} edges is too long for a pigpio wave (at most {self.maxPulses} pulses, {self.maxControlBlocks} control blocks)")
+        return segments
+
+    # pigpio takes about two control blocks per pulse, one to change the pin and one to wait
+    def fitsWave(self, wave):
+        return len(wave) <= self.maxPulses and 2 * len(wave) + 2 <= self.maxControlBlocks
+
+    def pigpioPulses(self, wave):
+        import pigpio
+
+        mask = 1 << self.pin
+        pulses = []
+        for i, (offset, level) in enumerate(wave):
+            nextOffset = wave[i + 1][0] if i + 1 < len(wave) else offset
+            delay = round(nextOffset / 1000) - round(offset / 1000)
+            pulses.append(pigpio.pulse(mask if level else 0, 0 if level else mask, delay))
+        return pulses
+
+    def close(self):
+        self.compiled.clear()
+
+class SimulatedBackend:
+    """
+    Pace pulses like the bit-bang backend but record the edges instead of driving a pin.
+
+    Each send stores (perf_counter_ns, level) for the start of every pulse and for the
+    final return to LOW in self.edges, so the timing error can be checked with
+    edgeTimingErrors on a machine without GPIO.
+    """
+
+    def __init__(self, pin=None, scheduler=None):
+        self.pin = pin
+        self.scheduler = scheduler or PulseScheduler()
+        self.edges = []
+
+    def send(self, raw_data):
+        """Record the edges of raw data at the scheduler's deadlines and return the frame's timing error."""
+        edges = []
+        timer = clock.perf_counter_ns
+        timing = self.scheduler.run(raw_data, lambda level: edges.append((timer(), level)))
+        self.edges = edges
+        return timing
+
+    def close(self):
+        pass
+
+TRANSMIT_BACKENDS = {"bitbang": BitBangBackend, "waveform": WaveformBackend, "sim": SimulatedBackend}
+
+# Compare recorded (ns timestamp, level) edges with the pulse starts of raw data and
+# return each edge's error in µs, measured from the first edge
+def edgeTimingErrors(edges, raw_data):
+    errors = []
+    expected = 0
+    origin = edges[0][0]
+    for (timestamp, level), (typ, duration) in zip(edges, raw_data):
+        errors.append((timestamp - origin) / 1000 - expected)
+        expected += duration
+    if len(edges) > len(raw_data): # The final return to LOW
+        errors.append((edges[len(raw_data)][0] - origin) / 1000 - expected)
+    return errors
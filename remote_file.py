@@ -0,0 +1,264 @@
+"""Compact binary remote files that can be queried straight from a memory map.
+
+Layout (little endian, all offsets from the start of the file):
+
+    header       HEADER: magic, format version, index width, button count, repeat frames,
+                 the nickname and protocol name lengths and the offsets of every other section
+    strings      the UTF-8 nickname then the protocol name
+    records      one variable length record per button in the order the buttons were added:
+                 varint name length, the UTF-8 name, then varint (code << 1 | has raw), and
+                 when the button has a raw capture the varint offset of it in the blobs
+    name index   button count record offsets, each index width bytes, sorted by button name
+    code index   the same, sorted by integer code
+    blobs        raw captures: u32 pulse count, then u32 pulse widths
+
+Varints are 7 bits a byte, low bits first, so a 32 bit NEC code takes 5 bytes and a 300 bit
+AC code 43 without a separate long code path. The index width is the fewest bytes that hold
+any record offset (2 up to 64 KB of records), which with the variable records makes a file
+smaller than the text format. Looking a button up by name or code is a binary search over
+an index that touches a few dozen bytes of the file, so a RemoteFile answers queries
+without reading the rest. Files are converted from the text format with convertTextRemote,
+or from the command line: python remote_file.py convert my_remote.txt my_remote.irr (off
+the Pi, with IR_HARDWARE=auto set as pyIR needs a GPIO backend to import, see hardware.py)
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+
+import pyIR
+
+MAGIC = b"IRRM"
+VERSION = 2 # Version 1 had fixed 20 byte records and u32 indexes
+HEADER = struct.Struct("<4sHHIIIIIIIIII")
+COUNT = struct.Struct("<I")
+
+HAS_RAW = 1 # Low bit of a record's code varint: a raw capture is stored for the button
+
+# ----------------- #
+# Append a non-negative integer to a bytearray as a varint
+def packVarint(value, out):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+# Read a varint at a position of a buffer, returning (value, position after it)
+def unpackVarint(buffer, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+# ========================================= #
+#^ Writing ^#
+def saveBinaryRemote(remote, filename, raws=None):
+    """
+    Write a remote in the binary format. raws optionally maps button names to captured
+    pulse widths (as returned by Receiver.getPulses) to store alongside the codes.
+    """
+    raws = raws or {}
+    nickname = remote.nickname.encode("utf-8")
+    protocol = remote.protcol.getClassName().encode("utf-8")
+
+    records = bytearray()
+    blobs = bytearray()
+    offsets = [] # Of every record in the records section
+    names = []
+    for button in remote.buttons:
+        name = button.getNickname().encode("utf-8")
+        offsets.append(len(records))
+        names.append(name)
+        packVarint(len(name), records)
+        records.extend(name)
+
+        raw = raws.get(button.getNickname())
+        packVarint(button.getIntegerCode() << 1 | (HAS_RAW if raw is not None else 0), records)
+        if raw is not None:
+            packVarint(len(blobs), records)
+            widths = array('I', pyIR.pulseWidths(raw))
+            blobs.extend(COUNT.pack(len(widths)))
+            blobs.extend(widths.tobytes())
+
+    # sorted is stable, so where names or codes repeat the first button added comes first as in Remote
+    count = len(remote.buttons)
+    width = max(1, (len(records).bit_length() + 7) // 8)
+    nameIndex = sorted(range(count), key=lambda i: names[i])
+    codeIndex = sorted(range(count), key=lambda i: remote.buttons[i].getIntegerCode())
+
+    recordsOffset = HEADER.size + len(nickname) + len(protocol)
+    nameIndexOffset = recordsOffset + len(records)
+    codeIndexOffset = nameIndexOffset + count * width
+    blobsOffset = codeIndexOffset + count * width
+
+    with open(filename, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, width, count, remote.repeatFrames, len(nickname), len(protocol),
+                               recordsOffset, len(records), nameIndexOffset, codeIndexOffset, blobsOffset, len(blobs)))
+        file.write(nickname)
+        file.write(protocol)
+        file.write(records)
+        for index in (nameIndex, codeIndex):
+            file.write(b"".join(offsets[i].to_bytes(width, "little") for i in index))
+        file.write(blobs)
+
+# ========================================= #
+#^ Reading ^#
+class RemoteFile:
+    """
+    A binary remote file opened through a read only memory map.
+
+    Nothing but the header is read up front. getButton and identifyButton binary search
+    the name and code indexes and return a Button, or -1 like Remote does.
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{filename} is too short to be a remote file")
+
+        (magic, version, self.width, self.count, self.repeatFrames, nicknameLength, protocolLength,
+         self.recordsOffset, self.recordsSize, self.nameIndexOffset, self.codeIndexOffset,
+         self.blobsOffset, blobsSize) = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{filename} is not a binary remote file")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{filename} is format version {version}, this reader only understands version {VERSION}")
+        if self.blobsOffset + blobsSize > len(self.map):
+            self.close()
+            raise ValueError(f"{filename} is truncated")
+
+        protocolOffset = HEADER.size + nicknameLength
+        self.nickname = self.map[HEADER.size:protocolOffset].decode("utf-8")
+        self.protocol = self.map[protocolOffset:protocolOffset + protocolLength].decode("utf-8")
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.map.close()
+
+    # ----------------- #
+    # Records are found by their offset in the records section
+    def getName(self, offset):
+        start = self.recordsOffset + offset
+        length = self.map[start]
+        if length < 0x80: # Names under 128 bytes, nearly all of them, have a one byte length
+            return self.map[start + 1:start + 1 + length]
+        length, start = unpackVarint(self.map, start)
+        return self.map[start:start + length]
+
+    def getCode(self, offset):
+        length, start = unpackVarint(self.map, self.recordsOffset + offset)
+        return unpackVarint(self.map, start + length)[0] >> 1
+
+    # (name bytes, code, blob offset of the raw capture or -1, offset of the next record)
+    def getRecord(self, offset):
+        length, start = unpackVarint(self.map, self.recordsOffset + offset)
+        name = self.map[start:start + length]
+        value, position = unpackVarint(self.map, start + length)
+        blobOffset = -1
+        if value & HAS_RAW:
+            blobOffset, position = unpackVarint(self.map, position)
+        return name, value >> 1, blobOffset, position - self.recordsOffset
+
+    def getButton(self, name):
+        """Return the Button with a name, or -1 if there is none."""
+        offset = self.search(self.nameIndexOffset, name.encode("utf-8"), self.getName)
+        if offset == -1:
+            return -1
+        return pyIR.Button(name, self.getCode(offset))
+
+    def identifyButton(self, code):
+        """Return the Button with an integer code, or -1 if there is none."""
+        offset = self.search(self.codeIndexOffset, code, self.getCode)
+        if offset == -1:
+            return -1
+        return pyIR.Button(self.getName(offset).decode("utf-8"), code)
+
+    # Return the captured pulse widths stored for a button, or None if there aren't any
+    def getRaw(self, name):
+        offset = self.search(self.nameIndexOffset, name.encode("utf-8"), self.getName)
+        if offset == -1:
+            return None
+        blobOffset = self.getRecord(offset)[2]
+        if blobOffset == -1:
+            return None
+        start = self.blobsOffset + blobOffset
+        count = COUNT.unpack_from(self.map, start)[0]
+        start += COUNT.size
+        raw = array('I')
+        raw.frombytes(self.map[start:start + count * raw.itemsize])
+        return raw
+
+    def getIndexEntry(self, indexOffset, number):
+        start = indexOffset + number * self.width
+        return int.from_bytes(self.map[start:start + self.width], "little")
+
+    # Binary search an index for the offset of the first record whose key equals `key`, or -1
+    def search(self, indexOffset, key, getKey):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if getKey(self.getIndexEntry(indexOffset, middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            offset = self.getIndexEntry(indexOffset, low)
+            if getKey(offset) == key:
+                return offset
+        return -1
+
+    # ----------------- #
+    # Every button in the order they were added
+    def buttons(self):
+        data = self.map[self.recordsOffset:self.recordsOffset + self.recordsSize] # One copy, bytes index faster than the map
+        position = 0
+        for _ in range(self.count):
+            length, position = unpackVarint(data, position)
+            name = data[position:position + length].decode("utf-8")
+            value, position = unpackVarint(data, position + length)
+            if value & HAS_RAW:
+                _, position = unpackVarint(data, position)
+            yield pyIR.Button(name, value >> 1)
+
+    def toRemote(self):
+        """Build a full pyIR.Remote from the file, as loadRemote does for text files."""
+        remote = pyIR.Remote(self.nickname, pyIR.getProtocol(self.protocol), self.repeatFrames)
+        for button in self.buttons():
+            remote.addButton(button.getNickname(), button.getIntegerCode())
+        remote.precomputeWaveforms()
+        return remote
+
+def loadBinaryRemote(filename):
+    with RemoteFile(filename) as remoteFile:
+        return remoteFile.toRemote()
+
+# ========================================= #
+#^ Conversion from the text format ^#
+def convertTextRemote(textFile, binaryFile):
+    remote = pyIR.readRemote(textFile)
+    saveBinaryRemote(remote, binaryFile)
+    return remote
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "convert":
+        sys.exit("usage: python remote_file.py convert REMOTE.txt REMOTE.irr (IR_HARDWARE=auto off the Pi)")
+    remote = convertTextRemote(sys.argv[2], sys.argv[3])
+    print(f"Wrote {len(remote.buttons)} buttons of '{remote.nickname}' to {sys.argv[3]}")
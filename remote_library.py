@@ -0,0 +1,302 @@
+"""A library of many remotes kept in one SQLite database.
+
+Remotes, their buttons and macros, raw captures of the buttons and any protocol parameters
+live in remotes.db (or wherever the library is opened). Buttons are indexed by (remote, name)
+for transmitting and by (protocol, code) for working out which remote a captured code
+belongs to. One connection is kept open for the life of the library and shared by every
+thread behind the library's lock, so request threads coming and going don't each leave
+a connection behind. The most recently used remotes are kept fully loaded (waveforms already encoded) in an
+LRU, so transmitting a button of a hot remote doesn't touch the database at all.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pyIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS remotes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    protocol TEXT NOT NULL,
+    repeat_frames INTEGER NOT NULL DEFAULT 0,
+    params TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS buttons (
+    id INTEGER PRIMARY KEY,
+    remote_id INTEGER NOT NULL REFERENCES remotes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    code TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buttons_by_name ON buttons (remote_id, name, position);
+CREATE INDEX IF NOT EXISTS buttons_by_code ON buttons (protocol, code);
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    button_id INTEGER NOT NULL REFERENCES buttons(id) ON DELETE CASCADE,
+    captured REAL NOT NULL,
+    pulses BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captures_by_button ON captures (button_id);
+CREATE TABLE IF NOT EXISTS macros (
+    id INTEGER PRIMARY KEY,
+    remote_id INTEGER NOT NULL REFERENCES remotes(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    steps TEXT NOT NULL,
+    UNIQUE (remote_id, name)
+);
+"""
+
+class RemoteLibrary:
+    """
+    Store and look up remotes by name.
+
+    Codes are stored as decimal text because AC codes are far wider than SQLite's 64 bit
+    integers. protocol params are class attributes (timings, SECTIONS, ...) that override
+    the registered protocol's, for units that need a tweaked PulseDistance and the like.
+    Lookups that find nothing return -1, as Remote's do.
+    """
+
+    def __init__(self, path="remotes.db", cacheSize=16):
+        self.path = path
+        self.cacheSize = cacheSize
+        self.db = None # Opened on first use
+        self.lock = threading.RLock() # Guards the LRU and the connection
+        self.hot = OrderedDict() # Remote name -> loaded Remote, most recently used last
+        self.generations = {} # Remote name -> times it has been forgotten, so a load that raced a change isn't cached
+        self.hits = 0
+        self.misses = 0
+        with self.transaction() as db:
+            db.executescript(SCHEMA)
+
+    # ----------------- #
+    # The shared connection, only used with the lock held
+    def connection(self):
+        if self.db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA foreign_keys = ON")
+            db.execute("PRAGMA journal_mode = WAL") # Other processes can read while a remote is being written
+            self.db = db
+        return self.db
+
+    # Hold the lock and yield the connection, committing on success and rolling back on error
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            db = self.connection()
+            with db:
+                yield db
+
+    # Hold the lock and yield the connection, for queries
+    @contextmanager
+    def reading(self):
+        with self.lock:
+            yield self.connection()
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+            self.hot.clear()
+
+    # ========================================= #
+    #^ Writing ^#
+    def addRemote(self, remote, params=None, replace=True):
+        """
+        Store a Remote (its buttons in order) and return its id. An existing remote with
+        the same name is replaced unless replace is False, when sqlite3.IntegrityError is raised.
+        """
+        with self.transaction() as db:
+            remoteId = self.insertRemote(db, remote, params, replace)
+        self.forget(remote.nickname.strip())
+        return remoteId
+
+    def updateRemote(self, remote):
+        """
+        Store a Remote, keeping what the library holds about it beyond the Remote itself, and
+        return its id. A new remote is added as addRemote does. For an existing one the protocol,
+        buttons and macros are brought up to date in place. Its params are kept, and so are the
+        captures of every button still on it, matched by name.
+        """
+        name = remote.nickname.strip()
+        protocol = remote.protcol.getClassName()
+        with self.transaction() as db:
+            row = db.execute("SELECT id FROM remotes WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                remoteId = self.insertRemote(db, remote, None, False)
+            else:
+                remoteId = row[0]
+                db.execute("UPDATE remotes SET protocol = ?, repeat_frames = ? WHERE id = ?", (protocol, remote.repeatFrames, remoteId))
+
+                # Button rows by name, oldest first, so a name used twice keeps both rows' captures
+                existing = {}
+                for buttonId, buttonName in db.execute("SELECT id, name FROM buttons WHERE remote_id = ? ORDER BY position", (remoteId,)):
+                    existing.setdefault(buttonName, []).append(buttonId)
+                for position, button in enumerate(remote.buttons):
+                    ids = existing.get(button.getNickname())
+                    values = (position, protocol, str(button.getIntegerCode()))
+                    if ids:
+                        db.execute("UPDATE buttons SET position = ?, protocol = ?, code = ? WHERE id = ?", values + (ids.pop(0),))
+                    else:
+                        db.execute("INSERT INTO buttons (position, protocol, code, remote_id, name) VALUES (?, ?, ?, ?, ?)",
+                                   values + (remoteId, button.getNickname()))
+                db.executemany("DELETE FROM buttons WHERE id = ?", [(buttonId,) for ids in existing.values() for buttonId in ids])
+
+                db.execute("DELETE FROM macros WHERE remote_id = ?", (remoteId,))
+                db.executemany(
+                    "INSERT INTO macros (remote_id, name, steps) VALUES (?, ?, ?)",
+                    [(remoteId, macro.name, json.dumps(macro.toList())) for macro in remote.macros.values()])
+        self.forget(name)
+        return remoteId
+
+    def insertRemote(self, db, remote, params, replace):
+        name = remote.nickname.strip()
+        protocol = remote.protcol.getClassName()
+        if replace:
+            db.execute("DELETE FROM remotes WHERE name = ?", (name,))
+        remoteId = db.execute(
+            "INSERT INTO remotes (name, protocol, repeat_frames, params) VALUES (?, ?, ?, ?)",
+            (name, protocol, remote.repeatFrames, json.dumps(params or {}))).lastrowid
+        db.executemany(
+            "INSERT INTO buttons (remote_id, position, name, protocol, code) VALUES (?, ?, ?, ?, ?)",
+            [(remoteId, position, button.getNickname(), protocol, str(button.getIntegerCode()))
+             for position, button in enumerate(remote.buttons)])
+        db.executemany(
+            "INSERT INTO macros (remote_id, name, steps) VALUES (?, ?, ?)",
+            [(remoteId, macro.name, json.dumps(macro.toList())) for macro in remote.macros.values()])
+        return remoteId
+
+    def importRemoteFiles(self, filenames, replace=True):
+        """Load saveRemote text files and store them all in one transaction. Returns the remote names."""
+        remotes = [pyIR.readRemote(filename) for filename in filenames] # Raises RemoteFormatError for a bad file
+
+        with self.transaction() as db:
+            for remote in remotes:
+                self.insertRemote(db, remote, None, replace)
+        names = [remote.nickname.strip() for remote in remotes]
+        for name in names:
+            self.forget(name)
+        return names
+
+    def removeRemote(self, name):
+        with self.transaction() as db:
+            db.execute("DELETE FROM remotes WHERE name = ?", (name,))
+        self.forget(name)
+
+    # Store a raw capture (pulse widths) of a button, returning -1 if there is no such button
+    def addCapture(self, remoteName, buttonName, pulses):
+        with self.transaction() as db:
+            buttonId = self.findButtonId(db, remoteName, buttonName)
+            if buttonId == -1:
+                return -1
+            db.execute("INSERT INTO captures (button_id, captured, pulses) VALUES (?, ?, ?)",
+                       (buttonId, time.time(), array('I', pyIR.pulseWidths(pulses)).tobytes()))
+        return buttonId
+
+    # ========================================= #
+    #^ Reading ^#
+    def getRemote(self, name):
+        """Return the loaded Remote with a name, from the LRU when it is hot, or -1 if there is none."""
+        with self.lock:
+            remote = self.hot.get(name)
+            if remote is not None:
+                self.hot.move_to_end(name)
+                self.hits += 1
+                return remote
+            self.misses += 1
+            generation = self.generations.get(name, 0)
+
+        # Loaded without the lock so hits on other remotes carry on meanwhile
+        remote = self.loadRemote(name)
+        if remote == -1:
+            return -1
+        with self.lock:
+            if self.generations.get(name, 0) != generation:
+                return remote # Changed while loading, serve this load but don't keep it
+            self.hot[name] = remote
+            self.hot.move_to_end(name)
+            while len(self.hot) > self.cacheSize:
+                self.hot.popitem(last=False)
+        return remote
+
+    def loadRemote(self, name):
+        with self.reading() as db:
+            row = db.execute("SELECT id, protocol, repeat_frames, params FROM remotes WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return -1
+            remoteId, protocolName, repeatFrames, params = row
+            buttons = db.execute("SELECT name, code FROM buttons WHERE remote_id = ? ORDER BY position", (remoteId,)).fetchall()
+            macros = db.execute("SELECT name, steps FROM macros WHERE remote_id = ? ORDER BY id", (remoteId,)).fetchall()
+
+        protocol = pyIR.getProtocol(protocolName)
+        params = json.loads(params)
+        if params:
+            protocol = type(protocol.__name__, (protocol,), params)
+        remote = pyIR.Remote(name, protocol, repeatFrames)
+        for buttonName, code in buttons:
+            remote.addButton(buttonName, int(code))
+        for macroName, steps in macros:
+            remote.addMacro(pyIR.Macro.fromList(macroName, json.loads(steps)))
+        remote.precomputeWaveforms()
+        return remote
+
+    # The transmit waveform of a button, or -1 if the remote or button doesn't exist
+    def getWaveform(self, remoteName, buttonName):
+        remote = self.getRemote(remoteName)
+        if remote == -1:
+            return -1
+        return remote.getWaveform(buttonName)
+
+    def listRemotes(self):
+        """(name, protocol, button count) for every remote, by name."""
+        with self.reading() as db:
+            return db.execute(
+                "SELECT remotes.name, remotes.protocol, COUNT(buttons.id) FROM remotes "
+                "LEFT JOIN buttons ON buttons.remote_id = remotes.id GROUP BY remotes.id ORDER BY remotes.name").fetchall()
+
+    def findButton(self, protocol, code):
+        """Every (remote name, button name) with an integer code under a protocol, using the (protocol, code) index."""
+        with self.reading() as db:
+            return db.execute(
+                "SELECT remotes.name, buttons.name FROM buttons JOIN remotes ON remotes.id = buttons.remote_id "
+                "WHERE buttons.protocol = ? AND buttons.code = ? ORDER BY remotes.name, buttons.position",
+                (protocol, str(code))).fetchall()
+
+    # The captures of a button as pulse arrays, oldest first
+    def getCaptures(self, remoteName, buttonName):
+        with self.reading() as db:
+            buttonId = self.findButtonId(db, remoteName, buttonName)
+            if buttonId == -1:
+                return []
+            rows = db.execute("SELECT pulses FROM captures WHERE button_id = ? ORDER BY id", (buttonId,)).fetchall()
+        captures = []
+        for (pulses,) in rows:
+            capture = array('I')
+            capture.frombytes(pulses)
+            captures.append(capture)
+        return captures
+
+    # The first button with a name on a remote, as Remote.identifyButtonByName picks
+    def findButtonId(self, db, remoteName, buttonName):
+        row = db.execute(
+            "SELECT buttons.id FROM buttons JOIN remotes ON remotes.id = buttons.remote_id "
+            "WHERE remotes.name = ? AND buttons.name = ? ORDER BY buttons.position LIMIT 1",
+            (remoteName, buttonName)).fetchone()
+        return -1 if row is None else row[0]
+
+    # ----------------- #
+    # Drop a remote from the LRU after it changes
+    def forget(self, name):
+        with self.lock:
+            self.hot.pop(name, None)
+            self.generations[name] = self.generations.get(name, 0) + 1
+
+    def getCacheStats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self.hot)}
@@ -0,0 +1,74 @@
+"""The clock that pulse capture, transmit pacing and the simulators read.
+
+pyIR, pulse_scheduler, gpio_sim and dht_sim all read the time through the shared `clock`
+object, calling clock.perf_counter_ns(), clock.sleep() and so on when they need them.
+Normally those are the time module's own functions. useVirtualClock swaps in a
+VirtualClock, so captures, transmits and sensor reads on the simulated hardware take no
+real time and come out the same on every run.
+"""
+
+import threading
+import time
+
+class VirtualClock:
+    """
+    Simulated time that only moves when it is read or slept on.
+
+    Every read advances the time by readCost ns, so busy-wait loops still reach their
+    deadlines, and sleep advances it at once instead of blocking. Single threaded code
+    sees exactly the same times on every run. Threads share the one timeline, so sleeping
+    on one thread moves time on for all of them, and code split across threads (edge
+    callbacks, the streaming receiver) is only as repeatable as the thread scheduling.
+    """
+
+    def __init__(self, start=0, readCost=1000):
+        self.now = start # ns
+        self.readCost = readCost
+        self.lock = threading.Lock()
+
+    def monotonic_ns(self):
+        with self.lock:
+            self.now += self.readCost
+            return self.now
+
+    perf_counter_ns = monotonic_ns # One timeline for both clocks
+
+    def monotonic(self):
+        return self.monotonic_ns() / 1e9
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            with self.lock:
+                self.now += int(seconds * 1e9)
+
+class Clock:
+    """The clock functions in use. Look them up on every call (or once per call of a hot function) so a swap is seen."""
+
+    def __init__(self):
+        self.virtual = None
+        self.useReal()
+
+    def useReal(self):
+        self.virtual = None
+        self.monotonic_ns = time.monotonic_ns
+        self.perf_counter_ns = time.perf_counter_ns
+        self.monotonic = time.monotonic
+        self.sleep = time.sleep
+
+    def useVirtual(self, virtual):
+        self.virtual = virtual
+        self.monotonic_ns = virtual.monotonic_ns
+        self.perf_counter_ns = virtual.perf_counter_ns
+        self.monotonic = virtual.monotonic
+        self.sleep = virtual.sleep
+
+clock = Clock()
+
+# Run everything on simulated time from now on, returning the VirtualClock
+def useVirtualClock(virtual=None):
+    virtual = virtual or VirtualClock()
+    clock.useVirtual(virtual)
+    return virtual
+
+def useRealClock():
+    clock.useReal()